@@ -0,0 +1,6 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/18 10:40
+# @Author  : Adolf
+# @File    : __init__.py
+# @Function:
@@ -0,0 +1,79 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/19 09:10
+# @Author  : Adolf
+# @File    : sample_strategy.py
+# @Function: 测试用的均线交叉策略，以及写入与get_data_path路径一致的随机行情数据
+import os
+
+from Benchmark.synthetic_data import make_ohlcv
+from BackTrader.base_back_trader import TradeStructure
+from Utils.TechnicalIndicators.basic_indicators import SMA
+from Utils.TechnicalIndicators.stream_indicators import StreamSMA
+
+
+def write_market_data(code, n_bars=400, freq="day", seed=0):
+    """在当前目录下写入随机行情，START_STAMP、END_STAMP为None时run_one_stock不会去下载数据"""
+    data_path = f"Data/Baostock/day/{code}_None_None.csv"
+    os.makedirs(os.path.dirname(data_path), exist_ok=True)
+    make_ohlcv(n_bars, freq=freq, seed=seed, code=code).to_csv(data_path, index=False)
+    return data_path
+
+
+def sample_config(code="sh.600000", **kwargs):
+    config = {"LOG_LEVEL": "ERROR", "CODE_NAME": code, "HEADLESS": True}
+    config.update(kwargs)
+    return config
+
+
+class SmaCrossStrategy(TradeStructure):
+    """短期均线上穿长期均线买入，下穿卖出，参数为short、long"""
+
+    stateless_trade = True
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.shared_calls = 0
+        self.indicator_params = []
+        self.incremental_rows = []
+
+    def cal_shared_indicators(self):
+        self.shared_calls += 1
+
+    def cal_technical_indicators(self, indicators_config):
+        self.indicator_params.append(indicators_config)
+        close = self.data["close"].to_numpy()
+        self.data["sma_short"] = SMA(close, timeperiod=indicators_config.get("short", 5))
+        self.data["sma_long"] = SMA(close, timeperiod=indicators_config.get("long", 10))
+
+    def cal_incremental_indicators(self, indicators_config, indicator_state):
+        # 与cal_technical_indicators的结果相同，记录每次计算了多少根K线
+        self.incremental_rows.append(len(self.data))
+        if indicator_state is None:
+            indicator_state = {
+                name: StreamSMA(indicators_config.get(name, default)).get_state()
+                for name, default in (("short", 5), ("long", 10))
+            }
+        close = self.data["close"].to_numpy()
+        new_state = {}
+        for name, state in indicator_state.items():
+            sma = StreamSMA.from_state(state)
+            self.data["sma_" + name] = [sma.update(value) for value in close]
+            new_state[name] = sma.get_state()
+        return new_state
+
+    def buy_logic(self):
+        trading_step = self.trade_state.trading_step
+        last_step = self.trade_state.history_trading_step[0]
+        return bool(
+            trading_step.sma_short > trading_step.sma_long
+            and last_step.sma_short < last_step.sma_long
+        )
+
+    def sell_logic(self):
+        trading_step = self.trade_state.trading_step
+        last_step = self.trade_state.history_trading_step[0]
+        return bool(
+            trading_step.sma_short < trading_step.sma_long
+            and last_step.sma_short > last_step.sma_long
+        )
@@ -0,0 +1,33 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/18 11:30
+# @Author  : Adolf
+# @File    : test_bar_cursor.py
+# @Function:
+import numpy as np
+import pandas as pd
+
+from BackTrader.bar_cursor import BarCursor
+
+
+def test_bar_view_and_history():
+    data = pd.DataFrame(
+        {"date": ["2022-01-0{}".format(i) for i in range(1, 6)], "close": np.arange(5.0)}
+    )
+    cursor = BarCursor(data)
+    step = cursor.view(2)
+    assert step.close == step["close"] == 2.0
+    assert step.date == "2022-01-03"
+
+    history = cursor.history(maxlen=3)
+    for pos in range(5):
+        history.append(pos)
+    assert len(history) == 3
+    assert [bar.close for bar in history] == [2.0, 3.0, 4.0]
+    assert history[0].close == 2.0
+    assert history[-1].close == 4.0
+
+    cursor.buy_marks[1] = 1
+    cursor.attach_marks(data)
+    assert data["buy"].tolist()[1] == 1
+    assert "sell" not in data
@@ -0,0 +1,66 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/18 20:50
+# @Author  : Adolf
+# @File    : test_data_loader.py
+# @Function:
+import pandas as pd
+import pytest
+
+from BackTrader.data_loader import load_market_data
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    path = tmp_path / "sh.600000.csv"
+    pd.DataFrame(
+        {
+            "date": ["2022-01-04", "2022-01-05", "2022-01-06", "2022-01-07"],
+            "code": "sh.600000",
+            "open": [1.0, 2.0, 3.0, 4.0],
+            "close": [1.5, 2.5, 3.5, 4.5],
+            "volume": [100, 200, 300, 400],
+        }
+    ).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.mark.parametrize("engine", [None, "pyarrow"])
+def test_load_market_data(data_path, engine):
+    df = load_market_data(
+        data_path,
+        columns=["date", "close", "turn", "code"],
+        price_dtype="float32",
+        engine=engine,
+    )
+    # 文件中没有的列被忽略，按columns的顺序返回
+    assert df.columns.tolist() == ["date", "close", "code"]
+    assert df["close"].dtype == "float32"
+    assert isinstance(df["code"].dtype, pd.CategoricalDtype)
+    assert df["date"].iloc[0] == "2022-01-04"
+
+
+@pytest.mark.parametrize(
+    ("inclusive", "dates"),
+    [
+        ("both", ["2022-01-05", "2022-01-06"]),
+        ("neither", []),
+        ("left", ["2022-01-05"]),
+        ("right", ["2022-01-06"]),
+    ],
+)
+def test_load_market_data_date_range(data_path, inclusive, dates):
+    df = load_market_data(
+        data_path, start_stamp="2022-01-05", end_stamp="2022-01-06", inclusive=inclusive
+    )
+    assert df["date"].tolist() == dates
+    assert df.index.tolist() == list(range(len(dates)))
+
+
+def test_load_market_data_unsorted(tmp_path):
+    path = tmp_path / "unsorted.csv"
+    pd.DataFrame(
+        {"date": ["2022-01-06", "2022-01-04", "2022-01-05"], "close": [3.0, 1.0, 2.0]}
+    ).to_csv(path, index=False)
+    df = load_market_data(str(path), start_stamp="2022-01-05")
+    assert df["date"].tolist() == ["2022-01-06", "2022-01-05"]
@@ -0,0 +1,100 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/18 22:40
+# @Author  : Adolf
+# @File    : test_exit_scanner.py
+# @Function:
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from BackTrader.exit_scanner import pair_exit_levels, scan_exits
+
+
+def test_scan_exits_close_and_intrabar():
+    close = np.array([10.0, 10.5, 11.0, 9.8, 10.2, 12.5])
+    high = close + 0.6
+    low = close - 0.6
+
+    exit_positions, exit_prices = scan_exits([0, 1], 9.5, 12.0, close)
+    assert exit_positions.tolist() == [5, 5]
+    assert exit_prices.tolist() == [12.5, 12.5]
+
+    # 最低价9.2触及止损，同一根K线上止损优先
+    exit_positions, exit_prices = scan_exits(
+        [0, 1], 9.5, [11.5, 12.0], close, high=high, low=low, intrabar=True
+    )
+    assert exit_positions.tolist() == [2, 3]
+    assert exit_prices.tolist() == [11.5, 9.5]
+
+    # 止损价不设置时没有离场
+    exit_positions, exit_prices = scan_exits([0], None, None, close)
+    assert exit_positions.tolist() == [-1]
+    assert np.isnan(exit_prices[0])
+
+
+def test_scan_exits_trailing_stop():
+    close = np.array([10.0, 11.0, 12.0, 11.6, 11.4, 13.0])
+    exit_positions, exit_prices = scan_exits([0], 9.0, None, close, trailing_stop=0.5)
+    # 买入后最高收盘价12.0，移动止损价11.5
+    assert exit_positions.tolist() == [4]
+    assert exit_prices.tolist() == [11.4]
+
+
+@pytest.mark.parametrize("intrabar, trailing_stop", [(False, None), (True, 0.8)])
+def test_scan_exits_batches_match(intrabar, trailing_stop):
+    rng = np.random.default_rng(0)
+    close = 10 + np.cumsum(rng.normal(0, 0.1, 3000))
+    high = close + rng.uniform(0, 0.2, len(close))
+    low = close - rng.uniform(0, 0.2, len(close))
+    entries = np.sort(rng.choice(len(close), 300, replace=False))
+    stop_loss = close[entries] - rng.uniform(0.5, 5, len(entries))
+    take_profit = close[entries] + rng.uniform(0.5, 5, len(entries))
+
+    kwargs = dict(high=high, low=low, intrabar=intrabar, trailing_stop=trailing_stop)
+    expected = scan_exits(entries, stop_loss, take_profit, close, **kwargs)
+    result = scan_exits(
+        entries, stop_loss, take_profit, close, chunk_size=4, max_elements=64, **kwargs
+    )
+    np.testing.assert_array_equal(result[0], expected[0])
+    np.testing.assert_array_equal(result[1], expected[1])
+    assert (expected[0] >= 0).any()
+
+
+def test_scan_exits_memory_is_bounded():
+    # 很长的序列上大量交易一直不离场，中间数组的大小受max_elements限制
+    close = np.full(50_000, 10.0)
+    entries = np.arange(0, 20_000, 10)
+    max_elements = 1 << 16
+
+    tracemalloc.start()
+    try:
+        exit_positions, exit_prices = scan_exits(
+            entries, 5.0, 20.0, close, max_elements=max_elements
+        )
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert (exit_positions == -1).all()
+    assert np.isnan(exit_prices).all()
+    # 每批的中间数组不超过十几个max_elements大小的float64/int64数组
+    assert peak < 16 * 8 * max_elements + 64 * len(entries)
+
+
+def test_pair_exit_levels_holds_one_position():
+    close = np.array([10.0, 10.0, 10.5, 11.0, 11.5, 10.0, 10.0])
+    buy_signal = np.array([True, True, True, False, False, True, True])
+    stop_loss = close - 1
+    take_profit = close + 1
+
+    entries, exits, open_entry, exit_prices, trade_stop, _ = pair_exit_levels(
+        buy_signal, stop_loss, take_profit, close
+    )
+    # 第一根K线不交易，持仓期间的买入信号被忽略，卖出的K线上不会再次买入
+    assert entries.tolist() == [1]
+    assert exits.tolist() == [4]
+    assert exit_prices.tolist() == [11.5]
+    assert trade_stop.tolist() == [9.0]
+    assert open_entry == 5
@@ -0,0 +1,69 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/18 23:35
+# @Author  : Adolf
+# @File    : test_frame_transport.py
+# @Function:
+import os
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from BackTrader.frame_transport import (
+    FRAME_TRANSPORTS,
+    decode_frame,
+    encode_frame,
+    release_frame,
+)
+from BackTrader.process_pool import pool_map
+
+
+@pytest.mark.parametrize("transport", FRAME_TRANSPORTS)
+def test_frame_round_trip(transport):
+    df = pd.DataFrame(
+        {
+            "date": ["2022-01-04", "2022-01-05"],
+            "银行_close": [1.5, 2.5],
+            "银行_mom": [np.nan, 0.3],
+        }
+    )
+    pd.testing.assert_frame_equal(decode_frame(encode_frame(df, transport)), df)
+
+
+def test_pool_map_max_in_flight_keeps_order():
+    result = list(pool_map(abs, range(-10, 0), workers=2, max_in_flight=3))
+    assert result == list(range(10, 0, -1))
+
+
+def _encode_task(i):
+    if i == 3:
+        raise ValueError("bad task")
+    return encode_frame(pd.DataFrame({"x": np.arange(100) * i}))
+
+
+def list_shared_memory():
+    return {name for name in os.listdir("/dev/shm") if name.startswith("psm_")}
+
+
+@pytest.mark.skipif(not os.path.isdir("/dev/shm"), reason="需要/dev/shm")
+@pytest.mark.parametrize("fail_at", ["consumer", "worker"])
+def test_pool_map_releases_frames_on_error(fail_at):
+    before = list_shared_memory()
+    tasks = range(4, 20) if fail_at == "consumer" else range(20)
+
+    with pytest.raises(ValueError) as exc_info:
+        encoded_iter = pool_map(
+            _encode_task, tasks, workers=2, max_in_flight=6, discard=release_frame
+        )
+        with closing(encoded_iter):
+            for i, encoded in enumerate(encoded_iter):
+                decode_frame(encoded)
+                # worker时第4个任务在子进程中出错
+                if fail_at == "consumer" and i == 1:
+                    raise ValueError("stop early")
+
+    assert str(exc_info.value) == ("stop early" if fail_at == "consumer" else "bad task")
+    # 已经提交但没有解码的结果占用的共享内存都被释放
+    assert list_shared_memory() - before == set()
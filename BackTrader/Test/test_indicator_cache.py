@@ -0,0 +1,103 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/19 10:20
+# @Author  : Adolf
+# @File    : test_indicator_cache.py
+# @Function:
+import os
+
+import pandas as pd
+
+from BackTrader.indicator_cache import IndicatorCache
+from BackTrader.Test.sample_strategy import (
+    SmaCrossStrategy,
+    sample_config,
+    write_market_data,
+)
+
+CODE = "sh.600000"
+
+
+class StatefulSmaStrategy(SmaCrossStrategy):
+    """计算指标时在self上保存了状态，命中缓存会丢失这个状态"""
+
+    def cal_technical_indicators(self, indicators_config):
+        super().cal_technical_indicators(indicators_config)
+        self.last_close = self.data["close"].iloc[-1]
+
+
+def make_key(cache, data_path, params):
+    return cache.make_key(CODE, data_path, None, None, "sma", params)
+
+
+def test_cache_hit_miss_and_invalidation(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    data_path = write_market_data(CODE)
+    cache = IndicatorCache(cache_dir="cache")
+    data = pd.DataFrame({"date": ["2022-01-04", "2022-01-05"], "sma5": [1.5, 2.5]})
+
+    key = make_key(cache, data_path, {"short": 5})
+    assert cache.get(key) is None
+    cache.put(key, data)
+    pd.testing.assert_frame_equal(cache.get(key), data)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # 参数或者数据文件变化时key不同
+    assert make_key(cache, data_path, {"short": 10}) != key
+    write_market_data(CODE, n_bars=401)
+    assert make_key(cache, data_path, {"short": 5}) != key
+
+
+def test_corrupt_cache_file_is_a_miss(tmp_path):
+    cache = IndicatorCache(cache_dir=str(tmp_path))
+    cache.put("key", pd.DataFrame({"sma5": [1.5, 2.5]}))
+    path = os.path.join(tmp_path, "key.parquet")
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) // 2)
+
+    assert cache.get("key") is None
+    assert cache.misses == 1
+    assert not os.path.exists(path)
+
+
+def test_strategy_uses_cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_market_data(CODE)
+    config = sample_config(CODE, INDICATOR_CACHE_DIR="cache")
+
+    first = SmaCrossStrategy(config)
+    pl_ration = first.run_one_stock_once(CODE, {"short": 5, "long": 20})
+    second = SmaCrossStrategy(config)
+    assert second.run_one_stock_once(CODE, {"short": 5, "long": 20}) == pl_ration
+    # 第二次命中缓存，没有计算指标
+    assert second.indicator_params == []
+    assert second.indicator_cache.hits >= 1
+    pd.testing.assert_frame_equal(second.data, first.data)
+
+
+def test_strategy_with_side_effects_is_not_cached(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_market_data(CODE)
+    config = sample_config(CODE, INDICATOR_CACHE_DIR="cache")
+
+    for _ in range(2):
+        strategy = StatefulSmaStrategy(config)
+        strategy.run_one_stock_once(CODE, {"short": 5, "long": 20})
+        assert strategy.last_close == strategy.data["close"].iloc[-1]
+        assert "cal_technical_indicators" in strategy.uncached_indicators
+
+
+def test_base_indicators_histogram(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    data_path = write_market_data(CODE)
+    strategy = SmaCrossStrategy(sample_config(CODE))
+    strategy.load_dataset(data_path)
+    strategy.cal_base_technical_indicators()
+    # 柱状图沿用pandas_ta的MACDh，是macd - signal
+    data = strategy.data.dropna(subset=["histogram"])
+    assert len(data) > 0
+    pd.testing.assert_series_equal(
+        data["histogram"],
+        (data["macd"] - data["signal"]).round(4),
+        check_names=False,
+    )
@@ -0,0 +1,64 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/18 23:05
+# @Author  : Adolf
+# @File    : test_market_panel.py
+# @Function:
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+from BackTrader.market_panel import build_panel, select_top_k
+
+
+def merge_panel(frame_list):
+    panel = reduce(
+        lambda left, right: pd.merge(left, right, on=["date"], how="outer"),
+        frame_list,
+    )
+    return panel.sort_values(by=["date"]).reset_index(drop=True)
+
+
+def test_build_panel_matches_outer_merge():
+    frame_list = [
+        pd.DataFrame(
+            {
+                "date": ["2022-01-05", "2022-01-04", "2022-01-06"],
+                "银行_close": [1.0, 2.0, 3.0],
+                "银行_mom": [np.nan, 0.5, 0.1],
+            }
+        ),
+        pd.DataFrame(
+            {
+                "date": ["2022-01-03", "2022-01-05"],
+                "汽车_close": [4.0, 5.0],
+                "汽车_mom": [0.2, np.nan],
+            }
+        ),
+    ]
+    pd.testing.assert_frame_equal(build_panel(frame_list), merge_panel(frame_list))
+
+    # 有非浮点数列时按日期索引concat对齐
+    frame_list[1]["汽车_volume"] = [10, 20]
+    pd.testing.assert_frame_equal(build_panel(frame_list), merge_panel(frame_list))
+
+
+def test_select_top_k():
+    scores = np.array(
+        [
+            [0.1, 0.3, 0.3, np.nan],
+            [np.nan, np.nan, np.nan, np.nan],
+            [0.5, -0.2, np.nan, 0.4],
+        ]
+    )
+    top_index, top_score = select_top_k(scores, k=1)
+    assert top_index[:, 0].tolist() == [1, -1, 0]
+
+    top_index, top_score = select_top_k(scores, k=3, tie_break="last")
+    assert top_index.tolist() == [[2, 1, 0], [-1, -1, -1], [0, 3, 1]]
+    np.testing.assert_array_equal(top_score[0], [0.3, 0.3, 0.1])
+
+    top_index, top_score = select_top_k(scores, k=2, min_score=0.2)
+    assert top_index.tolist() == [[1, 2], [-1, -1], [0, 3]]
+    assert np.isnan(top_score[1]).all()
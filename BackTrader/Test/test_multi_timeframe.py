@@ -0,0 +1,46 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/18 22:05
+# @Author  : Adolf
+# @File    : test_multi_timeframe.py
+# @Function:
+import numpy as np
+import pandas as pd
+import pytest
+from finta import TA
+
+from BackTrader.multi_timeframe import PartialDayMACD, map_to_day_index
+
+
+def test_partial_day_macd_matches_full_recalculation():
+    rng = np.random.default_rng(0)
+    day_close = 100 + rng.normal(0, 1, 60).cumsum()
+    engine = PartialDayMACD(day_close)
+    day_data = pd.DataFrame(
+        {column: day_close.copy() for column in ["open", "high", "low", "close"]}
+    )
+
+    # 每天有若干根日内K线，部分日期没有日内K线
+    for day_index in sorted(rng.choice(60, 40, replace=False)):
+        for close in day_close[day_index] + rng.normal(0, 0.5, 3):
+            macd, signal, histogram = engine.update(day_index, close)
+            day_data.loc[day_index, "close"] = close
+            expected = TA.MACD(day_data).iloc[day_index]
+            assert macd == expected["MACD"]
+            assert signal == expected["SIGNAL"]
+            assert histogram == expected["MACD"] - expected["SIGNAL"]
+
+    expected = TA.MACD(day_data)
+    np.testing.assert_array_equal(
+        engine.histogram[: day_index + 1],
+        (expected["MACD"] - expected["SIGNAL"]).to_numpy()[: day_index + 1],
+    )
+
+
+def test_map_to_day_index():
+    day_dates = ["2022-01-04", "2022-01-05", "2022-01-06"]
+    intraday_dates = ["2022-01-04", "2022-01-04", "2022-01-06"]
+    assert map_to_day_index(intraday_dates, day_dates).tolist() == [0, 0, 2]
+
+    with pytest.raises(ValueError):
+        map_to_day_index(["2022-01-07"], day_dates)
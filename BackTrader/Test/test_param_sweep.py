@@ -0,0 +1,39 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/19 09:20
+# @Author  : Adolf
+# @File    : test_param_sweep.py
+# @Function:
+import pandas as pd
+import pytest
+
+from BackTrader.Test.sample_strategy import (
+    SmaCrossStrategy,
+    sample_config,
+    write_market_data,
+)
+
+CODE = "sh.600000"
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_param_sweep_matches_sequential_runs(tmp_path, monkeypatch, workers):
+    monkeypatch.chdir(tmp_path)
+    write_market_data(CODE)
+
+    strategy = SmaCrossStrategy(sample_config(CODE, WORKERS=workers))
+    sweep_df = strategy.run_param_sweep(CODE, {"short": [3, 5, 8], "long": 20})
+    # 与参数无关的指标只在加载数据时计算一次
+    assert strategy.shared_calls == 1
+    assert sweep_df["short"].tolist() == [3, 5, 8]
+
+    for _, row in sweep_df.iterrows():
+        param = {"short": row["short"], "long": row["long"]}
+        sequential = SmaCrossStrategy(sample_config(CODE))
+        pl_ration = sequential.run_one_stock_once(CODE, param)
+        assert row["策略的盈亏比"] == pl_ration
+
+        expected = sequential.pl_result["result"]
+        pd.testing.assert_series_equal(
+            row[expected.index], expected, check_names=False, check_dtype=False
+        )
@@ -0,0 +1,42 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/18 16:40
+# @Author  : Adolf
+# @File    : test_portfolio_trade.py
+# @Function:
+import numpy as np
+
+from BackTrader.portfolio_trade import PortfolioBacktest
+
+
+def test_portfolio_cash_accounting():
+    close = np.array(
+        [
+            [10.0, 20.0, np.nan],
+            [11.0, 20.0, 5.0],
+            [12.0, 22.0, 5.5],
+            [12.0, np.nan, 6.0],
+            [13.0, 24.0, 6.0],
+        ]
+    )
+    buy = np.zeros_like(close, dtype=bool)
+    sell = np.zeros_like(close, dtype=bool)
+    buy[0, [0, 1, 2]] = True
+    buy[3, 2] = True
+    sell[2, 0] = True
+    sell[3, 1] = True
+    sell[4, 1] = True
+
+    backtest = PortfolioBacktest(max_positions=2, init_cash=100.0, trade_rate=0.0)
+    result = backtest.run(close, buy, sell, score=np.array([[1.0, 2.0, 3.0]] * 5))
+
+    # 第0天第2只股票价格为nan不能买入，买入前两只，各分一半现金
+    assert result.position_nums.tolist() == [2, 2, 1, 2, 1]
+    np.testing.assert_allclose(result.equity.iloc[:3], [100.0, 105.0, 115.0])
+    # 第3天第1只股票停牌不能卖出，按最近一个有效价格计算净值，空出的仓位用全部现金买入第2只
+    np.testing.assert_allclose(result.equity.iloc[3], 60.0 + 55.0)
+    np.testing.assert_allclose(result.equity.iloc[4], 60.0 + 60.0)
+    record = result.transaction_record_df
+    assert record["pos_asset"].tolist() == [0, 1]
+    assert record["holding_time"].tolist() == [2, 4]
+    np.testing.assert_allclose(record["pct"], [0.2, 0.2])
@@ -0,0 +1,74 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/18 17:40
+# @Author  : Adolf
+# @File    : test_position_analysis.py
+# @Function:
+import numpy as np
+import pandas as pd
+import pytest
+from loguru import logger
+
+from BackTrader.position_analysis import BaseTransactionAnalysis, cal_max_down_array
+
+
+def test_cal_max_down_array():
+    max_draw_down, start_pos, end_pos = cal_max_down_array([1.0, 1.2, 0.9, 1.1, 0.6, 1.3])
+    assert (start_pos, end_pos) == (1, 4)
+    np.testing.assert_allclose(max_draw_down, 0.6 / 1.2 - 1)
+
+
+@pytest.mark.parametrize("ruined", [None, "middle", "first"])
+def test_batch_trader_analysis_matches_single(ruined):
+    rng = np.random.default_rng(0)
+    frames = []
+    for code in ["sh.600000", "sz.000001", "sz.000002"]:
+        n = int(rng.integers(1, 30))
+        frames.append(
+            pd.DataFrame(
+                {
+                    "pos_asset": code,
+                    "buy_date": [f"2022-01-{i:02d}" for i in range(n)],
+                    "holding_time": rng.integers(1, 10, n),
+                    "pct": np.round(rng.normal(0, 0.05, n), 4),
+                }
+            )
+        )
+    # 亏损全部本金之后净值为0，不能影响其他股票的结果
+    if ruined == "middle":
+        frames[0].loc[len(frames[0]) // 2, "pct"] = -1.0
+    elif ruined == "first":
+        # 第二组的第一笔交易就亏损全部本金，回撤开始时间仍然是本组的交易
+        frames[1].loc[0, "pct"] = -1.0
+
+    analysis = BaseTransactionAnalysis(logger)
+    batch_result = analysis.cal_batch_trader_analysis(
+        pd.concat(frames[::-1], ignore_index=True)
+    ).set_index("股票代码")
+
+    for df in frames:
+        single_result = analysis.cal_trader_analysis(df.copy())["result"]
+        row = batch_result.loc[df["pos_asset"].iloc[0]]
+        for key, value in row.items():
+            if isinstance(value, str):
+                assert value == single_result[key]
+            else:
+                np.testing.assert_allclose(value, single_result[key], rtol=1e-9)
+
+
+def test_asset_analysis_per_code():
+    analysis = BaseTransactionAnalysis(logger)
+    dates = ["2022-01-03", "2022-01-04", "2022-01-05"]
+    data_a = pd.DataFrame({"code": "a", "date": dates, "close": [1.0, 2.0, 1.5]})
+    data_b = pd.DataFrame({"code": "b", "date": dates, "close": [2.0, 1.0, 3.0]})
+
+    result_a = analysis.cal_asset_analysis(data_a)["result"]
+    result_b = analysis.cal_asset_analysis(data_b)["result"]
+    assert result_a["标的收益率"] == 1.5
+    assert result_b["标的收益率"] == 1.5
+    assert result_a["标的最大回撤"] == -0.25
+    assert result_b["标的最大回撤"] == -0.5
+    assert len(analysis.asset_analysis_cache) == 2
+
+    analysis.cal_asset_analysis(data_a)
+    assert len(analysis.asset_analysis_cache) == 2
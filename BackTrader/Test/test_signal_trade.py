@@ -0,0 +1,68 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/18 10:40
+# @Author  : Adolf
+# @File    : test_signal_trade.py
+# @Function:
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from BackTrader.core_trade_logic import CoreTradeLogic
+
+
+@dataclass
+class _Config:
+    LOG_LEVEL: str = "ERROR"
+    SIGNAL_MODE: bool = True
+
+
+class _SignalStrategy(CoreTradeLogic):
+    def __init__(self, signal_mode=True):
+        self.config = _Config(SIGNAL_MODE=signal_mode)
+        super().__init__()
+
+    def buy_logic(self):
+        return bool(self.trade_state.trading_step.buy_signal)
+
+    def sell_logic(self):
+        return bool(self.trade_state.trading_step.sell_signal)
+
+    def signal_logic(self, data):
+        return data["buy_signal"], data["sell_signal"]
+
+
+def _make_data(n, bars_per_day, seed):
+    rng = np.random.default_rng(seed)
+    days = pd.date_range("2015-01-01", periods=n // bars_per_day + 1, freq="D")
+    return pd.DataFrame(
+        {
+            "date": days.strftime("%Y-%m-%d").repeat(bars_per_day)[:n],
+            "code": "sh.600570",
+            "close": np.round(10 + rng.standard_normal(n).cumsum() * 0.1, 2),
+            "buy_signal": rng.random(n) < 0.1,
+            "sell_signal": rng.random(n) < 0.1,
+        }
+    )
+
+
+def test_signal_mode_matches_loop():
+    for bars_per_day in (1, 8):
+        data = _make_data(2000, bars_per_day, seed=bars_per_day)
+
+        loop_data = data.copy()
+        loop_df = _SignalStrategy(signal_mode=False).base_trade(loop_data)
+        signal_data = data.copy()
+        signal_df = _SignalStrategy().base_trade(signal_data)
+
+        assert len(loop_df) > 0
+        pd.testing.assert_frame_equal(
+            loop_df, signal_df, check_dtype=False, check_index_type=False
+        )
+        np.testing.assert_array_equal(
+            loop_data["buy"].fillna(0).to_numpy(), signal_data["buy"].fillna(0)
+        )
+        np.testing.assert_array_equal(
+            loop_data["sell"].fillna(0).to_numpy(), signal_data["sell"].fillna(0)
+        )
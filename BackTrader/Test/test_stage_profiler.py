@@ -0,0 +1,50 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/18 19:55
+# @Author  : Adolf
+# @File    : test_stage_profiler.py
+# @Function:
+import numpy as np
+import pytest
+
+from BackTrader.Test.sample_strategy import SmaCrossStrategy, sample_config
+from BackTrader.stage_profiler import profile_call, summarize_stage_timings
+
+
+def test_summarize_stage_timings():
+    timing_list = [
+        {"code": f"sh.60000{i}", "stage": "trade", "seconds": float(i)} for i in range(5)
+    ] + [{"code": "sh.600000", "stage": "load", "seconds": 0.5}]
+
+    summary_df = summarize_stage_timings(timing_list).set_index("stage")
+    assert summary_df.index.tolist() == ["trade", "load"]
+    assert summary_df.loc["trade", "count"] == 5
+    assert summary_df.loc["trade", "total"] == 10.0
+    np.testing.assert_allclose(summary_df.loc["trade", "p95"], 3.8)
+    assert summarize_stage_timings([]).empty
+
+
+def test_profile_call(tmp_path):
+    result, profile_path = profile_call(lambda: 42, str(tmp_path / "profile" / "case"))
+    assert result == 42
+    assert profile_path.endswith(".prof")
+    assert (tmp_path / "profile" / "case.prof").exists()
+
+
+def test_stage_resets_current_stage():
+    strategy = SmaCrossStrategy(sample_config())
+    with strategy.stage("load"):
+        with strategy.stage("indicators"):
+            assert strategy.current_stage == "indicators"
+        assert strategy.current_stage == "load"
+    assert strategy.current_stage is None
+    assert set(strategy.stage_timings) == {"load", "indicators"}
+
+    # 出错时异常上记录最内层的阶段
+    with pytest.raises(ValueError) as exc_info:
+        with strategy.stage("trade"):
+            with strategy.stage("analysis"):
+                raise ValueError("bad data")
+    assert exc_info.value.backtest_stage == "analysis"
+    assert strategy.current_stage is None
+    assert "trade" in strategy.stage_timings
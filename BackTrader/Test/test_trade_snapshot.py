@@ -0,0 +1,246 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/19 14:10
+# @Author  : Adolf
+# @File    : test_trade_snapshot.py
+# @Function:
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from Benchmark.backtest_benchmark import BenchmarkStrategy
+from Benchmark.synthetic_data import make_ohlcv
+from BackTrader.trade_snapshot import (
+    SNAPSHOT_FILE,
+    RawDigest,
+    TradeSnapshot,
+    load_snapshot,
+    save_snapshot,
+)
+from BackTrader.Test.sample_strategy import SmaCrossStrategy, sample_config
+from StrategyLib.OneAssetStrategy.macd_30m import MACD30CurMacdStrategy
+
+CODE = "sh.600000"
+DATA_PATH = f"Data/Baostock/day/{CODE}_None_None.csv"
+
+
+class HoldBarsStrategy(SmaCrossStrategy):
+    """均线金叉买入，持有5根K线卖出，持有的K线数保存在self上"""
+
+    stateless_trade = False
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.held_bars = 0
+
+    def buy_logic(self):
+        self.held_bars = 0
+        return super().buy_logic()
+
+    def sell_logic(self):
+        self.held_bars += 1
+        return self.held_bars >= 5
+
+    def get_snapshot_state(self):
+        return {"held_bars": self.held_bars}
+
+    def set_snapshot_state(self, state):
+        self.held_bars = state["held_bars"]
+        return True
+
+
+class UndeclaredStrategy(HoldBarsStrategy):
+    """没有声明逐K线状态，不能使用快照"""
+
+    get_snapshot_state = SmaCrossStrategy.get_snapshot_state
+    set_snapshot_state = SmaCrossStrategy.set_snapshot_state
+
+
+def count_logic_calls(strategy):
+    strategy.logic_calls = 0
+    for name in ("buy_logic", "sell_logic"):
+        logic = getattr(strategy, name)
+
+        def counted(logic=logic):
+            strategy.logic_calls += 1
+            return logic()
+
+        setattr(strategy, name, counted)
+    return strategy
+
+
+def run_strategy(strategy_cls, data, **config):
+    os.makedirs(os.path.dirname(DATA_PATH), exist_ok=True)
+    data.to_csv(DATA_PATH, index=False)
+    strategy = count_logic_calls(strategy_cls(sample_config(CODE, **config)))
+    strategy.run_one_stock_once(CODE, {"short": 5, "long": 10})
+    return strategy
+
+
+def assert_same_trades(resumed, full):
+    pd.testing.assert_frame_equal(
+        resumed.pl_result["result"].to_frame(), full.pl_result["result"].to_frame()
+    )
+    pd.testing.assert_frame_equal(resumed.data, full.data)
+
+
+@pytest.mark.parametrize(
+    "strategy_cls", [SmaCrossStrategy, BenchmarkStrategy, HoldBarsStrategy]
+)
+def test_resume_matches_full_run(tmp_path, monkeypatch, strategy_cls):
+    monkeypatch.chdir(tmp_path)
+    data = make_ohlcv(450, seed=3, code=CODE)
+    full = run_strategy(strategy_cls, data)
+    # 在持仓期间保存快照，策略的状态会影响之后的卖出
+    buy_positions = np.flatnonzero(full.data["buy"].to_numpy() == 1)
+    snapshot_date = full.data["date"].iloc[buy_positions[len(buy_positions) // 2] + 2]
+
+    prefix = data[data["date"] <= snapshot_date]
+    run_strategy(strategy_cls, prefix, SNAPSHOT_DIR="snapshot")
+    assert len(os.listdir("snapshot")) == 1
+    resumed = run_strategy(strategy_cls, data, SNAPSHOT_DIR="snapshot")
+
+    assert_same_trades(resumed, full)
+    # 从快照继续时只回测新增的K线
+    assert resumed.logic_calls < full.logic_calls
+    if isinstance(resumed, SmaCrossStrategy):
+        # 指标也只计算新增的K线
+        assert resumed.incremental_rows == [len(data) - len(prefix)]
+        assert resumed.indicator_params == []
+
+
+def test_resume_in_steps(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    data = make_ohlcv(450, seed=3, code=CODE)
+    for end in (400, 401, 401, 430, 450):
+        resumed = run_strategy(
+            HoldBarsStrategy, data.iloc[:end], SNAPSHOT_DIR="snapshot"
+        )
+    full = run_strategy(HoldBarsStrategy, data)
+    assert_same_trades(resumed, full)
+    assert resumed.incremental_rows == [20]
+
+    # 每次只追加新增K线的数据文件，没有新增K线时不写数据文件
+    (snapshot_dir,) = os.listdir("snapshot")
+    snapshot_dir = os.path.join("snapshot", snapshot_dir)
+    snapshot = load_snapshot(snapshot_dir)
+    assert [rows for _, rows in snapshot.data_parts][1:] == [1, 29, 20]
+    assert sorted(os.listdir(snapshot_dir)) == sorted(
+        [SNAPSHOT_FILE] + [name for name, _ in snapshot.data_parts]
+    )
+
+
+def test_changed_history_runs_full(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    data = make_ohlcv(450, seed=3, code=CODE)
+    run_strategy(HoldBarsStrategy, data.iloc[:400], SNAPSHOT_DIR="snapshot")
+
+    # 快照最早的K线之后被修订，只比较最后几根K线无法发现
+    data.loc[50, "close"] += 0.01
+    resumed = run_strategy(HoldBarsStrategy, data, SNAPSHOT_DIR="snapshot")
+    full = run_strategy(HoldBarsStrategy, data)
+    assert_same_trades(resumed, full)
+    assert resumed.logic_calls == full.logic_calls
+
+
+def test_unreadable_snapshot_runs_full(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    data = make_ohlcv(450, seed=3, code=CODE)
+    run_strategy(HoldBarsStrategy, data.iloc[:400], SNAPSHOT_DIR="snapshot")
+    (snapshot_dir,) = os.listdir("snapshot")
+    with open(os.path.join("snapshot", snapshot_dir, SNAPSHOT_FILE), "w") as f:
+        f.write("{")
+
+    resumed = run_strategy(HoldBarsStrategy, data, SNAPSHOT_DIR="snapshot")
+    full = run_strategy(HoldBarsStrategy, data)
+    assert_same_trades(resumed, full)
+    assert resumed.logic_calls == full.logic_calls
+    # 全量回测之后重新写入快照
+    assert load_snapshot(os.path.join("snapshot", snapshot_dir)).last_position == 449
+
+
+def test_undeclared_state_does_not_snapshot(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    data = make_ohlcv(450, seed=3, code=CODE)
+    run_strategy(UndeclaredStrategy, data.iloc[:400], SNAPSHOT_DIR="snapshot")
+    assert not os.path.exists("snapshot")
+
+
+def make_macd_30m_data(n_days, seed=5):
+    min30_data = make_ohlcv(n_days * 8, freq="30min", seed=seed, code=CODE)
+    day_data = min30_data.groupby("date", as_index=False).agg(
+        open=("open", "first"),
+        high=("high", "max"),
+        low=("low", "min"),
+        close=("close", "last"),
+    )
+    return min30_data, day_data
+
+
+def run_macd_30m(min30_data, day_data, snapshot=None):
+    strategy = count_logic_calls(MACD30CurMacdStrategy(sample_config(CODE)))
+    strategy.data = min30_data.copy()
+    strategy.day_data = day_data.copy()
+    strategy.prepare_indicators({})
+    transaction_record_df = strategy.base_trade(strategy.data, snapshot=snapshot)
+    return strategy, transaction_record_df
+
+
+@pytest.mark.parametrize("prefix_bars", [200 * 8, 200 * 8 + 3])
+def test_macd_30m_resume_matches_full_run(tmp_path, prefix_bars):
+    min30_data, day_data = make_macd_30m_data(250)
+    prefix_min30 = min30_data.iloc[:prefix_bars]
+    # 在一天中间保存快照时，快照中当天的日线收盘价是当时最新的30分钟收盘价
+    prefix_day = day_data.iloc[: -(-prefix_bars // 8)].copy()
+    prefix_day.iloc[-1, prefix_day.columns.get_loc("close")] = prefix_min30[
+        "close"
+    ].iloc[-1]
+
+    first, _ = run_macd_30m(prefix_min30, prefix_day)
+    snapshot_path = str(tmp_path / "macd_30m")
+    save_snapshot(
+        snapshot_path,
+        TradeSnapshot.from_trade_state(
+            first.trade_state,
+            first.data,
+            RawDigest.of(prefix_min30),
+            strategy_state=first.get_snapshot_state(),
+        ),
+    )
+
+    full, full_df = run_macd_30m(min30_data, day_data)
+    snapshot = load_snapshot(snapshot_path)
+    assert snapshot.match(min30_data)
+    resumed, resumed_df = run_macd_30m(min30_data, day_data, snapshot=snapshot)
+
+    pd.testing.assert_frame_equal(resumed_df, full_df)
+    pd.testing.assert_frame_equal(resumed.data, full.data)
+    for name in ("day_close", "macd", "signal", "histogram"):
+        np.testing.assert_array_equal(
+            getattr(resumed.day_macd, name), getattr(full.day_macd, name)
+        )
+    if prefix_bars % 8 == 0:
+        assert resumed.logic_calls < full.logic_calls / 4
+    else:
+        # 当天的日线收盘价之后发生了变化，无法恢复日线MACD的状态，全量回测
+        assert resumed.logic_calls == full.logic_calls
+
+
+def test_macd_30m_incremental_indicators():
+    min30_data, day_data = make_macd_30m_data(60)
+    full = MACD30CurMacdStrategy(sample_config(CODE))
+    full.data = min30_data.copy()
+    full.day_data = day_data.copy()
+    full.prepare_indicators({})
+
+    strategy = MACD30CurMacdStrategy(sample_config(CODE))
+    strategy.day_data = day_data.copy()
+    parts = []
+    indicator_state = None
+    for start, end in ((0, 200), (200, 201), (201, len(min30_data))):
+        strategy.data = min30_data.iloc[start:end].copy()
+        indicator_state = strategy.cal_incremental_indicators({}, indicator_state)
+        parts.append(strategy.data)
+    pd.testing.assert_frame_equal(pd.concat(parts, ignore_index=True), full.data)
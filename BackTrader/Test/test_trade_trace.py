@@ -0,0 +1,34 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/18 18:30
+# @Author  : Adolf
+# @File    : test_trade_trace.py
+# @Function:
+import json
+
+from BackTrader.core_trade_logic import OneTransactionRecord
+from BackTrader.trade_trace import STOP_EVENT, SELL_EVENT, TradeTracer, sell_event_type
+
+
+def test_tracer_ring_buffer_and_dump(tmp_path):
+    tracer = TradeTracer(capacity=3)
+    for pos in range(5):
+        tracer.record("bar", pos, f"2022-01-0{pos + 1}", "sh.600000", 10.0 + pos, False)
+    tracer.record("buy", 5, "2022-01-06", "sh.600000", 15.0, True, {"stop_loss": 14.0})
+
+    assert len(tracer) == 3
+    df = tracer.to_frame()
+    assert df["position"].tolist() == [3, 4, 5]
+    assert json.loads(df["detail"].iloc[-1]) == {"stop_loss": 14.0}
+
+    path = tracer.dump(str(tmp_path / "trace.json"))
+    with open(path) as f:
+        assert [event["event"] for event in json.load(f)] == ["bar", "bar", "buy"]
+
+
+def test_sell_event_type():
+    record = OneTransactionRecord(sell_price=9.0, stop_loss=9.5)
+    assert sell_event_type(record) == STOP_EVENT
+    record.sell_price = 10.0
+    assert sell_event_type(record) == SELL_EVENT
+    assert sell_event_type(OneTransactionRecord(sell_price=1.0)) == SELL_EVENT
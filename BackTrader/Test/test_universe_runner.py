@@ -0,0 +1,141 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/19 09:50
+# @Author  : Adolf
+# @File    : test_universe_runner.py
+# @Function:
+import numpy as np
+import pandas as pd
+import pytest
+
+from BackTrader.base_back_trader import _append_csv_rows
+from BackTrader.Test.sample_strategy import (
+    SmaCrossStrategy,
+    sample_config,
+    write_market_data,
+)
+from BackTrader.universe_runner import parse_args
+
+CODE_LIST = ["sh.600000", "sz.000001", "sh.600519"]
+BAD_CODE = "sz.000002"
+
+
+class NoisySmaStrategy(SmaCrossStrategy):
+    """短期均线加上np.random的噪声，结果依赖每只股票的随机种子"""
+
+    def cal_technical_indicators(self, indicators_config):
+        super().cal_technical_indicators(indicators_config)
+        self.data["sma_short"] += np.random.normal(0, 0.05, len(self.data))
+
+
+def write_universe():
+    for seed, code in enumerate(CODE_LIST):
+        write_market_data(code, seed=seed)
+    # 缺少turn列，加载数据时失败
+    data_path = write_market_data(BAD_CODE, seed=9)
+    pd.read_csv(data_path).drop(columns=["turn"]).to_csv(data_path, index=False)
+
+
+def test_parse_args_code_is_list():
+    assert parse_args(["--strategy", "a:B"]).code == ["ALL_MARKET"]
+    assert parse_args(["--strategy", "a:B", "--code", "sh.600000"]).code == [
+        "sh.600000"
+    ]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_universe_is_reproducible(tmp_path, monkeypatch, workers):
+    monkeypatch.chdir(tmp_path)
+    write_universe()
+    code_list = CODE_LIST + [BAD_CODE]
+
+    strategy = NoisySmaStrategy(
+        sample_config(
+            code_list,
+            WORKERS=workers,
+            UNIVERSE_CHUNK_SIZE=1,
+            UNIVERSE_RESULT_PATH="universe.csv",
+        )
+    )
+    universe_df = strategy.run_universe(code_list)
+
+    assert universe_df["code"].tolist() == CODE_LIST
+    assert strategy.universe_failures[["code", "stage"]].values.tolist() == [
+        [BAD_CODE, "load"]
+    ]
+    # 结果文件是每次追加写入的，与最终的结果表一致
+    pd.testing.assert_frame_equal(
+        pd.read_csv("universe.csv"), universe_df, check_dtype=False
+    )
+    assert pd.read_csv("universe_failures.csv")["code"].tolist() == [BAD_CODE]
+
+    # 每只股票的随机种子只由RANDOM_SEED和股票代码决定，与执行顺序无关
+    reversed_strategy = NoisySmaStrategy(sample_config(code_list[::-1]))
+    reversed_df = reversed_strategy.run_universe(code_list[::-1])
+    pd.testing.assert_frame_equal(
+        reversed_df.set_index("code").loc[CODE_LIST],
+        universe_df.set_index("code"),
+    )
+
+
+def test_append_csv_rows_rewrites_on_new_columns(tmp_path):
+    path = tmp_path / "result.csv"
+    rows = [{"code": "a", "x": 1.0}]
+    written, columns = _append_csv_rows(path, rows)
+    rows += [{"code": "b"}]
+    written, columns = _append_csv_rows(path, rows, written, columns)
+    assert (written, columns) == (2, ["code", "x"])
+    pd.testing.assert_frame_equal(pd.read_csv(path), pd.DataFrame(rows))
+
+    rows += [{"code": "c", "x": 3.0, "y": 4.0}]
+    written, columns = _append_csv_rows(path, rows, written, columns)
+    assert columns == ["code", "x", "y"]
+    pd.testing.assert_frame_equal(pd.read_csv(path), pd.DataFrame(rows))
+
+
+def record_calls(monkeypatch):
+    """记录run_one_stock的股票代码和show_one_stock的保存路径，不实际画图"""
+    calls = {"run": [], "show": []}
+    run_one_stock = SmaCrossStrategy.run_one_stock
+
+    def recorded_run(self, code_name=None):
+        calls["run"].append(code_name)
+        return run_one_stock(self, code_name=code_name)
+
+    def recorded_show(self, show_data, show_data_path=None):
+        calls["show"].append(show_data_path)
+
+    monkeypatch.setattr(SmaCrossStrategy, "run_one_stock", recorded_run)
+    monkeypatch.setattr(SmaCrossStrategy, "show_one_stock", recorded_show)
+    return calls
+
+
+@pytest.mark.parametrize("headless, shown", [(True, 0), (False, 1), (None, 1)])
+def test_headless_skips_rendering(tmp_path, monkeypatch, headless, shown):
+    monkeypatch.chdir(tmp_path)
+    write_market_data(CODE_LIST[0])
+    calls = record_calls(monkeypatch)
+
+    strategy = SmaCrossStrategy(sample_config(CODE_LIST[0], HEADLESS=headless))
+    strategy.run_one_stock()
+    assert len(calls["show"]) == shown
+
+
+def test_universe_charts_only_top_n(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_universe()
+    code_list = CODE_LIST + [BAD_CODE]
+    calls = record_calls(monkeypatch)
+
+    # HEADLESS为None时多股票回测的过程中不画图，结束后只为盈亏比最高和最低的股票画图
+    strategy = SmaCrossStrategy(
+        sample_config(code_list, HEADLESS=None, CHART_TOP_N=1, CHART_DIR="charts")
+    )
+    universe_df = strategy.run_universe(code_list)
+
+    ranked = universe_df.sort_values("策略的盈亏比", ascending=False)["code"]
+    chart_codes = [ranked.iloc[0], ranked.iloc[-1]]
+    assert len(set(chart_codes)) == 2
+    assert calls["run"] == code_list + chart_codes
+    assert calls["show"] == [f"charts/{code}.html" for code in chart_codes]
+    assert list(strategy.chart_paths) == chart_codes
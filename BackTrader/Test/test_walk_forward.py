@@ -0,0 +1,88 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/18 21:30
+# @Author  : Adolf
+# @File    : test_walk_forward.py
+# @Function:
+import pytest
+
+from BackTrader.Test.sample_strategy import (
+    SmaCrossStrategy,
+    sample_config,
+    write_market_data,
+)
+from BackTrader.walk_forward import walk_forward_windows
+
+CODE = "sh.600000"
+
+
+class PeriodsSmaStrategy(SmaCrossStrategy):
+    """均线周期用元组(short, long)作为一个参数"""
+
+    def cal_technical_indicators(self, indicators_config):
+        periods = indicators_config["periods"]
+        if not isinstance(periods, tuple):
+            raise TypeError(f"periods must be a tuple, got {periods!r}")
+        super().cal_technical_indicators({"short": periods[0], "long": periods[1]})
+
+
+def test_walk_forward_windows():
+    dates = [f"2022-01-{day:02d}" for day in range(1, 11)]
+    window_list = walk_forward_windows(dates, train_size=4, test_size=3)
+
+    assert [
+        (window.train_start, window.train_end, window.test_start, window.test_end)
+        for window in window_list
+    ] == [
+        ("2022-01-01", "2022-01-04", "2022-01-05", "2022-01-07"),
+        ("2022-01-04", "2022-01-07", "2022-01-08", "2022-01-10"),
+    ]
+    assert len(walk_forward_windows(dates, train_size=4, test_size=3, step=1)) == 6
+    assert walk_forward_windows(dates, train_size=10, test_size=3) == []
+
+
+def test_walk_forward_windows_align_to_days():
+    # 每天4根K线
+    dates = [f"2022-01-{day:02d}" for day in range(1, 11) for _ in range(4)]
+    window_list = walk_forward_windows(dates, train_size=6, test_size=5, step=3)
+
+    assert [
+        (window.train_start, window.train_end, window.test_start, window.test_end)
+        for window in window_list
+    ][:2] == [
+        ("2022-01-01", "2022-01-02", "2022-01-03", "2022-01-03"),
+        ("2022-01-02", "2022-01-03", "2022-01-04", "2022-01-04"),
+    ]
+    for window in window_list:
+        assert window.train_end < window.test_start <= window.test_end
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_walk_forward_intraday(tmp_path, monkeypatch, workers):
+    monkeypatch.chdir(tmp_path)
+    write_market_data(CODE, n_bars=8 * 120, freq="30min")
+
+    strategy = PeriodsSmaStrategy(
+        sample_config(
+            CODE,
+            WORKERS=workers,
+            WALK_FORWARD=True,
+            WALK_FORWARD_TRAIN_SIZE=8 * 40 + 3,
+            WALK_FORWARD_TEST_SIZE=8 * 20 + 5,
+            STRATEGY_PARAMS={"periods": [(3, 10), (5, 20)]},
+        )
+    )
+    strategy.run_one_stock()
+    walk_forward_df = strategy.walk_forward_result
+
+    assert len(walk_forward_df) >= 2
+    assert (walk_forward_df["train_end"] < walk_forward_df["test_start"]).all()
+    # 样本外首尾相接，互不重叠
+    assert (
+        walk_forward_df["test_start"].iloc[1:].to_numpy()
+        > walk_forward_df["test_end"].iloc[:-1].to_numpy()
+    ).all()
+    assert walk_forward_df["oos_metric"].notna().any()
+    # 最后用最优参数在全部历史上回测，参数仍然是元组
+    assert strategy.indicator_params[-1]["short"] in (3, 5)
+    assert "sma_short" in strategy.data
@@ -0,0 +1,126 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/18 11:05
+# @Author  : Adolf
+# @File    : bar_cursor.py
+# @Function: 逐K线回测使用的数组游标，替代iterrows生成的pd.Series
+import numpy as np
+import pandas as pd
+
+
+class BarView:
+    """
+    一根K线的轻量视图，支持和pd.Series一样的trading_step.close / trading_step["close"]访问方式
+    """
+
+    __slots__ = ("_columns", "_pos")
+
+    def __init__(self, columns, pos):
+        self._columns = columns
+        self._pos = pos
+
+    def __getattr__(self, item):
+        try:
+            return self._columns[item][self._pos]
+        except KeyError:
+            raise AttributeError(item) from None
+
+    def __getitem__(self, item):
+        return self._columns[item][self._pos]
+
+    def __contains__(self, item):
+        return item in self._columns
+
+    def get(self, item, default=None):
+        if item in self._columns:
+            return self._columns[item][self._pos]
+        return default
+
+    def keys(self):
+        return self._columns.keys()
+
+    def to_series(self):
+        return pd.Series({key: value[self._pos] for key, value in self._columns.items()})
+
+    def __repr__(self):
+        fields = ", ".join(
+            f"{key}={value[self._pos]!r}" for key, value in self._columns.items()
+        )
+        return f"BarView({fields})"
+
+
+class BarHistory:
+    """
+    最近N根K线的环形缓冲区，只保存K线位置，按从旧到新的顺序通过下标访问
+    """
+
+    __slots__ = ("_columns", "_buffer", "_head", "_size", "maxlen")
+
+    def __init__(self, columns, maxlen=1):
+        if maxlen < 1:
+            raise ValueError("maxlen must be greater than 0")
+        self._columns = columns
+        self._buffer = np.zeros(maxlen, dtype=np.int64)
+        self._head = 0
+        self._size = 0
+        self.maxlen = maxlen
+
+    def append(self, pos):
+        self._buffer[(self._head + self._size) % self.maxlen] = pos
+        if self._size < self.maxlen:
+            self._size += 1
+        else:
+            self._head = (self._head + 1) % self.maxlen
+
+    def positions(self):
+        return [self._buffer[(self._head + i) % self.maxlen] for i in range(self._size)]
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._size
+        if not 0 <= i < self._size:
+            raise IndexError("history index out of range")
+        return BarView(self._columns, self._buffer[(self._head + i) % self.maxlen])
+
+    def __iter__(self):
+        for i in range(self._size):
+            yield self[i]
+
+    def __repr__(self):
+        return f"BarHistory(positions={self.positions()})"
+
+
+class BarCursor:
+    """
+    将行情数据按列拆成NumPy数组，买卖标记先写进预分配的数组，回测结束后一次性写回DataFrame
+    """
+
+    def __init__(self, data: pd.DataFrame):
+        self.columns = {column: data[column].to_numpy() for column in data.columns}
+        self.index = data.index.to_numpy()
+
+        self.buy_marks = self._init_marks(data, "buy")
+        self.sell_marks = self._init_marks(data, "sell")
+
+    @staticmethod
+    def _init_marks(data, name):
+        if name in data:
+            return data[name].to_numpy(copy=True)
+        return np.full(len(data), np.nan)
+
+    def __len__(self):
+        return len(self.index)
+
+    def view(self, pos):
+        return BarView(self.columns, pos)
+
+    def history(self, maxlen=1):
+        return BarHistory(self.columns, maxlen=maxlen)
+
+    def attach_marks(self, data):
+        for name, marks in (("buy", self.buy_marks), ("sell", self.sell_marks)):
+            if name in data or not np.isnan(marks).all():
+                data[name] = marks
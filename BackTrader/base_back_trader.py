@@ -5,14 +5,19 @@
 # @File    : base_back_trader.py
 # @Function:
 
+import hashlib
 import itertools
 import json
 import os
 import random
 import statistics
-from dataclasses import dataclass, field
+import time
+import zlib
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
 import akshare as ak
 # from functools import reduce
+import numpy as np
 import pandas as pd
 import baostock as bs
 
@@ -21,16 +26,31 @@ import sys,os
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 
 from BackTrader.core_trade_logic import CoreTradeLogic
+from BackTrader.data_loader import date_range_slice, load_market_data, parse_dates
+from BackTrader.indicator_cache import IndicatorCache
 from BackTrader.position_analysis import BaseTransactionAnalysis
+from BackTrader.process_pool import get_worker_state, pool_map
+from BackTrader.stage_profiler import profile_call, summarize_stage_timings
+from BackTrader.trade_snapshot import (
+    MARK_COLUMNS,
+    RawDigest,
+    TradeSnapshot,
+    load_snapshot,
+    save_snapshot,
+)
+from BackTrader.walk_forward import walk_forward_windows
 from GetBaseData.handle_data_show import show_data_from_df
 from Utils.ShowKline.base_kline import draw_chart
 from Utils.TechnicalIndicators.basic_indicators import MACD, SMA
-from web_ui.time_sharing import get_index_data
 # from tqdm.auto import tqdm
 
 pd.set_option("expand_frame_repr", False)
 pd.set_option("display.max_rows", None)
 
+FAILURE_COLUMNS = ["code", "stage", "exception"]
+# 指标计算时允许修改的属性，其他属性有变化时不使用指标缓存
+CACHE_IGNORED_ATTRIBUTES = {"data", "current_stage", "stage_timings"}
+
 
 @dataclass
 class TradeStructureConfig:
@@ -48,6 +68,103 @@ class TradeStructureConfig:
     START_STAMP: str = field(default=None, metadata={"help": "开始时间"})
     END_STAMP: str = field(default=None, metadata={"help": "结束时间"})
     SHOW_DATA_PATH: str = field(default=None, metadata={"help": "展示数据路径"})
+    HISTORY_LENGTH: int = field(
+        default=1, metadata={"help": "逐K线回测时history_trading_step保留的历史K线数量"}
+    )
+    WORKERS: int = field(
+        default=1, metadata={"help": "参数寻优、全市场回测等并行任务使用的进程数,1表示不使用多进程"}
+    )
+    UNIVERSE_CHUNK_SIZE: int = field(
+        default=16, metadata={"help": "多股票回测时每次分发给一个进程的股票数量"}
+    )
+    UNIVERSE_RESULT_PATH: str = field(
+        default=None,
+        metadata={"help": "多股票回测结果保存路径(csv),失败记录保存在同目录下的*_failures.csv"},
+    )
+    SWEEP_RESULT_PATH: str = field(
+        default=None, metadata={"help": "参数寻优结果表的保存路径(csv),None表示不保存"}
+    )
+    INDICATOR_CACHE_DIR: str = field(
+        default=None, metadata={"help": "指标缓存目录,None表示不使用缓存"}
+    )
+    INDICATOR_CACHE_SIZE: int = field(
+        default=2048, metadata={"help": "指标缓存目录的大小上限(MB),超过后按LRU淘汰"}
+    )
+    SNAPSHOT_DIR: str = field(
+        default=None,
+        metadata={"help": "逐K线回测状态快照目录,设置后每次只回测快照之后新增的K线,None表示全量回测"},
+    )
+    SIGNAL_MODE: bool = field(
+        default=True,
+        metadata={
+            "help": "策略实现了signal_logic时使用向量化信号模式回测,False则使用buy_logic/sell_logic逐K线回测"
+        },
+    )
+    INTRABAR_EXIT: bool = field(
+        default=False,
+        metadata={
+            "help": "信号模式下止盈止损是否按最高价/最低价在K线内触发,False则与逐K线回测一样按收盘价判断"
+        },
+    )
+    TRAILING_STOP: float = field(
+        default=None, metadata={"help": "信号模式下移动止损的距离(价格),None表示不使用移动止损"}
+    )
+    TRACE_CODE: str = field(
+        default=None, metadata={"help": "需要追踪交易事件的股票代码,None表示关闭追踪"}
+    )
+    TRACE_SIZE: int = field(
+        default=100000, metadata={"help": "交易事件环形缓冲区的大小,超过后丢弃最早的事件"}
+    )
+    TRACE_PATH: str = field(
+        default=None,
+        metadata={"help": "交易事件的保存路径(*.parquet或*.json),None表示只保存在tracer中"},
+    )
+    PROFILE_CODE: str = field(
+        default=None, metadata={"help": "需要做性能分析的股票代码,None表示不做性能分析"}
+    )
+    PROFILER: str = field(
+        default="cprofile", metadata={"help": "性能分析工具,可选cprofile、pyinstrument"}
+    )
+    PROFILE_DIR: str = field(
+        default="Data/Profile", metadata={"help": "性能分析结果的保存目录"}
+    )
+    HEADLESS: bool = field(
+        default=None,
+        metadata={"help": "回测时不画图,None表示多股票回测时不画图、单只股票回测时画图"},
+    )
+    CHART_TOP_N: int = field(
+        default=0,
+        metadata={"help": "多股票回测结束后为盈亏比最高和最低的N只股票画图,0表示不画图"},
+    )
+    PRICE_DTYPE: str = field(
+        default="float64",
+        metadata={"help": "行情价格列的类型,float32可以减少内存,但是计算结果会有精度差异"},
+    )
+    CSV_ENGINE: str = field(
+        default=None, metadata={"help": "读取行情csv的引擎,可选pyarrow,None表示pandas默认引擎"}
+    )
+    WALK_FORWARD: bool = field(
+        default=False,
+        metadata={"help": "滚动窗口优化,每个样本内窗口寻找最优参数,在紧接着的样本外窗口检验"},
+    )
+    WALK_FORWARD_TRAIN_SIZE: int = field(
+        default=500, metadata={"help": "滚动窗口优化样本内的K线数量"}
+    )
+    WALK_FORWARD_TEST_SIZE: int = field(
+        default=120, metadata={"help": "滚动窗口优化样本外的K线数量"}
+    )
+    WALK_FORWARD_STEP: int = field(
+        default=None, metadata={"help": "相邻窗口滚动的K线数量,None表示等于样本外的K线数量"}
+    )
+    WALK_FORWARD_METRIC: str = field(
+        default="策略的盈亏比", metadata={"help": "样本内选择最优参数使用的指标,越大越好"}
+    )
+    WALK_FORWARD_RESULT_PATH: str = field(
+        default=None, metadata={"help": "滚动窗口优化结果的保存路径(csv),None表示不保存"}
+    )
+    CHART_DIR: str = field(
+        default="ShowHtml/Universe", metadata={"help": "多股票回测画图的保存目录,每只股票一个文件"}
+    )
 
 
 class TradeStructure(CoreTradeLogic):
@@ -63,90 +180,184 @@ class TradeStructure(CoreTradeLogic):
         self.stock_result = None
         self.pl_result = None
 
+        # 参数寻优时所有参数组合共享的数据和寻优结果
+        self.shared_data = None
+        self.sweep_result = None
+
+        # 滚动窗口优化时每组参数在全部历史上计算好指标的数据和优化结果
+        self.walk_forward_data = None
+        self.walk_forward_result = None
+
+        # 指标缓存，data_source记录当前数据的(股票代码、数据路径、开始时间、结束时间)
+        self.data_source = None
+        self.indicator_cache = (
+            IndicatorCache(
+                cache_dir=self.config.INDICATOR_CACHE_DIR,
+                max_bytes=self.config.INDICATOR_CACHE_SIZE * 1024**2,
+                logger=self.logger,
+            )
+            if self.config.INDICATOR_CACHE_DIR
+            else None
+        )
+        # 计算时修改了策略属性的指标，每次都重新计算
+        self.uncached_indicators = set()
+
+        # 多股票回测的结果和失败记录，stage_timings记录当前股票每个阶段的累计耗时
+        self.current_stage = None
+        self.stage_timings = dict()
+        self.universe_result = None
+        self.universe_failures = None
+        self.universe_timings = None
+        self.universe_written = None
+        self.chart_paths = None
+
+        # 无界面模式下run_one_stock不画图
+        self.headless = bool(self.config.HEADLESS)
+
         # 设置随机种子，保证实验结果的可复现性
         random.seed(self.config.RANDOM_SEED)
+        np.random.seed(self.config.RANDOM_SEED % 2**32)
+
+    # 标记当前所处的回测阶段，出错时用于定位失败的环节，同时累计每个阶段的耗时
+    @contextmanager
+    def stage(self, name):
+        previous_stage = self.current_stage
+        self.current_stage = name
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            # 出错时在异常上记录最内层的阶段，调用方据此记录失败的环节
+            error = sys.exc_info()[1]
+            if error is not None and not hasattr(error, "backtest_stage"):
+                error.backtest_stage = name
+            self.current_stage = previous_stage
+            self.stage_timings[name] = (
+                self.stage_timings.get(name, 0.0) + time.perf_counter() - start
+            )
 
     # 加载数据集
     def load_dataset(self, data_path, start_stamp=None, end_stamp=None):
-        df = pd.read_csv(data_path)
-        df["market_cap"] = (df["amount"] * 100 / df["turn"]) / pow(10, 8)
-
-        if start_stamp is not None:
-            df = df[df["date"] > start_stamp]
-
-        if end_stamp is not None:
-            df = df[df["date"] < end_stamp]
-
-        df.reset_index(drop=True, inplace=True)
+        # 只读取需要的列，开始和结束时间都不包含在内
+        df = load_market_data(
+            data_path,
+            start_stamp=start_stamp,
+            end_stamp=end_stamp,
+            columns=["date", "open", "high", "low", "close", "volume", "amount", "turn", "code"],
+            inclusive="neither",
+            price_dtype=self.config.PRICE_DTYPE,
+            engine=self.config.CSV_ENGINE,
+        )
+        market_cap = (df.pop("amount") * 100 / df["turn"]) / pow(10, 8)
+        df.insert(df.columns.get_loc("turn") + 1, "market_cap", market_cap)
 
         # self.logger.debug(df)
         self.data = df
-        self.data = self.data[
-            [
-                "date",
-                "open",
-                "high",
-                "low",
-                "close",
-                "volume",
-                "turn",
-                "market_cap",
-                "code",
-            ]
-        ]
 
     # 计算基础的交易指标
     def cal_base_technical_indicators(
         self, sma_list=(5, 10, 20), macd_parm=(12, 26, 9)
     ):
         if sma_list is not None:
-            for sma_parm in sma_list:
-                self.data["sma" + str(sma_parm)] = SMA(
-                    self.data["close"], timeperiod=sma_parm
-                )
+            # 所有周期共用一次前缀和
+            sma_array = SMA(self.data["close"].to_numpy(), timeperiod=list(sma_list))
+            for sma_parm, sma in zip(sma_list, sma_array):
+                self.data["sma" + str(sma_parm)] = sma
         if macd_parm is not None:
-            macd_df = MACD(
-                close=self.data["close"],
+            # MACD返回(diff, dea, (diff-dea)*2)，前两个分别是macd线和信号线
+            diff, dea, _ = MACD(
+                close=self.data["close"].to_numpy(),
                 fastperiod=macd_parm[0],
                 slowperiod=macd_parm[1],
                 signalperiod=macd_parm[2],
             )
+            self.data["macd"], self.data["signal"] = diff, dea
+            # 柱状图与pandas_ta的MACDh一致，是macd - signal，没有乘2
+            self.data["histogram"] = (diff - dea).round(4)
 
-            self.data["macd"], self.data["histogram"], self.data["signal"] = [
-                macd_df["MACD_12_26_9"],
-                macd_df["MACDh_12_26_9"],
-                macd_df["MACDs_12_26_9"],
-            ]
+    # 计算与策略参数无关的指标，参数寻优时只计算一次，所有参数组合共享
+    def cal_shared_indicators(self):
+        pass
 
     # 计算需要使用到的指标
     def cal_technical_indicators(self, indicators_config):
-        """可以计算需要用到的指标，如果不重写则使用默认的指标"""
+        """
+        可以计算需要用到的指标，如果不重写则使用默认的指标
+        配置了INDICATOR_CACHE_DIR时命中缓存不会调用这个函数，指标只能写入self.data，
+        在self上新增或者重新赋值的属性会被检测到，这样的策略不使用缓存
+        """
         self.cal_base_technical_indicators()
         # raise NotImplementedError
 
+    # 增量计算指标，配置了SNAPSHOT_DIR时从快照继续回测只计算新增的K线
+    def cal_incremental_indicators(self, indicators_config, indicator_state):
+        """
+        结果需要与cal_technical_indicators逐位相同，可以使用stream_indicators中的流式指标
+        :param indicators_config: 指标参数
+        :param indicator_state: 上一次返回的状态，self.data是这之后新增的K线；
+            None表示self.data是全部K线
+        :return: 递推到最后一根K线的状态，只包含dict、list、数字、字符串(保存为json)，
+            返回None表示不支持增量计算，此时不能修改self.data
+        """
+        return None
+
     # 使用的到的交涉策略细节(已废弃)
     # def trading_algorithm(self):
     #     raise NotImplementedError
 
     # 需要保证show_data里面的核心数据没有空值，不然会造成数据无法显示
     # @staticmethod
-    def show_one_stock(self, show_data):
-        if not os.path.exists("ShowHtml"):
-            os.mkdir("ShowHtml")
-        show_data_path = (
-            self.config.SHOW_DATA_PATH
-            if self.config.SHOW_DATA_PATH
-            else "ShowHtml/demo.html"
-        )
+    def show_one_stock(self, show_data, show_data_path=None):
+        if show_data_path is None:
+            show_data_path = (
+                self.config.SHOW_DATA_PATH
+                if self.config.SHOW_DATA_PATH
+                else "ShowHtml/demo.html"
+            )
+        os.makedirs(os.path.dirname(show_data_path) or ".", exist_ok=True)
         show_data = show_data_from_df(df_or_dfpath=show_data)
         # import pdb;pdb.set_trace()
         draw_chart(input_data=show_data, show_html_path=show_data_path)
 
-    # 使用一套参数对一只股票进行回测
-    def run_one_stock_once(self, code_name, indicators_config=None):
-        if indicators_config is None:
-            indicators_config = self.config.STRATEGY_PARAMS
+    # 计算指标，配置了INDICATOR_CACHE_DIR时相同数据和参数的指标直接从缓存读取
+    def cached_indicators(self, indicator_name, params, cal_func):
+        if (
+            self.indicator_cache is None
+            or self.data_source is None
+            or not isinstance(self.data, pd.DataFrame)
+            or indicator_name in self.uncached_indicators
+        ):
+            cal_func()
+            return
+
+        key = self.indicator_cache.make_key(
+            *self.data_source,
+            indicator_name=f"{type(self).__qualname__}.{indicator_name}",
+            params=params,
+        )
+        cached_data = self.indicator_cache.get(key)
+        if cached_data is not None:
+            self.data = cached_data
+            return
 
+        attributes = dict(vars(self))
+        cal_func()
+        # 命中缓存时不会执行cal_func，在self上留下状态的指标计算不能缓存
+        changed = sorted(
+            name
+            for name, value in vars(self).items()
+            if name not in CACHE_IGNORED_ATTRIBUTES
+            and (name not in attributes or attributes[name] is not value)
+        )
+        if changed:
+            self.logger.warning(f"{indicator_name}修改了{changed},不使用指标缓存")
+            self.uncached_indicators.add(indicator_name)
+            return
+        if isinstance(self.data, pd.DataFrame):
+            self.indicator_cache.put(key, self.data)
+
+    # 获取本地数据路径，本地没有数据时从baostock下载
+    def get_data_path(self, code_name):
         # if "sz." in code_name:
         #     codeStr = code_name.replace("sz.", "")
         # elif "sh." in code_name:
@@ -175,18 +386,179 @@ class TradeStructure(CoreTradeLogic):
             
             bs.logout()
 
-        self.load_dataset(
-            data_path=data_path,
-            start_stamp=self.config.START_STAMP,
-            end_stamp=self.config.END_STAMP,
-        )
+        return data_path
+
+    # 使用一套参数对一只股票进行回测
+    def run_one_stock_once(self, code_name, indicators_config=None):
+        if indicators_config is None:
+            indicators_config = self.config.STRATEGY_PARAMS
+
+        with self.stage("download"):
+            data_path = self.get_data_path(code_name)
+
+        with self.stage("load"):
+            self.load_dataset(
+                data_path=data_path,
+                start_stamp=self.config.START_STAMP,
+                end_stamp=self.config.END_STAMP,
+            )
+            self.data_source = (
+                code_name,
+                data_path,
+                self.config.START_STAMP,
+                self.config.END_STAMP,
+            )
+        with self.stage("indicators"):
+            self.cached_indicators(
+                "cal_shared_indicators", None, self.cal_shared_indicators
+            )
+
+        return self.run_loaded_data(indicators_config)
 
+    def prepare_indicators(self, indicators_config):
         self.cal_technical_indicators(indicators_config)
         self.data.dropna(
             axis=0, how="any", inplace=True
         )  # drop all rows that have any NaN values
         self.data.reset_index(drop=True, inplace=True)
 
+    def prepare_incremental_indicators(self, indicators_config, indicator_state=None):
+        """
+        :return: cal_incremental_indicators返回的状态，不支持增量计算时返回None
+        """
+        indicator_state = self.cal_incremental_indicators(
+            indicators_config, indicator_state
+        )
+        if indicator_state is not None:
+            self.data.dropna(axis=0, how="any", inplace=True)
+            self.data.reset_index(drop=True, inplace=True)
+        return indicator_state
+
+    # 增量回测的快照路径，与策略、股票代码、开始时间和参数有关，与结束时间无关
+    def get_snapshot_path(self, indicators_config):
+        if (
+            self.config.SNAPSHOT_DIR is None
+            or self.data_source is None
+            or self.use_signal_mode()
+        ):
+            return None
+        if not self.use_snapshot():
+            # 没有声明逐K线状态的策略从快照继续回测可能与全量回测的结果不同
+            self.logger.info(f"{type(self).__name__}没有实现get_snapshot_state，不使用快照")
+            return None
+
+        code_name = self.data_source[0]
+        key_str = json.dumps(
+            {"start_stamp": self.config.START_STAMP, "params": indicators_config},
+            sort_keys=True,
+            default=str,
+        )
+        key = hashlib.sha1(key_str.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(
+            self.config.SNAPSHOT_DIR, f"{type(self).__name__}_{code_name}_{key}"
+        )
+
+    def load_trade_snapshot(self, snapshot_path):
+        """
+        :param snapshot_path: get_snapshot_path返回的快照目录
+        :return: 与self.data中计算指标之前的行情匹配的快照，没有或者不匹配时返回None
+        """
+        try:
+            snapshot = load_snapshot(snapshot_path)
+        except Exception as e:
+            # 写了一半或者旧格式的快照当作没有快照，全量回测后覆盖
+            self.logger.warning(
+                f"快照{snapshot_path}读取失败,重新全量回测: {type(e).__name__}: {e}"
+            )
+            return None
+        if snapshot is None:
+            return None
+        if not snapshot.match(self.data):
+            self.logger.warning(f"{snapshot_path}与当前数据不一致，重新全量回测")
+            return None
+
+        self.logger.info(
+            f"从{snapshot.last_date}的快照继续回测"
+            f"{len(self.data) - snapshot.raw_digest.rows}根新增的K线"
+        )
+        return snapshot
+
+    # 在已经加载好的数据上使用一套参数进行回测
+    def run_loaded_data(self, indicators_config):
+        snapshot_path = self.get_snapshot_path(indicators_config)
+        if snapshot_path is None:
+            with self.stage("indicators"):
+                self.cached_indicators(
+                    "cal_technical_indicators",
+                    indicators_config,
+                    lambda: self.prepare_indicators(indicators_config),
+                )
+            return self.run_prepared_data(indicators_config)
+
+        with self.stage("indicators"):
+            snapshot, raw_digest, indicator_state = self.prepare_snapshot_indicators(
+                snapshot_path, indicators_config
+            )
+
+        return self.run_prepared_data(
+            indicators_config,
+            snapshot_path=snapshot_path,
+            snapshot=snapshot,
+            raw_digest=raw_digest,
+            indicator_state=indicator_state,
+        )
+
+    def prepare_snapshot_indicators(self, snapshot_path, indicators_config):
+        """
+        从快照继续回测时只计算新增K线的指标，拼接在快照保存的行情后面；
+        策略不支持增量计算时重新计算全部指标，快照之前的指标与快照相同才能继续回测
+        :return: (snapshot, raw_digest, indicator_state)，不能使用快照时snapshot为None
+        """
+        raw_data = self.data
+        snapshot = self.load_trade_snapshot(snapshot_path)
+        if snapshot is None:
+            raw_digest = RawDigest.of(raw_data)
+        else:
+            raw_digest = snapshot.raw_digest.extend(raw_data)
+
+        if snapshot is not None and snapshot.indicator_state is not None:
+            self.data = raw_data.iloc[snapshot.raw_digest.rows :].copy()
+            indicator_state = self.prepare_incremental_indicators(
+                indicators_config, snapshot.indicator_state
+            )
+            if indicator_state is not None:
+                self.data = snapshot.append_data(self.data)
+                return snapshot, raw_digest, indicator_state
+            self.data = raw_data
+
+        indicator_state = self.prepare_incremental_indicators(indicators_config)
+        if indicator_state is None:
+            self.cached_indicators(
+                "cal_technical_indicators",
+                indicators_config,
+                lambda: self.prepare_indicators(indicators_config),
+            )
+        if snapshot is not None and not snapshot.match_data(self.data):
+            self.logger.warning(f"{snapshot_path}中的指标与当前计算的不一致，重新全量回测")
+            snapshot = None
+        return snapshot, raw_digest, indicator_state
+
+    # 在已经计算好指标的self.data上回测并分析
+    def run_prepared_data(
+        self,
+        indicators_config,
+        snapshot_path=None,
+        snapshot=None,
+        raw_digest=None,
+        indicator_state=None,
+    ):
+        """
+        :param indicators_config: 指标参数
+        :param snapshot_path: 快照目录，None表示不保存快照
+        :param snapshot: 从这个快照继续回测
+        :param raw_digest: 计算指标之前的行情摘要，保存到新的快照中
+        :param indicator_state: 指标的递推状态，保存到新的快照中
+        """
         # if not self.cal_technical_indicators(indicators_config):
         # return False
 
@@ -194,19 +566,49 @@ class TradeStructure(CoreTradeLogic):
         # self.trading_algorithm()
         # transaction_record_df = self.strategy_execute()
 
-        transaction_record_df = self.base_trade(self.data)
+        with self.stage("trade"):
+            pretrade_marks = {
+                name: self.data[name].to_numpy(copy=True)
+                for name in MARK_COLUMNS
+                if snapshot_path is not None and name in self.data
+            }
+            self.start_trace()
+            transaction_record_df = self.base_trade(self.data, snapshot=snapshot)
+            self.finish_trace()
+            if snapshot_path is not None:
+                # 继续回测时快照之前的行情不变，只需要追加新增的K线
+                data_parts = snapshot.data_parts if snapshot is not None else None
+                save_snapshot(
+                    snapshot_path,
+                    TradeSnapshot.from_trade_state(
+                        self.trade_state,
+                        self.data,
+                        raw_digest,
+                        strategy_state=self.get_snapshot_state(),
+                        indicator_state=indicator_state,
+                        data_parts=data_parts,
+                        pretrade_marks=pretrade_marks,
+                    ),
+                )
 
-        asset_analysis = self.transaction_analysis.cal_asset_analysis(self.data)
+        with self.stage("analysis"):
+            asset_analysis = self.transaction_analysis.cal_asset_analysis(
+                self.data,
+                code=self.data_source[0] if self.data_source is not None else None,
+            )
 
-        if asset_analysis is not None:
-            self.logger.success(f"对标的进行分析:\n{asset_analysis}")
-            self.stock_result = asset_analysis
+            if asset_analysis is not None:
+                self.logger.success(f"对标的进行分析:\n{asset_analysis}")
+                self.stock_result = asset_analysis
 
-        if len(transaction_record_df) > 0:
-            strategy_analysis = self.transaction_analysis.cal_trader_analysis(
-                transaction_record_df
-            )
-        else:
+            if len(transaction_record_df) > 0:
+                strategy_analysis = self.transaction_analysis.cal_trader_analysis(
+                    transaction_record_df
+                )
+            else:
+                strategy_analysis = None
+
+        if strategy_analysis is None:
             self.logger.info("没有交易记录，无法进行交易分析")
             return None
 
@@ -220,6 +622,154 @@ class TradeStructure(CoreTradeLogic):
 
         return pl_ration
 
+    # 只对TRACE_CODE指定的股票开启交易事件追踪，每次回测前清空上一次的事件
+    def start_trace(self):
+        code = self.data_source[0] if self.data_source is not None else None
+        self.tracer.enabled = (
+            self.config.TRACE_CODE is not None and code == self.config.TRACE_CODE
+        )
+        if self.tracer.enabled:
+            self.tracer.clear()
+
+    def finish_trace(self):
+        if self.tracer.enabled and self.config.TRACE_PATH is not None:
+            self.tracer.dump(self.config.TRACE_PATH)
+            self.logger.info(
+                f"{self.config.TRACE_CODE}的{len(self.tracer)}条交易事件保存在{self.config.TRACE_PATH}"
+            )
+        self.tracer.enabled = False
+
+    # 参数中的列表展开为所有参数组合
+    @staticmethod
+    def get_param_list(indicators_config):
+        param_keys = list(indicators_config.keys())
+        param_values = [
+            value if isinstance(value, list) else [value]
+            for value in indicators_config.values()
+        ]
+        return [
+            dict(zip(param_keys, item, strict=True))
+            for item in itertools.product(*param_values)
+        ]
+
+    # 加载数据并计算与参数无关的指标，结果保存在self.shared_data中
+    def load_shared_data(self, code_name):
+        with self.stage("download"):
+            data_path = self.get_data_path(code_name)
+        with self.stage("load"):
+            self.load_dataset(
+                data_path=data_path,
+                start_stamp=self.config.START_STAMP,
+                end_stamp=self.config.END_STAMP,
+            )
+            self.data_source = (
+                code_name,
+                data_path,
+                self.config.START_STAMP,
+                self.config.END_STAMP,
+            )
+        with self.stage("indicators"):
+            self.cached_indicators(
+                "cal_shared_indicators", None, self.cal_shared_indicators
+            )
+        self.shared_data = self.data
+
+    # 参数寻优：数据只加载一次，所有参数组合分发到进程池中回测
+    def run_param_sweep(self, code_name, indicators_config=None):
+        if indicators_config is None:
+            indicators_config = self.config.STRATEGY_PARAMS
+
+        param_list = self.get_param_list(indicators_config)
+        self.load_shared_data(code_name)
+
+        result_list = list(
+            pool_map(
+                _run_sweep_param,
+                param_list,
+                workers=self.config.WORKERS,
+                state=self,
+            )
+        )
+        sweep_df = pd.DataFrame(result_list)
+        self.sweep_result = sweep_df
+        self.logger.success(f"{code_name}参数寻优结果:\n{sweep_df}")
+
+        if self.config.SWEEP_RESULT_PATH:
+            sweep_df.to_csv(self.config.SWEEP_RESULT_PATH, index=False)
+
+        # 用效果最好的一组参数重新回测，用于后续的结果展示
+        pl_ration_list = sweep_df["策略的盈亏比"].dropna()
+        if len(pl_ration_list) > 0:
+            best_param = param_list[pl_ration_list.idxmax()]
+            self.logger.success(f"{code_name}最优参数:{best_param}")
+            self.data = self.shared_data.copy()
+            self.run_loaded_data(best_param)
+
+        return sweep_df
+
+    # 滚动窗口优化：每组参数的指标在全部历史上只计算一次，各窗口按日期截取，窗口分发到进程池中并行
+    def run_walk_forward(self, code_name, indicators_config=None):
+        if indicators_config is None:
+            indicators_config = self.config.STRATEGY_PARAMS
+
+        param_list = self.get_param_list(indicators_config)
+        self.load_shared_data(code_name)
+
+        window_list = walk_forward_windows(
+            self.shared_data["date"],
+            train_size=self.config.WALK_FORWARD_TRAIN_SIZE,
+            test_size=self.config.WALK_FORWARD_TEST_SIZE,
+            step=self.config.WALK_FORWARD_STEP,
+        )
+        if len(window_list) == 0:
+            self.logger.warning(
+                f"{code_name}只有{len(self.shared_data)}根K线,不足一个滚动窗口"
+            )
+
+        walk_forward_data = []
+        for param in param_list:
+            self.data = self.shared_data.copy()
+            with self.stage("indicators"):
+                self.cached_indicators(
+                    "cal_technical_indicators",
+                    param,
+                    lambda param=param: self.prepare_indicators(param),
+                )
+            walk_forward_data.append((param, self.data, parse_dates(self.data["date"])))
+        self.walk_forward_data = walk_forward_data
+
+        result_list = list(
+            pool_map(
+                _run_walk_forward_window,
+                window_list,
+                workers=self.config.WORKERS,
+                state=self,
+            )
+        )
+        self.walk_forward_data = None
+
+        walk_forward_df = pd.DataFrame(result_list)
+        self.walk_forward_result = walk_forward_df
+        self.logger.success(f"{code_name}滚动窗口优化结果:\n{walk_forward_df}")
+
+        if self.config.WALK_FORWARD_RESULT_PATH:
+            walk_forward_df.to_csv(self.config.WALK_FORWARD_RESULT_PATH, index=False)
+
+        # 用最近一个窗口的最优参数在全部历史上回测，用于后续的结果展示
+        best_param_list = [
+            result["best_param"] for result in result_list if result["best_param"]
+        ]
+        if len(best_param_list) > 0:
+            # 直接使用参数对象，json会把元组变成列表
+            param_dict = {
+                json.dumps(param, ensure_ascii=False, sort_keys=True): param
+                for param in param_list
+            }
+            self.data = self.shared_data.copy()
+            self.run_loaded_data(param_dict[best_param_list[-1]])
+
+        return walk_forward_df
+
     def run_one_stock(self, code_name=None):
         pl_ration = 0
         # indicators_config = self.config.get("strategy_params", {})
@@ -235,26 +785,30 @@ class TradeStructure(CoreTradeLogic):
         # for blah in itertools.product()
         # self.logger.info(p)
 
-        if indicators_config:
+        if self.config.WALK_FORWARD:
+            walk_forward_df = self.run_walk_forward(
+                code_name=code_name, indicators_config=indicators_config
+            )
+            oos_metric_list = (
+                walk_forward_df["oos_metric"].dropna().tolist()
+                if "oos_metric" in walk_forward_df
+                else []
+            )
+            pl_ration = (
+                statistics.mean(oos_metric_list) if len(oos_metric_list) > 0 else None
+            )
+
+        elif indicators_config:
             if any(
                 [isinstance(value, list) for key, value in indicators_config.items()]
             ):
-                pl_ration_list = []
-                for item in itertools.product(
-                    *[value for key, value in indicators_config.items()]
-                ):
-                    self.logger.debug(item)
-                    one_indicator_config = {
-                        list(indicators_config.keys())[index]: item[index]
-                        for index in range(len(list(indicators_config.keys())))
-                    }
-
-                    one_pl_relation = self.run_one_stock_once(
-                        code_name=code_name, indicators_config=one_indicator_config
-                    )
-                    # if one_pl_relation is not nan:
-                    pl_ration_list.append(one_pl_relation)
-                pl_ration = statistics.mean(pl_ration_list)
+                sweep_df = self.run_param_sweep(
+                    code_name=code_name, indicators_config=indicators_config
+                )
+                pl_ration_list = sweep_df["策略的盈亏比"].dropna().tolist()
+                pl_ration = (
+                    statistics.mean(pl_ration_list) if len(pl_ration_list) > 0 else None
+                )
 
             else:
                 pl_ration = self.run_one_stock_once(code_name=code_name)
@@ -263,52 +817,199 @@ class TradeStructure(CoreTradeLogic):
             pl_ration = self.run_one_stock_once(code_name=code_name)
 
         self.logger.success(f"{code_name}的盈亏比是{pl_ration}")
-        self.show_one_stock(self.data)
+        if not self.headless:
+            with self.stage("show"):
+                self.show_one_stock(self.data)
+
+        return pl_ration
+
+    # PROFILE_CODE指定的股票在性能分析工具下运行，其他股票直接运行
+    def run_one_stock_profiled(self, code_name=None):
+        if code_name is None:
+            code_name = self.config.CODE_NAME
+        if self.config.PROFILE_CODE is None or code_name != self.config.PROFILE_CODE:
+            return self.run_one_stock(code_name=code_name)
 
+        pl_ration, profile_path = profile_call(
+            lambda: self.run_one_stock(code_name=code_name),
+            output_path=os.path.join(
+                self.config.PROFILE_DIR, f"{type(self).__name__}_{code_name}"
+            ),
+            profiler=self.config.PROFILER,
+            logger=self.logger,
+        )
+        self.logger.success(f"{code_name}的性能分析结果保存在{profile_path}")
         return pl_ration
 
+    # 获取全市场(或随机抽样部分)的股票代码
+    def get_market_code_list(self, code_name):
+        with open("Data/RealData/ALL_MARKET_CODE.json") as all_market_code:
+            market_code_dict = json.load(all_market_code)
+        self.logger.debug(market_code_dict)
+
+        market_code_list = list(market_code_dict.keys())
+
+        if code_name.upper() != "ALL_MARKET":
+            sample_num = int(code_name.split("_")[-1])
+            # 使用独立的随机数生成器，抽样结果只由RANDOM_SEED决定
+            market_code_list = random.Random(self.config.RANDOM_SEED).sample(
+                market_code_list, sample_num
+            )
+
+        self.logger.debug(market_code_list)
+        return market_code_list
+
+    # 多股票回测：按块分发到进程池，结果按股票顺序流式汇总，失败的股票记录所处阶段和异常
+    def run_universe(self, code_list):
+        workers = self.config.WORKERS
+        chunksize = max(1, self.config.UNIVERSE_CHUNK_SIZE)
+        flush_every = chunksize * max(1, workers)
+
+        result_list = []
+        failure_list = []
+        timing_list = []
+        cache_hits = cache_misses = 0
+        # 结果文件已经写入的行数和列，每次只追加新完成的股票
+        self.universe_written = {"result": (0, None), "failure": (0, None)}
+        for output in pool_map(
+            _run_universe_code,
+            code_list,
+            workers=workers,
+            state=self,
+            chunksize=chunksize,
+        ):
+            if output["failure"] is not None:
+                failure_list.append(output["failure"])
+            else:
+                result_list.append(output["result"])
+            cache_hits += output["cache_hits"]
+            cache_misses += output["cache_misses"]
+            timing_list.extend(output["timings"])
+
+            if (len(result_list) + len(failure_list)) % flush_every == 0:
+                self.logger.info(
+                    f"已完成{len(result_list) + len(failure_list)}/{len(code_list)}只股票"
+                )
+                self.flush_universe_result(result_list, failure_list)
+
+        self.save_universe_result(result_list, failure_list)
+        self.save_universe_timings(timing_list)
+        self.logger.success(f"各阶段耗时(秒):\n{self.universe_timings}")
+
+        if self.indicator_cache is not None:
+            self.logger.success(
+                f"指标缓存命中{cache_hits}次,未命中{cache_misses}次"
+            )
+
+        if len(failure_list) > 0:
+            self.logger.warning(
+                f"{len(failure_list)}只股票回测失败:\n"
+                f"{self.universe_failures.groupby('stage').size()}"
+            )
+
+        if self.config.CHART_TOP_N > 0:
+            self.render_universe_charts(
+                self.get_chart_code_list(self.universe_result, self.config.CHART_TOP_N)
+            )
+
+        return self.universe_result
+
+    # 按盈亏比选出最好和最差的top_n只股票
+    @staticmethod
+    def get_chart_code_list(universe_df, top_n):
+        if len(universe_df) == 0 or "策略的盈亏比" not in universe_df:
+            return []
+        ranked_df = universe_df.dropna(subset=["策略的盈亏比"]).sort_values(
+            "策略的盈亏比", ascending=False, kind="stable"
+        )
+        code_list = ranked_df["code"].head(top_n).tolist()
+        code_list += [
+            code for code in ranked_df["code"].tail(top_n) if code not in code_list
+        ]
+        return code_list
+
+    # 多股票回测结束后并行为选出的股票画图，每只股票保存为CHART_DIR下单独的html文件
+    def render_universe_charts(self, code_list):
+        chart_paths = dict()
+        for code, chart_path in zip(
+            code_list,
+            pool_map(
+                _render_code_chart, code_list, workers=self.config.WORKERS, state=self
+            ),
+            strict=True,
+        ):
+            if chart_path is not None:
+                chart_paths[code] = chart_path
+
+        self.chart_paths = chart_paths
+        self.logger.success(
+            f"{len(chart_paths)}/{len(code_list)}只股票的图表保存在{self.config.CHART_DIR}"
+        )
+        return chart_paths
+
+    # 把新完成的股票追加写入结果文件，不重写已经写入的行
+    def flush_universe_result(self, result_list, failure_list):
+        if not self.config.UNIVERSE_RESULT_PATH:
+            return
+        if self.universe_written is None:
+            self.universe_written = {"result": (0, None), "failure": (0, None)}
+
+        self.universe_written["result"] = _append_csv_rows(
+            self.config.UNIVERSE_RESULT_PATH,
+            result_list,
+            *self.universe_written["result"],
+        )
+        self.universe_written["failure"] = _append_csv_rows(
+            os.path.splitext(self.config.UNIVERSE_RESULT_PATH)[0] + "_failures.csv",
+            failure_list,
+            *self.universe_written["failure"],
+            base_columns=FAILURE_COLUMNS,
+        )
+
+    def save_universe_result(self, result_list, failure_list):
+        self.flush_universe_result(result_list, failure_list)
+        self.universe_result = pd.DataFrame(result_list)
+        self.universe_failures = pd.DataFrame(failure_list, columns=FAILURE_COLUMNS)
+
+    def save_universe_timings(self, timing_list):
+        self.universe_timings = summarize_stage_timings(timing_list)
+
+        if self.config.UNIVERSE_RESULT_PATH:
+            self.universe_timings.to_csv(
+                os.path.splitext(self.config.UNIVERSE_RESULT_PATH)[0]
+                + "_timings.csv",
+                index=False,
+            )
+
     def run(self) -> None:
         code_name = self.config.CODE_NAME
         self.logger.debug(code_name)
 
-        pl_ration_list = []
-        if isinstance(code_name, list):
-            for code in code_name:
-                one_pl_ration = self.run_one_stock(code_name=code)
-                pl_ration_list.append(one_pl_ration)
-            pl_ration = statistics.mean(pl_ration_list)
-
-        # elif code_name.upper() == "ALL_MARKET":
-        elif "ALL_MARKET" in code_name.upper():
-            with open("Data/RealData/ALL_MARKET_CODE.json") as all_market_code:
-                market_code_dict = json.load(all_market_code)
-            self.logger.debug(market_code_dict)
-
-            market_code_list = list(market_code_dict.keys())
-
-            if code_name.upper() != "ALL_MARKET":
-                sample_num = int(code_name.split("_")[-1])
-                market_code_list = random.sample(market_code_list, int(sample_num))
-
-            self.logger.debug(market_code_list)
-
-            for code in market_code_list:
-                self.logger.info(code)
-                try:
-                    one_pl_ration = self.run_one_stock(code_name=code)
-                    # self.logger.info(one_pl_ration)
-
-                    # 判断变量是否为nan,如果是nan则不添加进List
-                    if one_pl_ration == one_pl_ration and one_pl_ration is not None:
-                        pl_ration_list.append(one_pl_ration)
-                    # self.logger.info(pl_ration_list)
-                except Exception as e:
-                    self.logger.debug(e)
-                    self.logger.debug(code)
-            pl_ration = statistics.mean(pl_ration_list)
+        if isinstance(code_name, list) or "ALL_MARKET" in code_name.upper():
+            if isinstance(code_name, list):
+                market_code_list = code_name
+            else:
+                market_code_list = self.get_market_code_list(code_name)
+
+            universe_df = self.run_universe(market_code_list)
+            self.logger.success(f"多股票回测结果:\n{universe_df}")
+
+            # 判断变量是否为nan,如果是nan则不参与计算
+            pl_ration_list = (
+                universe_df["策略的盈亏比"].dropna().tolist()
+                if "策略的盈亏比" in universe_df
+                else []
+            )
+            pl_ration = (
+                statistics.mean(pl_ration_list) if len(pl_ration_list) > 0 else None
+            )
 
         else:
-            pl_ration = self.run_one_stock()
+            self.stage_timings = dict()
+            pl_ration = self.run_one_stock_profiled()
+            self.logger.success(f"各阶段耗时(秒):{self.stage_timings}")
+            if self.indicator_cache is not None:
+                self.logger.success(f"指标缓存统计:{self.indicator_cache.stats()}")
 
         if pl_ration is not None:
             self.logger.success(
@@ -322,6 +1023,179 @@ class TradeStructure(CoreTradeLogic):
         # self.run_one_stock()
 
 
+def _append_csv_rows(path, rows, written=0, columns=None, base_columns=None):
+    """
+    把rows[written:]追加写入csv，第一次写入或者出现新的列时重写整个文件
+    :param path: csv路径
+    :param rows: 全部结果，list[dict]
+    :param written: 已经写入文件的行数
+    :param columns: 文件当前的列，None表示还没有写入
+    :param base_columns: rows为空时也要写入的列
+    :return: (已经写入文件的行数, 文件的列)
+    """
+    new_df = pd.DataFrame(rows[written:], columns=base_columns)
+    if columns is None or not set(new_df.columns).issubset(columns):
+        all_df = pd.DataFrame(rows, columns=base_columns)
+        all_df.to_csv(path, index=False)
+        return len(rows), list(all_df.columns)
+
+    if len(new_df) > 0:
+        new_df.reindex(columns=columns).to_csv(
+            path, mode="a", header=False, index=False
+        )
+    return len(rows), columns
+
+
+def _seed_code(seed, code):
+    """每只股票使用由RANDOM_SEED和股票代码决定的随机种子，结果与进程数和执行顺序无关"""
+    code_seed = seed + zlib.crc32(code.encode())
+    random.seed(code_seed)
+    np.random.seed(code_seed % 2**32)
+
+
+def _run_sweep_param(indicators_config):
+    strategy = get_worker_state()
+    strategy.data = strategy.shared_data.copy()
+    strategy.pl_result = None
+
+    result = dict(indicators_config)
+    result["策略的盈亏比"] = strategy.run_loaded_data(indicators_config)
+    if strategy.pl_result is not None:
+        result.update(strategy.pl_result["result"].to_dict())
+    return result
+
+
+def _run_window_param(strategy, param, data, date_values, start, end):
+    date_slice = date_range_slice(date_values, start_stamp=start, end_stamp=end)
+    # 窗口太短时无法交易
+    if date_slice.stop - date_slice.start < 2:
+        return None, None
+
+    strategy.data = data.iloc[date_slice].reset_index(drop=True)
+    strategy.pl_result = None
+    strategy.run_prepared_data(param)
+    if strategy.pl_result is None:
+        return None, None
+    return (
+        strategy.pl_result.loc[strategy.config.WALK_FORWARD_METRIC, "result"],
+        strategy.pl_result["result"].to_dict(),
+    )
+
+
+def _run_walk_forward_window(window):
+    strategy = get_worker_state()
+    # 窗口是历史数据的片段，不能使用增量回测的快照
+    snapshot_dir = strategy.config.SNAPSHOT_DIR
+    strategy.config.SNAPSHOT_DIR = None
+    try:
+        best_metric = None
+        best_index = None
+        for index, (param, data, date_values) in enumerate(strategy.walk_forward_data):
+            metric, _ = _run_window_param(
+                strategy, param, data, date_values, window.train_start, window.train_end
+            )
+            if metric is not None and not pd.isna(metric):
+                if best_metric is None or metric > best_metric:
+                    best_metric, best_index = metric, index
+
+        result = asdict(window)
+        result.update(
+            {"best_param": None, "is_metric": best_metric, "oos_metric": None}
+        )
+        if best_index is None:
+            return result
+
+        param, data, date_values = strategy.walk_forward_data[best_index]
+        result["best_param"] = json.dumps(param, ensure_ascii=False, sort_keys=True)
+        oos_metric, oos_result = _run_window_param(
+            strategy, param, data, date_values, window.test_start, window.test_end
+        )
+        result["oos_metric"] = oos_metric
+        if oos_result is not None:
+            result.update({f"oos_{key}": value for key, value in oos_result.items()})
+        return result
+    finally:
+        strategy.config.SNAPSHOT_DIR = snapshot_dir
+
+
+def _run_universe_code(code):
+    strategy = get_worker_state()
+    _seed_code(strategy.config.RANDOM_SEED, code)
+    strategy.pl_result = None
+    strategy.stock_result = None
+    strategy.current_stage = None
+    strategy.stage_timings = dict()
+
+    # 进程池中的单只股票不再嵌套开启参数寻优的进程池
+    workers = strategy.config.WORKERS
+    strategy.config.WORKERS = 1
+    # 多股票回测时每只股票都画图会互相覆盖，除非HEADLESS设置为False，否则只在回测结束后为选出的股票画图
+    headless = strategy.headless
+    strategy.headless = strategy.config.HEADLESS is not False
+    cache_stats = (
+        strategy.indicator_cache.stats() if strategy.indicator_cache else None
+    )
+
+    output = {
+        "result": None,
+        "failure": None,
+        "cache_hits": 0,
+        "cache_misses": 0,
+        "timings": [],
+    }
+    strategy.logger.info(code)
+    try:
+        pl_ration = strategy.run_one_stock_profiled(code_name=code)
+        output["result"] = {"code": code, "策略的盈亏比": pl_ration}
+        if strategy.stock_result is not None:
+            output["result"].update(strategy.stock_result["result"].to_dict())
+        if strategy.pl_result is not None:
+            output["result"].update(strategy.pl_result["result"].to_dict())
+    except Exception as e:
+        strategy.logger.debug(e)
+        output["failure"] = {
+            "code": code,
+            "stage": getattr(e, "backtest_stage", strategy.current_stage),
+            "exception": f"{type(e).__name__}: {e}",
+        }
+    finally:
+        strategy.config.WORKERS = workers
+        strategy.headless = headless
+        output["timings"] = [
+            {"code": code, "stage": stage_name, "seconds": seconds}
+            for stage_name, seconds in strategy.stage_timings.items()
+        ]
+
+    if cache_stats is not None:
+        output["cache_hits"] = strategy.indicator_cache.hits - cache_stats["hits"]
+        output["cache_misses"] = (
+            strategy.indicator_cache.misses - cache_stats["misses"]
+        )
+    return output
+
+
+def _render_code_chart(code):
+    strategy = get_worker_state()
+    # 使用与多股票回测相同的随机种子，画出的买卖点与回测结果一致
+    _seed_code(strategy.config.RANDOM_SEED, code)
+
+    workers = strategy.config.WORKERS
+    strategy.config.WORKERS = 1
+    headless = strategy.headless
+    strategy.headless = True
+    try:
+        strategy.run_one_stock(code_name=code)
+        chart_path = os.path.join(strategy.config.CHART_DIR, f"{code}.html")
+        strategy.show_one_stock(strategy.data, show_data_path=chart_path)
+    except Exception as e:
+        strategy.logger.warning(f"{code}画图失败: {type(e).__name__}: {e}")
+        return None
+    finally:
+        strategy.config.WORKERS = workers
+        strategy.headless = headless
+    return chart_path
+
+
 # if __name__ == '__main__':
 #     trade_structure = TradeStructure(config="")
 #     trade_structure.run_one_stock(code_name="600570", start_stamp="2021-01-01", end_stamp="2021-12-31")
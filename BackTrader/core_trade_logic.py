@@ -9,8 +9,20 @@ FilePath     : /stock_quant/BackTrader/core_trade_logic.py
 
 from dataclasses import dataclass, field
 
+import numpy as np
 import pandas as pd
 
+from BackTrader.bar_cursor import BarCursor, BarHistory, BarView
+from BackTrader.exit_scanner import pair_exit_levels
+from BackTrader.signal_trade import build_transaction_records, pair_signals
+from BackTrader.trade_trace import (
+    BAR_EVENT,
+    BUY_EVENT,
+    SELL_EVENT,
+    STOP_EVENT,
+    TradeTracer,
+    sell_event_type,
+)
 from Utils.base_utils import get_logger
 
 from .position_analysis import BaseTransactionAnalysis
@@ -30,15 +42,18 @@ class OneTransactionRecord:
 
 @dataclass
 class TradeStructure:
-    trading_step: pd.Series = field(
+    trading_step: BarView = field(
         default=None, metadata={"help": "当前交易标的物的状态"}
     )
     one_transaction_record: OneTransactionRecord = field(
         default=None, metadata={"help": "当前交易记录"}
     )
-    history_trading_step: list[pd.Series] = field(
+    history_trading_step: BarHistory = field(
         default=None, metadata={"help": "历史交易记录"}
     )
+    transaction_record_list: list[OneTransactionRecord] = field(
+        default=None, metadata={"help": "已经完成的交易记录"}
+    )
 
     # def __post_init__(self):
     #     self.one_transaction_record = OneTransactionRecord()
@@ -48,12 +63,16 @@ class TradeStructure:
 class CoreTradeLogic:
     def __init__(self) -> None:
         self.trade_rate = 1.5 / 1000
+        # 逐K线回测时保留的历史K线数量
+        self.history_length = getattr(self.config, "HISTORY_LENGTH", 1)
 
         self.logger = get_logger(
             level=self.config.LOG_LEVEL, console=True, logger_file=None
         )
 
         self.trade_state = TradeStructure()
+        # 交易事件追踪，默认关闭，只对指定的股票开启
+        self.tracer = TradeTracer(capacity=getattr(self.config, "TRACE_SIZE", 100000))
         # 针对交易结果进行分析
         self.transaction_analysis = BaseTransactionAnalysis(logger=self.logger)
 
@@ -63,8 +82,61 @@ class CoreTradeLogic:
     def sell_logic(self):
         raise NotImplementedError
 
+    def signal_logic(self, data):
+        """
+        向量化信号模式，一次性返回整段行情的买卖信号，不重写则使用buy_logic/sell_logic逐K线判断
+        只适用于信号不依赖持仓状态的策略
+        :param data: 计算完指标的行情数据
+        :return: (buy_signal, sell_signal) 与data等长的bool列或数组
+        """
+        raise NotImplementedError
+
+    def exit_levels(self, data):
+        """
+        信号模式下按止盈止损离场的策略重写，返回在每根K线买入时的止损价和止盈价，
+        卖出位置由exit_scanner向量化查找，signal_logic返回的卖出信号可以为None
+        :param data: 计算完指标的行情数据
+        :return: (stop_loss, take_profit) 与data等长，nan表示不设置
+        """
+        raise NotImplementedError
+
+    def use_exit_levels(self):
+        return type(self).exit_levels is not CoreTradeLogic.exit_levels
+
+    def use_signal_mode(self):
+        if not getattr(self.config, "SIGNAL_MODE", True):
+            return False
+        return type(self).signal_logic is not CoreTradeLogic.signal_logic
+
+    # buy_logic、sell_logic只依赖trade_state和当前K线，没有在self上保存逐K线的状态时为True
+    stateless_trade = False
+
+    def get_snapshot_state(self):
+        """
+        逐K线回测结束时保存到快照中的策略状态，在buy_logic、sell_logic中修改self上状态的策略需要重写，
+        与set_snapshot_state配套使用
+        :return: 只包含dict、list、数字、字符串的对象(保存为json)，
+            None表示策略的状态无法保存，不能从快照继续回测
+        """
+        return {} if self.stateless_trade else None
+
+    def set_snapshot_state(self, state):
+        """
+        从快照继续回测前恢复get_snapshot_state保存的状态
+        :param state: get_snapshot_state的返回值
+        :return: bool 状态与当前数据不一致无法恢复时返回False，从头全量回测
+        """
+        return True
+
+    def use_snapshot(self):
+        return (
+            self.stateless_trade
+            or type(self).get_snapshot_state is not CoreTradeLogic.get_snapshot_state
+        )
+
     def buy(self, index, trading_step, one_transaction_record):
-        self.logger.debug(f"buy {index} {trading_step} {one_transaction_record}")
+        # 使用loguru的参数格式化，日志级别不输出时不会拼接字符串
+        self.logger.debug("buy {} {} {}", index, trading_step, one_transaction_record)
 
         one_transaction_record.pos_asset = trading_step.code
         one_transaction_record.buy_date = trading_step.date
@@ -74,7 +146,9 @@ class CoreTradeLogic:
         return one_transaction_record
 
     def sell(self, index, trading_step, one_transaction_record):
-        self.logger.debug(f"sell {index} \n {trading_step} \n {one_transaction_record}")
+        self.logger.debug(
+            "sell {} \n {} \n {}", index, trading_step, one_transaction_record
+        )
 
         one_transaction_record.sell_date = trading_step.date
         one_transaction_record.sell_price = trading_step.close
@@ -85,27 +159,185 @@ class CoreTradeLogic:
         self.logger.debug(one_transaction_record)
         return one_transaction_record
 
-    def base_trade(self, data) -> list[dict]:
-        self.trade_state.one_transaction_record = OneTransactionRecord()
+    def cal_transaction_pct(self, transaction_record_df):
+        transaction_record_df["pct"] = (
+            round(
+                (
+                    transaction_record_df["sell_price"]
+                    / transaction_record_df["buy_price"]
+                )
+                * (1 - self.trade_rate),
+                4,
+            )
+            - 1
+        )
+        return transaction_record_df
+
+    def signal_trade(self, data) -> pd.DataFrame:
+        buy_signal, sell_signal = self.signal_logic(data)
+        if self.use_exit_levels():
+            stop_loss, take_profit = self.exit_levels(data)
+            (
+                entries,
+                exits,
+                open_entry,
+                sell_price,
+                stop_loss,
+                take_profit,
+            ) = pair_exit_levels(
+                buy_signal,
+                stop_loss,
+                take_profit,
+                data["close"].to_numpy(),
+                high=data["high"].to_numpy() if "high" in data else None,
+                low=data["low"].to_numpy() if "low" in data else None,
+                open_=data["open"].to_numpy() if "open" in data else None,
+                sell_signal=sell_signal,
+                dates=data["date"].to_numpy(),
+                intrabar=getattr(self.config, "INTRABAR_EXIT", False),
+                trailing_stop=getattr(self.config, "TRAILING_STOP", None),
+            )
+        else:
+            entries, exits, open_entry = pair_signals(
+                buy_signal, sell_signal, dates=data["date"].to_numpy()
+            )
+            sell_price = stop_loss = take_profit = None
+
+        # 与逐K线模式一样在行情数据上标记买卖点，用于画图展示
+        buy_marks = np.full(len(data), np.nan)
+        buy_marks[entries] = 1
+        if open_entry >= 0:
+            buy_marks[open_entry] = 1
+        sell_marks = np.full(len(data), np.nan)
+        sell_marks[exits] = 1
+        data["buy"] = buy_marks
+        data["sell"] = sell_marks
+
+        transaction_record_df = build_transaction_records(
+            data, entries, exits, take_profit, stop_loss, sell_price
+        )
+        if self.tracer.enabled:
+            self.trace_signals(data, entries, exits, open_entry, transaction_record_df)
+        self.logger.debug(transaction_record_df)
+
+        if len(transaction_record_df) == 0:
+            return transaction_record_df
+
+        transaction_record_df = self.cal_transaction_pct(transaction_record_df)
+        self.logger.info(transaction_record_df)
 
-        self.trade_state.history_trading_step = []
-        transaction_record_list = []
+        return transaction_record_df
+
+    def trace_signals(self, data, entries, exits, open_entry, transaction_record_df):
+        # 向量化模式没有逐K线的判断过程，只记录买卖事件
+        dates = data["date"].to_numpy()
+        codes = data["code"].to_numpy() if "code" in data else np.full(len(data), None)
+        close = data["close"].to_numpy()
+
+        buy_positions = entries if open_entry < 0 else np.append(entries, open_entry)
+        self.tracer.record_many(
+            BUY_EVENT,
+            buy_positions,
+            dates[buy_positions],
+            codes[buy_positions],
+            close[buy_positions],
+            True,
+        )
+        if len(transaction_record_df) == 0:
+            return
+
+        # 与逐K线模式的sell_event_type一致，卖出价格不高于止损价时记为止损事件
+        sell_price = transaction_record_df["sell_price"].to_numpy(dtype=np.double)
+        is_stop = sell_price <= transaction_record_df["stop_loss"].to_numpy(
+            dtype=np.double
+        )
+        for event, mask in ((SELL_EVENT, ~is_stop), (STOP_EVENT, is_stop)):
+            self.tracer.record_many(
+                event,
+                exits[mask],
+                dates[exits[mask]],
+                codes[exits[mask]],
+                sell_price[mask],
+                False,
+            )
+
+    def base_trade(self, data, snapshot=None) -> pd.DataFrame:
+        """
+        :param data: 计算完指标的行情数据
+        :param snapshot: TradeSnapshot，不为None时从快照恢复交易状态，只回测快照之后的K线
+        """
+        if self.use_signal_mode():
+            return self.signal_trade(data)
+
+        # 按列转成NumPy数组逐K线访问，避免iterrows为每根K线构造pd.Series
+        if snapshot is not None and not self.set_snapshot_state(
+            snapshot.strategy_state
+        ):
+            self.logger.warning("策略状态无法从快照恢复，重新全量回测")
+            snapshot = None
+
+        cursor = BarCursor(data)
+        history = cursor.history(maxlen=self.history_length)
+
+        if snapshot is None:
+            start = 0
+            self.trade_state.one_transaction_record = OneTransactionRecord()
+            transaction_record_list = []
+        else:
+            start = snapshot.last_position + 1
+            self.trade_state.one_transaction_record = snapshot.one_transaction_record
+            transaction_record_list = list(snapshot.transaction_record_list)
+            for pos in snapshot.history_positions:
+                history.append(pos)
+            cursor.buy_marks[snapshot.buy_positions] = 1
+            cursor.sell_marks[snapshot.sell_positions] = 1
+
+        self.trade_state.history_trading_step = history
+        self.trade_state.transaction_record_list = transaction_record_list
         # self.logger.debug(one_transaction_record)
 
-        for index, trading_step in data.iterrows():
-            if len(self.trade_state.history_trading_step) == 0:
-                self.trade_state.history_trading_step.append(trading_step)
+        tracing = self.tracer.enabled
+        tracer = self.tracer
+
+        for pos in range(start, len(cursor)):
+            trading_step = cursor.view(pos)
+            if len(history) == 0:
+                history.append(pos)
                 continue
 
             self.trade_state.trading_step = trading_step
+            if tracing:
+                tracer.record(
+                    BAR_EVENT,
+                    pos,
+                    trading_step.date,
+                    trading_step.get("code"),
+                    trading_step.close,
+                    self.trade_state.one_transaction_record.buy_date is not None,
+                )
             if (
                 self.trade_state.one_transaction_record.buy_date is None
                 and self.buy_logic()
             ):
-                data.loc[index, "buy"] = 1
+                cursor.buy_marks[pos] = 1
                 one_transaction_record = self.buy(
-                    index, trading_step, self.trade_state.one_transaction_record
+                    cursor.index[pos],
+                    trading_step,
+                    self.trade_state.one_transaction_record,
                 )
+                if tracing:
+                    tracer.record(
+                        BUY_EVENT,
+                        pos,
+                        trading_step.date,
+                        trading_step.get("code"),
+                        trading_step.close,
+                        True,
+                        {
+                            "take_profit": one_transaction_record.take_profit,
+                            "stop_loss": one_transaction_record.stop_loss,
+                        },
+                    )
                 continue
 
             if (
@@ -113,22 +345,38 @@ class CoreTradeLogic:
                 and self.trade_state.one_transaction_record.buy_date is not None
                 and self.sell_logic()
             ):
-                data.loc[index, "sell"] = 1
+                cursor.sell_marks[pos] = 1
                 one_transaction_record = self.sell(
-                    index, trading_step, self.trade_state.one_transaction_record
+                    cursor.index[pos],
+                    trading_step,
+                    self.trade_state.one_transaction_record,
                 )
 
                 transaction_record_list.append(one_transaction_record)
                 self.trade_state.one_transaction_record = OneTransactionRecord()
+                if tracing:
+                    tracer.record(
+                        sell_event_type(one_transaction_record),
+                        pos,
+                        trading_step.date,
+                        trading_step.get("code"),
+                        trading_step.close,
+                        False,
+                        {
+                            "buy_date": one_transaction_record.buy_date,
+                            "buy_price": one_transaction_record.buy_price,
+                            "holding_time": one_transaction_record.holding_time,
+                        },
+                    )
 
                 # if self.buy_logic(trading_step, one_transaction_record):
                 #     one_transaction_record = self.buy(
                 #         index, trading_step, one_transaction_record
                 #     )
 
-            self.trade_state.history_trading_step.append(trading_step)
-            if len(self.trade_state.history_trading_step) > 1:
-                self.trade_state.history_trading_step.pop(0)
+            history.append(pos)
+
+        cursor.attach_marks(data)
 
         self.logger.debug(transaction_record_list)
         transaction_record_df = pd.DataFrame(transaction_record_list)
@@ -137,17 +385,7 @@ class CoreTradeLogic:
         if len(transaction_record_df) == 0:
             return transaction_record_df
 
-        transaction_record_df["pct"] = (
-            round(
-                (
-                    transaction_record_df["sell_price"]
-                    / transaction_record_df["buy_price"]
-                )
-                * (1 - self.trade_rate),
-                4,
-            )
-            - 1
-        )
+        transaction_record_df = self.cal_transaction_pct(transaction_record_df)
 
         self.logger.info(transaction_record_df)
 
@@ -0,0 +1,159 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/18 20:30
+# @Author  : Adolf
+# @File    : data_loader.py
+# @Function: 按列定义读取行情csv，只读取需要的列，
+#            日期解析一次后在有序数组上二分截取时间区间
+import numpy as np
+import pandas as pd
+
+PRICE_COLUMNS = ("open", "high", "low", "close", "preclose")
+
+# Baostock行情数据各列的类型，价格列的类型由price_dtype决定
+MARKET_DATA_SCHEMA = {
+    "date": "str",
+    "code": "category",
+    "amount": "float64",
+    "turn": "float64",
+    "pctChg": "float64",
+}
+
+# 区间端点是否包含在内，与pd.Series.between的inclusive参数含义一致
+INCLUSIVE_SIDES = {
+    "both": ("left", "right"),
+    "neither": ("right", "left"),
+    "left": ("left", "left"),
+    "right": ("right", "right"),
+}
+
+
+def read_csv_pyarrow(data_path, usecols, dtype):
+    """
+    使用pyarrow多线程解析csv，列类型在解析时直接确定，
+    没有安装pyarrow时返回None
+    """
+    try:
+        import pyarrow as pa
+        from pyarrow import csv as pa_csv
+    except ImportError:
+        return None
+
+    arrow_types = {
+        "str": pa.string(),
+        "category": pa.dictionary(pa.int32(), pa.string()),
+        "float32": pa.float32(),
+        "float64": pa.float64(),
+    }
+    convert_options = pa_csv.ConvertOptions(
+        include_columns=usecols,
+        column_types={column: arrow_types[value] for column, value in dtype.items()},
+    )
+    return pa_csv.read_csv(data_path, convert_options=convert_options).to_pandas()
+
+
+def parse_dates(dates):
+    """
+    Baostock的日期是ISO格式的字符串，
+    整列一次解析为秒精度的datetime64，
+    不受pandas纳秒时间戳范围的限制
+    """
+    return np.asarray(dates, dtype=object).astype("datetime64[s]")
+
+
+def parse_stamp(stamp):
+    return np.datetime64(stamp, "s")
+
+
+def date_range_slice(date_values, start_stamp=None, end_stamp=None, inclusive="both"):
+    """
+    :param date_values: 按时间排序的datetime64数组
+    :param start_stamp: 开始时间，None表示不限制
+    :param end_stamp: 结束时间，None表示不限制
+    :param inclusive: both、neither、left、right，
+        开始和结束时间是否包含在内
+    :return: slice，在有序数组上二分查找区间的开始和结束位置
+    """
+    if inclusive not in INCLUSIVE_SIDES:
+        raise ValueError(
+            f"inclusive must be one of {list(INCLUSIVE_SIDES)}, got {inclusive}"
+        )
+
+    start_side, end_side = INCLUSIVE_SIDES[inclusive]
+    start = 0
+    end = len(date_values)
+    if start_stamp is not None:
+        start = np.searchsorted(date_values, parse_stamp(start_stamp), side=start_side)
+    if end_stamp is not None:
+        end = np.searchsorted(date_values, parse_stamp(end_stamp), side=end_side)
+    return slice(int(start), int(max(start, end)))
+
+
+def date_range_mask(date_values, start_stamp=None, end_stamp=None, inclusive="both"):
+    """日期无序时使用的逐行比较"""
+    start_side, end_side = INCLUSIVE_SIDES[inclusive]
+    mask = np.ones(len(date_values), dtype=bool)
+    if start_stamp is not None:
+        start = parse_stamp(start_stamp)
+        mask &= date_values >= start if start_side == "left" else date_values > start
+    if end_stamp is not None:
+        end = parse_stamp(end_stamp)
+        mask &= date_values <= end if end_side == "right" else date_values < end
+    return mask
+
+
+def load_market_data(
+    data_path,
+    start_stamp=None,
+    end_stamp=None,
+    columns=None,
+    inclusive="both",
+    price_dtype="float64",
+    engine=None,
+    date_column="date",
+):
+    """
+    读取行情数据，date列仍然保留为字符串，
+    与原有的按字符串比较日期的代码兼容
+    :param data_path: csv路径
+    :param start_stamp: 开始时间
+    :param end_stamp: 结束时间
+    :param columns: 需要读取的列，按这个顺序返回，
+        None表示读取全部列；文件中没有的列会被忽略
+    :param inclusive: 开始和结束时间是否包含在内，见date_range_slice
+    :param price_dtype: 价格列的类型，float32可以减少一半内存，
+        但是计算结果会有精度差异
+    :param engine: csv解析引擎，可选pyarrow，
+        没有安装pyarrow时使用pandas的c引擎
+    :param date_column: 日期列的列名
+    :return: pd.DataFrame
+    """
+    header = pd.read_csv(data_path, nrows=0).columns
+    if columns is None:
+        usecols = list(header)
+    else:
+        usecols = [column for column in columns if column in header]
+
+    dtype = {
+        column: price_dtype if column in PRICE_COLUMNS else MARKET_DATA_SCHEMA[column]
+        for column in usecols
+        if column in PRICE_COLUMNS or column in MARKET_DATA_SCHEMA
+    }
+    df = None
+    if engine == "pyarrow":
+        df = read_csv_pyarrow(data_path, usecols, dtype)
+    if df is None:
+        df = pd.read_csv(data_path, usecols=usecols, dtype=dtype)
+
+    if (start_stamp is not None or end_stamp is not None) and len(df) > 0:
+        date_values = parse_dates(df[date_column])
+        if (np.diff(date_values) >= np.timedelta64(0)).all():
+            df = df.iloc[
+                date_range_slice(date_values, start_stamp, end_stamp, inclusive)
+            ]
+        else:
+            df = df[date_range_mask(date_values, start_stamp, end_stamp, inclusive)]
+
+    # read_csv按文件中的顺序返回列，这里按columns的顺序排列
+    df = df.reindex(columns=usecols, copy=False)
+    return df.reset_index(drop=True)
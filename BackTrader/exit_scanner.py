@@ -0,0 +1,231 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/18 22:20
+# @Author  : Adolf
+# @File    : exit_scanner.py
+# @Function: 向量化的止盈止损离场：对每笔交易在买入之后的K线上查找第一次触及止损价或止盈价的位置
+import numpy as np
+
+from BackTrader.signal_trade import cal_next_day_start
+
+
+def as_price_array(values, length):
+    """每笔交易的价格，标量会广播到每笔交易，None表示不设置(nan)"""
+    return np.broadcast_to(np.asarray(values, dtype=np.double), (length,)).copy()
+
+
+def scan_exits(
+    entries,
+    stop_loss,
+    take_profit,
+    close,
+    high=None,
+    low=None,
+    open_=None,
+    start=None,
+    intrabar=False,
+    trailing_stop=None,
+    chunk_size=32,
+    max_elements=1 << 18,
+):
+    """
+    对所有交易一起向量化扫描，每轮检查每笔未离场交易之后的chunk_size根K线，没有离场的交易下一轮检查的K线数量翻倍，
+    最多翻倍到max_elements根
+    :param entries: 买入位置
+    :param stop_loss: 每笔交易的止损价格，nan表示没有
+    :param take_profit: 每笔交易的止盈价格，nan表示没有
+    :param close: 收盘价
+    :param high: 最高价，intrabar为True时使用
+    :param low: 最低价，intrabar为True时使用
+    :param open_: 开盘价，intrabar为True时跳空越过止损/止盈价按开盘价成交，None表示按止损/止盈价成交
+    :param start: 每笔交易开始检查的位置，None表示买入的下一根K线
+    :param intrabar: False与逐K线回测一致，收盘价低于止损价或高于止盈价时按收盘价卖出；
+                     True时最低价触及止损价或最高价触及止盈价即按该价格卖出，同一根K线都触及时按止损处理
+    :param trailing_stop: 移动止损的距离，止损价不低于买入后的最高价(收盘价模式为最高收盘价)减去这个距离
+    :param max_elements: 每批检查的交易数量乘以K线数量的上限，控制中间数组的内存
+    :return: (exit_positions, exit_prices) 没有离场的交易为-1和nan
+    """
+    close = np.asarray(close, dtype=np.double)
+    entries = np.asarray(entries, dtype=np.int64)
+    n = len(close)
+    m = len(entries)
+    stop_loss = as_price_array(stop_loss, m)
+    take_profit = as_price_array(take_profit, m)
+    start = entries + 1 if start is None else np.asarray(start, dtype=np.int64)
+    if trailing_stop is not None:
+        trailing_stop = as_price_array(trailing_stop, m)
+
+    if intrabar:
+        high = np.asarray(high, dtype=np.double)
+        low = np.asarray(low, dtype=np.double)
+    else:
+        high = low = close
+
+    exit_positions = np.full(m, -1, dtype=np.int64)
+    exit_prices = np.full(m, np.nan)
+
+    def scan_batch(pending, offset, peak, width):
+        # 检查pending中每笔交易从offset开始的width根K线，返回没有离场、需要继续检查的交易
+        positions = offset[:, None] + np.arange(width)
+        valid = positions < n
+        positions = np.minimum(positions, n - 1)
+        bar_high = high[positions]
+        bar_low = low[positions]
+
+        stop = stop_loss[pending, None]
+        if trailing_stop is not None:
+            running_high = np.maximum(
+                np.maximum.accumulate(bar_high, axis=1), peak[:, None]
+            )
+            # 每根K线的止损价由这根K线之前的最高价决定
+            prior_high = np.concatenate([peak[:, None], running_high[:, :-1]], axis=1)
+            stop = np.fmax(stop, prior_high - trailing_stop[pending, None])
+        target = take_profit[pending, None]
+
+        if intrabar:
+            stop_hit = bar_low <= stop
+            target_hit = bar_high >= target
+        else:
+            stop_hit = bar_low < stop
+            target_hit = bar_high > target
+        hit = (stop_hit | target_hit) & valid
+
+        found = hit.any(axis=1)
+        rows = np.flatnonzero(found)
+        cols = hit[rows].argmax(axis=1)
+        trades = pending[rows]
+        exit_positions[trades] = positions[rows, cols]
+        if intrabar:
+            row_stop = np.broadcast_to(stop, hit.shape)[rows, cols]
+            row_stop_hit = stop_hit[rows, cols]
+            prices = np.where(row_stop_hit, row_stop, take_profit[trades])
+            if open_ is not None:
+                bar_open = np.asarray(open_, dtype=np.double)[exit_positions[trades]]
+                prices = np.where(
+                    row_stop_hit,
+                    np.minimum(prices, bar_open),
+                    np.maximum(prices, bar_open),
+                )
+            exit_prices[trades] = prices
+        else:
+            exit_prices[trades] = close[exit_positions[trades]]
+
+        # 检查到最后一根K线仍然没有离场的交易不再继续
+        keep = ~found & valid[:, -1]
+        if trailing_stop is not None:
+            peak = running_high[:, -1]
+        return keep, peak
+
+    pending = np.flatnonzero(start < n)
+    offset = start[pending]
+    # 移动止损使用的买入后最高价
+    peak = close[entries[pending]]
+    # 每轮分批检查，每批的数组元素个数不超过max_elements，内存与交易数量和K线数量无关
+    max_width = max(chunk_size, max_elements)
+    width = chunk_size
+    while len(pending) > 0:
+        batch_size = max(1, max_elements // width)
+        keep = np.zeros(len(pending), dtype=bool)
+        for batch_start in range(0, len(pending), batch_size):
+            batch = slice(batch_start, batch_start + batch_size)
+            keep[batch], peak[batch] = scan_batch(
+                pending[batch], offset[batch], peak[batch], width
+            )
+        pending = pending[keep]
+        offset = offset[keep] + width
+        peak = peak[keep]
+        width = min(width * 2, max_width)
+
+    return exit_positions, exit_prices
+
+
+def pair_exit_levels(
+    buy_signal,
+    stop_loss,
+    take_profit,
+    close,
+    high=None,
+    low=None,
+    open_=None,
+    sell_signal=None,
+    dates=None,
+    intrabar=False,
+    trailing_stop=None,
+):
+    """
+    与pair_signals的配对规则一致，卖出位置为止盈止损和卖出信号中先发生的一个
+    :param buy_signal: 买入信号，bool序列
+    :param stop_loss: 每根K线买入时的止损价格，与buy_signal等长
+    :param take_profit: 每根K线买入时的止盈价格，与buy_signal等长
+    :param sell_signal: 卖出信号，None表示只按止盈止损离场
+    :param dates: 日期序列，为None时认为每根K线都是不同的交易日
+    :return: (entries, exits, open_entry, exit_prices, trade_stop_loss, trade_take_profit)
+    """
+    buy_signal = np.asarray(buy_signal, dtype=bool)
+    n = len(buy_signal)
+    close = np.asarray(close, dtype=np.double)
+
+    if dates is None:
+        next_day_start = np.arange(1, n + 1)
+    else:
+        next_day_start = cal_next_day_start(dates)
+
+    # 先对每一个可能的买入位置计算离场位置，再按持仓规则挑出实际发生的交易
+    candidates = np.flatnonzero(buy_signal[1:]) + 1
+    start = np.maximum(candidates + 1, next_day_start[candidates])
+    candidate_stop = as_price_array(stop_loss, n)[candidates]
+    candidate_target = as_price_array(take_profit, n)[candidates]
+    exit_positions, exit_prices = scan_exits(
+        candidates,
+        candidate_stop,
+        candidate_target,
+        close,
+        high=high,
+        low=low,
+        open_=open_,
+        start=start,
+        intrabar=intrabar,
+        trailing_stop=trailing_stop,
+    )
+
+    sell_idx = (
+        np.zeros(0, dtype=np.int64)
+        if sell_signal is None
+        else np.flatnonzero(np.asarray(sell_signal, dtype=bool))
+    )
+    if len(sell_idx) > 0:
+        j = np.searchsorted(sell_idx, start)
+        signal_exit = np.where(
+            j < len(sell_idx), sell_idx[np.minimum(j, len(sell_idx) - 1)], -1
+        )
+        use_signal = (signal_exit >= 0) & (
+            (exit_positions < 0) | (signal_exit < exit_positions)
+        )
+        exit_positions = np.where(use_signal, signal_exit, exit_positions)
+        exit_prices = np.where(
+            use_signal, close[np.maximum(signal_exit, 0)], exit_prices
+        )
+
+    taken = []
+    open_entry = -1
+    # 每次循环跳过一整笔交易，循环次数等于交易次数而不是K线数量
+    pos = 1
+    while True:
+        k = np.searchsorted(candidates, pos)
+        if k == len(candidates):
+            break
+        if exit_positions[k] < 0:
+            open_entry = candidates[k]
+            break
+        taken.append(k)
+        pos = exit_positions[k] + 1
+
+    taken = np.array(taken, dtype=np.int64)
+    return (
+        candidates[taken],
+        exit_positions[taken],
+        int(open_entry),
+        exit_prices[taken],
+        candidate_stop[taken],
+        candidate_target[taken],
+    )
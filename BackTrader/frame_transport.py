@@ -0,0 +1,84 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/18 23:20
+# @Author  : Adolf
+# @File    : frame_transport.py
+# @Function: 子进程返回DataFrame时编码为Arrow IPC，写入共享内存后只把共享内存的名称传回主进程
+from multiprocessing import resource_tracker, shared_memory
+
+FRAME_TRANSPORTS = ("shared_memory", "arrow", "pickle")
+
+
+def encode_frame(df, transport="shared_memory"):
+    """
+    在子进程中调用
+    :param df: pd.DataFrame
+    :param transport: shared_memory、arrow、pickle；没有安装pyarrow时使用pickle
+    :return: (transport, payload) 交给decode_frame还原
+    """
+    if transport not in FRAME_TRANSPORTS:
+        raise ValueError(f"transport must be one of {FRAME_TRANSPORTS}, got {transport}")
+    if transport == "pickle":
+        return "pickle", df
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return "pickle", df
+
+    table = pa.Table.from_pandas(df)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    buffer = sink.getvalue()
+    if transport == "arrow":
+        return "arrow", buffer.to_pybytes()
+
+    shm = shared_memory.SharedMemory(create=True, size=max(buffer.size, 1))
+    shm.buf[: buffer.size] = memoryview(buffer).cast("B")
+    shm.close()
+    # 共享内存由主进程读取后释放，子进程退出时不能被resource_tracker回收，
+    # 主进程提前结束时由pool_map的discard调用release_frame释放
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return "shared_memory", (shm.name, buffer.size)
+
+
+def decode_frame(encoded):
+    """
+    在主进程中调用，共享内存读取后立即释放
+    :param encoded: encode_frame的返回值
+    :return: pd.DataFrame
+    """
+    transport, payload = encoded
+    if transport == "pickle":
+        return payload
+
+    import pyarrow as pa
+
+    if transport == "arrow":
+        data = payload
+    else:
+        name, size = payload
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            data = bytes(shm.buf[:size])
+        finally:
+            shm.close()
+            shm.unlink()
+    return pa.ipc.open_stream(data).read_all().to_pandas()
+
+
+def release_frame(encoded):
+    """
+    在主进程中调用，释放不再需要decode_frame的结果占用的共享内存
+    :param encoded: encode_frame的返回值
+    """
+    transport, payload = encoded
+    if transport != "shared_memory":
+        return
+    name, _ = payload
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
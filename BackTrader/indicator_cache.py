@@ -0,0 +1,134 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/18 15:02
+# @Author  : Adolf
+# @File    : indicator_cache.py
+# @Function: 按内容寻址的指标磁盘缓存，parquet列式存储，按大小做LRU淘汰
+import hashlib
+import json
+import os
+import uuid
+
+import pandas as pd
+
+
+class IndicatorCache:
+    """
+    缓存计算完指标之后的行情数据，key由(股票代码、数据文件大小和修改时间、时间区间、指标名称、参数)决定，
+    数据文件或参数有变化时自动失效；指标的计算代码有修改时需要手动清空缓存目录
+    只缓存DataFrame，命中缓存时不会执行指标计算函数，计算函数中对其他对象的修改不会被恢复
+    """
+
+    def __init__(self, cache_dir, max_bytes=2 * 1024**3, logger=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.logger = logger
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._total_bytes = None
+
+    @staticmethod
+    def file_fingerprint(data_path):
+        stat = os.stat(data_path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def make_key(self, code, data_path, start_stamp, end_stamp, indicator_name, params):
+        key_items = {
+            "code": code,
+            "data_file": self.file_fingerprint(data_path),
+            "start_stamp": start_stamp,
+            "end_stamp": end_stamp,
+            "indicator_name": indicator_name,
+            "params": params,
+        }
+        key_str = json.dumps(key_items, sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha1(key_str.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.parquet")
+
+    def get(self, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        try:
+            data = pd.read_parquet(path)
+        except Exception as e:
+            # 写了一半或者损坏的文件当作没有命中，删除后重新计算
+            if self.logger is not None:
+                self.logger.warning(
+                    f"指标缓存{path}读取失败,重新计算: {type(e).__name__}: {e}"
+                )
+            self.remove(key)
+            self.misses += 1
+            return None
+
+        # 更新修改时间作为最近使用时间，淘汰时优先删除最久没有使用的缓存
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return data
+
+    def put(self, key, data):
+        path = self._path(key)
+        # 先写临时文件再改名，多进程同时写同一个key时不会读到写了一半的文件
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        data.to_parquet(tmp_path)
+        os.replace(tmp_path, path)
+
+        if self._total_bytes is None:
+            self._total_bytes = self.size()
+        else:
+            self._total_bytes += os.path.getsize(path)
+        if self._total_bytes > self.max_bytes:
+            self.evict()
+
+    def remove(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+        self._total_bytes = None
+
+    def _entries(self):
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".parquet"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        entries = sorted(self._entries())
+        total_bytes = sum(size for _, size, _ in entries)
+        # 淘汰到上限的90%，避免每次写入都要重新扫描目录
+        target_bytes = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if total_bytes <= target_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+            self.evictions += 1
+        self._total_bytes = total_bytes
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total > 0 else 0.0,
+        }
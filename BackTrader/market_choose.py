@@ -7,16 +7,18 @@ LastEditors: adolf
 """
 
 import os
+from contextlib import closing
 from dataclasses import dataclass, field
-from functools import reduce
 
 import pandas as pd
 
 # import ray
-import pathos
 from tqdm.auto import tqdm
 
 from BackTrader.core_trade_logic import CoreTradeLogic
+from BackTrader.frame_transport import decode_frame, encode_frame, release_frame
+from BackTrader.market_panel import build_panel
+from BackTrader.process_pool import get_worker_state, pool_map
 
 
 @dataclass
@@ -34,6 +36,20 @@ class MarketChooseConfig:
         default="Data/ChooseData/board_mom.csv", metadata={"help": "保存获取完指标路径"}
     )
     RUN_ONLINE: bool = field(default=True, metadata={"help": "是否在线运行,默认为True"})
+    WORKERS: int = field(default=8, metadata={"help": "计算板块指标的进程数"})
+    MAX_IN_FLIGHT: int = field(
+        default=None,
+        metadata={"help": "同时提交给进程池的板块数量上限,None表示WORKERS的2倍"},
+    )
+    FRAME_TRANSPORT: str = field(
+        default="shared_memory",
+        metadata={
+            "help": "子进程返回结果的方式,可选shared_memory(Arrow IPC写入共享内存)、arrow(Arrow IPC)、pickle"
+        },
+    )
+    MIN_SCORE: float = field(
+        default=None, metadata={"help": "板块得分低于这个值时当天不选择该板块,None表示不限制"}
+    )
 
 
 # @ray.remote
@@ -46,14 +62,24 @@ class MarketChoose(CoreTradeLogic):
         self.all_data_list = os.listdir(self.config.DATA_PATH)
 
     def get_market_data(self):
-        with pathos.multiprocessing.ProcessingPool(8) as p:
-            result = list(
-                tqdm(
-                    p.imap(self.cal_one_data, self.all_data_list),
-                    total=len(self.all_data_list),
-                    desc="运行全体数据",
+        # 策略对象在每个子进程中只初始化一次，任务只传文件名
+        max_in_flight = self.config.MAX_IN_FLIGHT or 2 * self.config.WORKERS
+        encoded_iter = pool_map(
+            _cal_one_data,
+            self.all_data_list,
+            workers=self.config.WORKERS,
+            state=self,
+            max_in_flight=max_in_flight,
+            discard=release_frame,
+        )
+        # 出错时立即关闭生成器，释放还没有解码的共享内存
+        with closing(encoded_iter):
+            result = [
+                decode_frame(encoded)
+                for encoded in tqdm(
+                    encoded_iter, total=len(self.all_data_list), desc="运行全体数据"
                 )
-            )
+            ]
         self.logger.success("MarketChoose run success")
 
         return result
@@ -107,12 +133,7 @@ class MarketChoose(CoreTradeLogic):
         if self.config.RUN_ONLINE:
             res_data_list = self.get_market_data()
 
-            df_merged = reduce(
-                lambda left, right: pd.merge(left, right, on=["date"], how="outer"),
-                res_data_list,
-            )
-            df_merged.sort_values(by=["date"], inplace=True)
-            df_merged.reset_index(drop=True, inplace=True)
+            df_merged = build_panel(res_data_list, on="date")
 
             self.logger.success(df_merged)
 
@@ -137,3 +158,10 @@ class MarketChoose(CoreTradeLogic):
         pl = self.transaction_analysis.cal_trader_analysis(transaction_record_df)
 
         return pl
+
+
+def _cal_one_data(file_name):
+    strategy = get_worker_state()
+    return encode_frame(
+        strategy.cal_one_data(file_name), transport=strategy.config.FRAME_TRANSPORT
+    )
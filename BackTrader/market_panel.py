@@ -0,0 +1,103 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/18 22:55
+# @Author  : Adolf
+# @File    : market_panel.py
+# @Function: 多个板块的指标按日期对齐成日期×板块的宽表，以及在宽表上逐日选出得分最高的板块
+import numpy as np
+import pandas as pd
+
+
+def build_panel(frame_list, on="date"):
+    """
+    代替逐个pd.merge(how="outer")，拼接的耗时与板块数量成线性关系
+    数值列都是浮点数时直接写入预先分配的日期×列矩阵，否则以日期为索引一次concat对齐
+    :param frame_list: 每个板块的结果，包含on列以及<board>_close、<board>_mom等列
+    :param on: 对齐使用的日期列
+    :return: pd.DataFrame，第一列为按时间排序的on，其余列按frame_list的顺序排列；
+             同一个板块同一个日期有多行时保留最后一行
+    """
+    if len(frame_list) == 0:
+        return pd.DataFrame(columns=[on])
+
+    value_columns = [
+        [column for column in frame.columns if column != on] for frame in frame_list
+    ]
+    if not all(
+        pd.api.types.is_float_dtype(frame[column])
+        for frame, column_list in zip(frame_list, value_columns)
+        for column in column_list
+    ):
+        panel = pd.concat(
+            [
+                frame.drop_duplicates(subset=on, keep="last").set_index(on)
+                for frame in frame_list
+            ],
+            axis=1,
+            join="outer",
+            sort=True,
+            copy=False,
+        )
+        panel.index.name = on
+        return panel.reset_index()
+
+    # 先对所有日期去重再排序，每个板块的日期通过哈希表查找所在的行
+    date_index = pd.Index(
+        pd.unique(np.concatenate([frame[on].to_numpy() for frame in frame_list]))
+    ).sort_values()
+    columns = [column for column_list in value_columns for column in column_list]
+    matrix = np.full((len(date_index), len(columns)), np.nan)
+
+    start = 0
+    for frame, column_list in zip(frame_list, value_columns):
+        end = start + len(column_list)
+        # 行按顺序写入，重复的日期保留最后一行
+        matrix[date_index.get_indexer(frame[on]), start:end] = frame[
+            column_list
+        ].to_numpy(dtype=np.double)
+        start = end
+
+    panel = pd.DataFrame(matrix, columns=columns)
+    panel.insert(0, on, date_index.to_numpy())
+    return panel
+
+
+def select_top_k(scores, k=1, min_score=None, tie_break="first"):
+    """
+    对日期×板块的得分矩阵逐行选出得分最高的k个板块，nan不参与排序
+    :param scores: 二维数组，每行一个日期，每列一个板块
+    :param k: 每个日期选出的板块数量
+    :param min_score: 得分低于这个值的板块不选，None表示不限制
+    :param tie_break: 得分相同时first选列位置靠前的板块，last选靠后的板块
+    :return: (top_index, top_score) 形状为(日期数, k)，按得分从高到低排列，
+             可选的板块不足k个时用-1和nan补齐
+    """
+    if tie_break not in ("first", "last"):
+        raise ValueError(f"tie_break must be first or last, got {tie_break}")
+
+    scores = np.array(scores, dtype=np.double, ndmin=2)
+    n_cols = scores.shape[1]
+    if tie_break == "last":
+        scores = scores[:, ::-1]
+
+    valid = ~np.isnan(scores)
+    if min_score is not None:
+        valid &= scores >= min_score
+    # 无效的得分排到最后
+    ranked = np.where(valid, scores, -np.inf)
+
+    k = min(k, n_cols)
+    if k == 1:
+        top_index = ranked.argmax(axis=1)[:, None]
+    else:
+        # 稳定排序保证得分相同时列位置靠前的排在前面
+        top_index = np.argsort(-ranked, axis=1, kind="stable")[:, :k]
+
+    top_valid = np.take_along_axis(valid, top_index, axis=1)
+    top_score = np.where(
+        top_valid, np.take_along_axis(scores, top_index, axis=1), np.nan
+    )
+    if tie_break == "last":
+        top_index = n_cols - 1 - top_index
+    top_index = np.where(top_valid, top_index, -1)
+    return top_index, top_score
@@ -0,0 +1,161 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/18 21:50
+# @Author  : Adolf
+# @File    : multi_timeframe.py
+# @Function: 日内K线驱动的日线指标，当天未收盘的日线用最新的日内收盘价O(1)更新
+import numpy as np
+
+
+def map_to_day_index(intraday_dates, day_dates):
+    """
+    预先计算每根日内K线对应的日线位置
+    :param intraday_dates: 日内K线的日期
+    :param day_dates: 按时间排序的日线日期
+    :return: np.array，与intraday_dates等长
+    """
+    intraday_dates = np.asarray(intraday_dates)
+    day_dates = np.asarray(day_dates)
+    day_index = np.searchsorted(day_dates, intraday_dates)
+    found = day_index < len(day_dates)
+    found[found] = day_dates[day_index[found]] == intraday_dates[found]
+    if not found.all():
+        raise ValueError(
+            f"日线数据中没有这些日期: {np.unique(intraday_dates[~found])[:5].tolist()}"
+        )
+    return day_index
+
+
+def ewm_alpha(span):
+    # 与pandas的ewm(span=...)一样先换算成质心再计算alpha，保证结果逐位一致
+    com = (span - 1) / 2
+    return 1.0 / (1.0 + float(com))
+
+
+def ewm_step(weighted, old_wt, cur, old_wt_factor):
+    """
+    pandas ewm(adjust=True, ignore_na=False).mean()的一步递推，运算顺序与pandas一致
+    :return: (weighted, old_wt)
+    """
+    is_observation = cur == cur
+    if weighted == weighted:
+        old_wt *= old_wt_factor
+        if is_observation:
+            if weighted != cur:
+                weighted = (old_wt * weighted + cur) / (old_wt + 1.0)
+            old_wt += 1.0
+    elif is_observation:
+        weighted = cur
+    return weighted, old_wt
+
+
+# 还没有收盘价时快线、慢线、信号线的(weighted, old_wt)
+MACD_START_STATE = ((np.nan, 1.0), (np.nan, 1.0), (np.nan, 1.0))
+
+
+def macd_factors(period_fast=12, period_slow=26, signal=9):
+    return (
+        1.0 - ewm_alpha(period_fast),
+        1.0 - ewm_alpha(period_slow),
+        1.0 - ewm_alpha(signal),
+    )
+
+
+def macd_step(state, close, factors):
+    """
+    与finta的TA.MACD(adjust=True)相同的一步递推
+    :param state: 快线、慢线、信号线的(weighted, old_wt)
+    :param close: 收盘价
+    :param factors: macd_factors的返回值
+    :return: (state, macd, signal)
+    """
+    fast_factor, slow_factor, signal_factor = factors
+    fast = ewm_step(*state[0], close, fast_factor)
+    slow = ewm_step(*state[1], close, slow_factor)
+    macd = fast[0] - slow[0]
+    signal = ewm_step(*state[2], macd, signal_factor)
+    return (fast, slow, signal), macd, signal[0]
+
+
+class PartialDayMACD:
+    """
+    与finta的TA.MACD(adjust=True)结果一致的日线MACD，已经收盘的日线保存EMA状态，
+    当天的日线用最新的日内收盘价在收盘前的状态上递推一步得到，每根日内K线的计算量是O(1)
+    每一天最后一次update的收盘价作为这一天的收盘价，没有update过的日线使用原始收盘价
+    """
+
+    def __init__(self, day_close, period_fast=12, period_slow=26, signal=9):
+        self.day_close = np.array(day_close, dtype=np.double)
+        self.factors = macd_factors(period_fast, period_slow, signal)
+
+        self.macd = np.full(len(self.day_close), np.nan)
+        self.signal = np.full(len(self.day_close), np.nan)
+        self.histogram = np.full(len(self.day_close), np.nan)
+
+        # 已经收盘的日线数量，以及收盘后快线、慢线、信号线的(weighted, old_wt)
+        self.committed = 0
+        self.state = MACD_START_STATE
+
+    def _step(self, state, close):
+        return macd_step(state, close, self.factors)
+
+    def _write(self, day_index, macd, signal):
+        self.macd[day_index] = macd
+        self.signal[day_index] = signal
+        self.histogram[day_index] = macd - signal
+
+    def update(self, day_index, close):
+        """
+        :param day_index: 日内K线所在的日线位置，只能向后推进
+        :param close: 日内K线的收盘价，作为当天的最新收盘价
+        :return: (macd, signal, histogram) 当天截至这根日内K线的日线指标
+        """
+        if day_index < self.committed:
+            raise ValueError(
+                f"day_index {day_index} is before committed day {self.committed}"
+            )
+
+        # 之前的日线已经收盘，按最后写入的收盘价更新EMA状态
+        while self.committed < day_index:
+            self.state, macd, signal = self._step(
+                self.state, self.day_close[self.committed]
+            )
+            self._write(self.committed, macd, signal)
+            self.committed += 1
+
+        self.day_close[day_index] = close
+        _, macd, signal = self._step(self.state, close)
+        self._write(day_index, macd, signal)
+        return macd, signal, macd - signal
+
+    def get_state(self):
+        """返回只包含list、float、int的递推状态，用于逐K线回测的快照，可以直接存成json"""
+        return {
+            "day_close": self.day_close.tolist(),
+            "macd": self.macd.tolist(),
+            "signal": self.signal.tolist(),
+            "histogram": self.histogram.tolist(),
+            "committed": self.committed,
+            "state": [list(item) for item in self.state],
+        }
+
+    def set_state(self, state):
+        """
+        恢复get_state保存的状态，保存之后新增的日线保持原始收盘价
+        :param state: get_state的返回值，日线数量不能多于当前的日线
+        """
+        length = len(state["day_close"])
+        if length > len(self.day_close):
+            raise ValueError(
+                f"state has {length} days, more than {len(self.day_close)} days"
+            )
+        for name in ("day_close", "macd", "signal", "histogram"):
+            getattr(self, name)[:length] = state[name]
+        self.committed = state["committed"]
+        self.state = tuple(tuple(item) for item in state["state"])
+
+    def histogram_mean(self, start, end):
+        """已经收盘的日线[start, end)的HISTOGRAM均值，区间为空时返回nan"""
+        if end <= start:
+            return np.nan
+        return self.histogram[start:end].mean()
@@ -0,0 +1,174 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/18 16:05
+# @Author  : Adolf
+# @File    : portfolio_trade.py
+# @Function: 多标的组合回测，在日期×股票的二维数组上同时持有最多N个仓位
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass
+class PortfolioResult:
+    equity: pd.Series = field(default=None, metadata={"help": "每日按收盘价计算的组合净值"})
+    cash: pd.Series = field(default=None, metadata={"help": "每日收盘后的现金"})
+    position_nums: pd.Series = field(default=None, metadata={"help": "每日收盘后的持仓数量"})
+    transaction_record_df: pd.DataFrame = field(
+        default=None, metadata={"help": "与OneTransactionRecord字段一致的交易记录"}
+    )
+
+
+def forward_fill_index(values):
+    """
+    按日期方向向前填充时使用的行号，停牌或者未上市(nan)时使用最近一个有效价格的行号
+    :param values: 日期×股票的二维数组
+    :return: 与values形状相同的行号数组
+    """
+    rows = np.arange(values.shape[0])[:, None]
+    fill_index = np.where(np.isnan(values), 0, rows)
+    return np.maximum.accumulate(fill_index, axis=0)
+
+
+class PortfolioBacktest:
+    """
+    组合回测规则:
+    1、每天先按卖出信号卖出，再按买入信号买入，当天买入的股票当天不会卖出
+    2、最多同时持有max_positions只股票，买入时把现金平均分给剩余的仓位
+    3、价格为nan(停牌或者未上市)的股票当天不能交易，净值按最近一个有效价格计算
+    4、交易费用与CoreTradeLogic一致，在卖出时按trade_rate扣除
+    """
+
+    def __init__(self, max_positions=10, init_cash=1.0, trade_rate=1.5 / 1000):
+        if max_positions < 1:
+            raise ValueError("max_positions must be greater than 0")
+        self.max_positions = max_positions
+        self.init_cash = init_cash
+        self.trade_rate = trade_rate
+
+    def run(self, close, buy_signal, sell_signal=None, score=None, dates=None, codes=None):
+        """
+        :param close: 日期×股票的收盘价二维数组，nan表示当天不能交易
+        :param buy_signal: 日期×股票的买入信号
+        :param sell_signal: 日期×股票的卖出信号，为None时表示轮动模式，不再满足买入信号的持仓卖出
+        :param score: 买入候选多于空余仓位时按score从高到低选择，为None时按股票顺序选择
+        :param dates: 日期，长度为close的行数
+        :param codes: 股票代码，长度为close的列数
+        :return: PortfolioResult
+        """
+        close = np.asarray(close)
+        if not np.issubdtype(close.dtype, np.floating):
+            close = close.astype(np.float64)
+        n_dates, n_codes = close.shape
+        buy_signal = np.asarray(buy_signal, dtype=bool)
+        if sell_signal is None:
+            sell_signal = ~buy_signal
+        else:
+            sell_signal = np.asarray(sell_signal, dtype=bool)
+        if score is not None:
+            score = np.asarray(score)
+        if dates is None:
+            dates = np.arange(n_dates)
+        if codes is None:
+            codes = np.arange(n_codes)
+        dates = np.asarray(dates)
+        codes = np.asarray(codes)
+
+        tradable = ~np.isnan(close)
+        mark_price = np.nan_to_num(
+            np.take_along_axis(close, forward_fill_index(close), axis=0)
+        )
+
+        cash = float(self.init_cash)
+        shares = np.zeros(n_codes)
+        held = np.zeros(n_codes, dtype=bool)
+        entry_row = np.full(n_codes, -1, dtype=np.int64)
+        entry_price = np.zeros(n_codes)
+
+        equity = np.empty(n_dates)
+        cash_list = np.empty(n_dates)
+        position_nums = np.empty(n_dates, dtype=np.int64)
+        trade_list = []
+
+        for t in range(n_dates):
+            price = close[t]
+
+            exit_codes = np.flatnonzero(held & sell_signal[t] & tradable[t])
+            if len(exit_codes) > 0:
+                cash += float(
+                    (shares[exit_codes] * price[exit_codes]).sum() * (1 - self.trade_rate)
+                )
+                trade_list.append(
+                    (
+                        exit_codes,
+                        entry_row[exit_codes],
+                        entry_price[exit_codes],
+                        np.full(len(exit_codes), t),
+                        price[exit_codes],
+                    )
+                )
+                shares[exit_codes] = 0
+                held[exit_codes] = False
+
+            free_slots = self.max_positions - int(held.sum())
+            if free_slots > 0:
+                entry_codes = np.flatnonzero(buy_signal[t] & ~held & tradable[t])
+                if len(entry_codes) > free_slots:
+                    if score is None:
+                        entry_codes = entry_codes[:free_slots]
+                    else:
+                        entry_score = np.nan_to_num(score[t, entry_codes], nan=-np.inf)
+                        # 按分数从高到低，分数相同时按股票顺序
+                        order = np.argsort(-entry_score, kind="stable")[:free_slots]
+                        entry_codes = entry_codes[np.sort(order)]
+                if len(entry_codes) > 0:
+                    cash_per_slot = cash / free_slots
+                    shares[entry_codes] = cash_per_slot / price[entry_codes]
+                    held[entry_codes] = True
+                    entry_row[entry_codes] = t
+                    entry_price[entry_codes] = price[entry_codes]
+                    cash -= cash_per_slot * len(entry_codes)
+
+            equity[t] = cash + shares @ mark_price[t]
+            cash_list[t] = cash
+            position_nums[t] = int(held.sum())
+
+        return PortfolioResult(
+            equity=pd.Series(equity, index=dates, name="equity"),
+            cash=pd.Series(cash_list, index=dates, name="cash"),
+            position_nums=pd.Series(position_nums, index=dates, name="position_nums"),
+            transaction_record_df=self.build_transaction_records(
+                trade_list, dates, codes
+            ),
+        )
+
+    def build_transaction_records(self, trade_list, dates, codes):
+        if len(trade_list) == 0:
+            return pd.DataFrame()
+
+        code_index, buy_row, buy_price, sell_row, sell_price = (
+            np.concatenate(item) for item in zip(*trade_list, strict=True)
+        )
+        no_price = [None] * len(code_index)
+        transaction_record_df = pd.DataFrame(
+            {
+                "pos_asset": codes[code_index],
+                "buy_date": dates[buy_row],
+                "buy_price": buy_price,
+                "sell_date": dates[sell_row],
+                "sell_price": sell_price,
+                "holding_time": sell_row - buy_row,
+                "take_profit": no_price,
+                "stop_loss": no_price,
+            }
+        )
+        transaction_record_df["pct"] = (
+            round(
+                (transaction_record_df["sell_price"] / transaction_record_df["buy_price"])
+                * (1 - self.trade_rate),
+                4,
+            )
+            - 1
+        )
+        return transaction_record_df
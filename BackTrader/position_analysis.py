@@ -4,95 +4,181 @@
 # @Author  : Adolf
 # @File    : position_analysis.py
 # @Function:
+import numpy as np
 import pandas as pd
 
-from Utils.base_utils import run_once
+
+def cal_max_down_array(values):
+    """
+    一次遍历计算最大回撤
+    :param values: 净值或者价格序列
+    :return: (最大回撤, 回撤开始位置, 回撤结束位置)
+    """
+    values = np.asarray(values, dtype=np.double)
+    max2here = np.maximum.accumulate(values)
+    dd2here = values / max2here - 1
+    end_pos = int(np.argmin(dd2here))
+    start_pos = int(np.argmax(values[: end_pos + 1]))
+    return dd2here[end_pos], start_pos, end_pos
+
+
+def cal_trade_metrics(pct, holding_time, buy_date):
+    """
+    一次向量化计算一张交易记录表的全部统计指标
+    :param pct: 每笔交易的收益率
+    :param holding_time: 每笔交易的持仓时间
+    :param buy_date: 每笔交易的买入时间
+    :return: dict
+    """
+    pct = np.asarray(pct, dtype=np.double)
+    holding_time = np.asarray(holding_time)
+    buy_date = np.asarray(buy_date)
+
+    strategy_net = np.cumprod(1 + pct)
+    trade_nums = len(pct)
+
+    profit_mask = pct > 0
+    loss_mask = pct < 0
+    profit_nums = int(profit_mask.sum())
+    loss_nums = int(loss_mask.sum())
+
+    # 策略的成功率
+    success_rate = profit_nums / trade_nums
+    # 盈亏比
+    profit = pct[profit_mask].mean() if profit_nums > 0 else 0
+    loss = pct[loss_mask].mean() if loss_nums > 0 else 0
+    pl_ratio = profit * success_rate + loss * (1 - success_rate)
+
+    max_draw_down, start_pos, end_pos = cal_max_down_array(strategy_net)
+
+    return {
+        "strategy_net": strategy_net,
+        "平均持有时间": holding_time.mean(),
+        "交易次数": trade_nums,
+        "计算总持有时间": holding_time.sum(),
+        "策略收益率": strategy_net[-1],
+        "策略成功率": success_rate,
+        "策略赔率": pct.mean(),
+        "策略最大回撤": max_draw_down,
+        "策略最大回撤开始时间": buy_date[start_pos],
+        "策略最大回撤结束时间": buy_date[end_pos],
+        "策略的盈亏比": pl_ratio,
+    }
+
+
+def cal_batch_trade_metrics(pct, holding_time, buy_date, group):
+    """
+    同时计算多张交易记录表的统计指标，所有股票的交易记录拼接在一起按group分组，不需要逐只股票循环
+    :param pct: 每笔交易的收益率
+    :param holding_time: 每笔交易的持仓时间
+    :param buy_date: 每笔交易的买入时间
+    :param group: 每笔交易所属的分组(例如股票代码)，同一组内保持原有的交易顺序
+    :return: dict，每个指标是与分组一一对应的数组，"group"为分组的值
+    """
+    group = np.asarray(group)
+    order = np.argsort(group, kind="stable")
+    group = group[order]
+    pct = np.asarray(pct, dtype=np.double)[order]
+    holding_time = np.asarray(holding_time, dtype=np.double)[order]
+    buy_date = np.asarray(buy_date)[order]
+
+    group_values, starts, counts = np.unique(
+        group, return_index=True, return_counts=True
+    )
+    group_id = np.repeat(np.arange(len(starts)), counts)
+    ends = starts + counts - 1
+
+    profit_mask = pct > 0
+    loss_mask = pct < 0
+    profit_nums = np.add.reduceat(profit_mask.astype(np.int64), starts)
+    loss_nums = np.add.reduceat(loss_mask.astype(np.int64), starts)
+    profit_sum = np.add.reduceat(np.where(profit_mask, pct, 0), starts)
+    loss_sum = np.add.reduceat(np.where(loss_mask, pct, 0), starts)
+
+    success_rate = profit_nums / counts
+    with np.errstate(invalid="ignore", divide="ignore"):
+        profit = np.where(profit_nums > 0, profit_sum / profit_nums, 0)
+        loss = np.where(loss_nums > 0, loss_sum / loss_nums, 0)
+    pl_ratio = profit * success_rate + loss * (1 - success_rate)
+
+    # 分组累乘通过对数收益的分组累加实现，亏损全部本金(pct<=-1)之后净值一直为0，
+    # 对数为-inf，单独标记，避免-inf在累加时影响后面的分组
+    ruined = pct <= -1
+    log_pct = np.log1p(np.where(ruined, 0, pct))
+    log_net = np.cumsum(log_pct)
+    log_net -= np.repeat(log_net[starts] - log_pct[starts], counts)
+    ruined_count = np.cumsum(ruined)
+    ruined_count -= np.repeat(ruined_count[starts] - ruined[starts], counts)
+    log_net[ruined_count > 0] = -np.inf
+
+    # 每组加上递增的偏移量，使一次maximum.accumulate在每组开始时自动重置，
+    # 净值为0的交易用比组内最小值略低的值代替，仍然高于前一组的所有值
+    finite_net = log_net[np.isfinite(log_net)]
+    net_min = finite_net.min() if len(finite_net) > 0 else 0
+    span = (finite_net.max() - net_min + 1) if len(finite_net) > 0 else 1
+    offset_net = np.where(ruined_count > 0, net_min - 0.5, log_net) + group_id * span
+    running_max = np.maximum.accumulate(offset_net)
+    dd2here = np.exp(offset_net - running_max) - 1
+    dd2here[ruined_count > 0] = -1
+    # 第一笔交易就亏损全部本金时净值一直为0，
+    # 回撤是0/0，与cal_trade_metrics一致为nan
+    dd2here[np.repeat(ruined[starts], counts)] = np.nan
+
+    # 回撤结束位置：每组内回撤最小的第一笔交易
+    end_order = np.lexsort((np.arange(len(dd2here)), dd2here, group_id))
+    end_pos = end_order[starts]
+    # 回撤开始位置：结束位置之前净值第一次到达最高点的交易
+    previous_max = np.concatenate(([-np.inf], running_max[:-1]))
+    previous_max[starts] = -np.inf
+    new_max_pos = np.where(offset_net > previous_max, np.arange(len(offset_net)), 0)
+    # 每组从自己的第一笔交易开始，不会沿用前一组的位置
+    new_max_pos[starts] = starts
+    start_pos = np.maximum.accumulate(new_max_pos)[end_pos]
+
+    return {
+        "group": group_values,
+        "平均持有时间": np.add.reduceat(holding_time, starts) / counts,
+        "交易次数": counts,
+        "计算总持有时间": np.add.reduceat(holding_time, starts),
+        "策略收益率": np.exp(log_net[ends]),
+        "策略成功率": success_rate,
+        "策略赔率": np.add.reduceat(pct, starts) / counts,
+        "策略最大回撤": dd2here[end_pos],
+        "策略最大回撤开始时间": buy_date[start_pos],
+        "策略最大回撤结束时间": buy_date[end_pos],
+        "策略的盈亏比": pl_ratio,
+    }
 
 
 class BaseTransactionAnalysis:
     def __init__(self, logger):
         self.logger = logger
 
+        # 标的分析结果按(股票代码、开始时间、结束时间、K线数量)缓存，不同参数组合之间复用
+        self.asset_analysis_cache = dict()
+
     @staticmethod
     def cal_max_down(df, pct_name="strategy_net", time_stamp="date"):
-        res_df = df.copy()
-        res_df["max2here"] = res_df[pct_name].expanding().max()
-        res_df["dd2here"] = res_df[pct_name] / res_df["max2here"] - 1
-        # 计算最大回撤，以及最大回撤结束时间
-        end_date, max_draw_down = tuple(
-            res_df.sort_values(by=["dd2here"]).iloc[0][[time_stamp, "dd2here"]]
-        )
-        # 计算最大回撤开始时间
-        start_date = (
-            res_df[res_df[time_stamp] <= end_date]
-            .sort_values(by=pct_name, ascending=False)
-            .iloc[0][time_stamp]
-        )
-        # 将无关的变量删除
-        res_df.drop(["max2here", "dd2here"], axis=1, inplace=True)
-        return max_draw_down, start_date, end_date
+        max_draw_down, start_pos, end_pos = cal_max_down_array(df[pct_name])
+        time_values = df[time_stamp].to_numpy()
+        return max_draw_down, time_values[start_pos], time_values[end_pos]
 
     def cal_trader_analysis(self, data):
         # self.logger.debug(data)
 
-        # 计算策略的收益率
-        data["strategy_net"] = (1 + data["pct"]).cumprod()
-        data["pct_show"] = data["pct"].apply(lambda x: format(x, ".2%"))
-
-        strategy_pct = data.tail(1)["strategy_net"].item()
-
-        # 计算策略的成功率
-        success_rate = len(data[data["pct"] > 0]) / len(data)
-
-        # 计算策略的赔率
-        odds = data["pct"].mean()
-
-        # 计算盈亏比
-        if len(data[data["pct"] > 0]) > 0:
-            profit = data[data["pct"] > 0]["pct"].mean()
-        else:
-            profit = 0
-
-        if len(data[data["pct"] < 0]) > 0:
-            loss = data[data["pct"] < 0]["pct"].mean()
-        else:
-            loss = 0
-
-        pl_ratio = profit * success_rate + loss * (1 - success_rate)
-
-        # 计算策略的平均持股天数
-        mean_holding_day = data["holding_time"].mean()
-
-        # 计算总持有时间
-        sum_holding_day = data["holding_time"].sum()
-
-        # 统计策略的交易次数
-        trade_nums = len(data)
-
-        # strategy_annual_return = strategy_pct ** (250 / len(self.Data)) - 1
-
-        # 统计策略的最大回撤
-        strategy_max_draw_down, strategy_start_date, strategy_end_date = (
-            self.cal_max_down(df=data, pct_name="strategy_net", time_stamp="buy_date")
+        metrics = cal_trade_metrics(
+            pct=data["pct"].to_numpy(),
+            holding_time=data["holding_time"].to_numpy(),
+            buy_date=data["buy_date"].to_numpy(),
         )
 
-        result_dict = dict()
-        result_dict["股票代码"] = data.loc[0, "pos_asset"]
-        result_dict["平均持有时间"] = mean_holding_day
-        result_dict["交易次数"] = trade_nums
-        result_dict["计算总持有时间"] = sum_holding_day
-
-        result_dict["策略收益率"] = strategy_pct
-
-        result_dict["策略成功率"] = success_rate
-        result_dict["策略赔率"] = odds
-
-        result_dict["策略最大回撤"] = strategy_max_draw_down
-
-        result_dict["策略最大回撤开始时间"] = strategy_start_date
-        result_dict["策略最大回撤结束时间"] = strategy_end_date
+        # 计算策略的收益率
+        data["strategy_net"] = metrics.pop("strategy_net")
+        data["pct_show"] = np.char.mod("%.2f%%", data["pct"].to_numpy() * 100)
 
-        result_dict["策略的盈亏比"] = pl_ratio
+        result_dict = dict()
+        result_dict["股票代码"] = data["pos_asset"].iloc[0]
+        result_dict.update(metrics)
         # self.logger.info(result_dict)
 
         result_df = pd.DataFrame.from_dict(
@@ -102,10 +188,47 @@ class BaseTransactionAnalysis:
 
         return result_df
 
-    @run_once
-    def cal_asset_analysis(self, data):
+    def cal_batch_trader_analysis(self, data, key="pos_asset"):
+        """
+        多只股票的交易记录拼接成一张表，一次计算每只股票的统计指标
+        :param data: 拼接后的交易记录，需要包含pct、holding_time、buy_date和key列
+        :param key: 分组的列名
+        :return: pd.DataFrame，每行一只股票，列名与cal_trader_analysis的结果一致
+        """
+        if len(data) == 0:
+            return pd.DataFrame()
+
+        metrics = cal_batch_trade_metrics(
+            pct=data["pct"].to_numpy(),
+            holding_time=data["holding_time"].to_numpy(),
+            buy_date=data["buy_date"].to_numpy(),
+            group=data[key].to_numpy(),
+        )
+        result_df = pd.DataFrame(metrics).rename(columns={"group": "股票代码"})
+        self.logger.debug(result_df)
+
+        return result_df
+
+    def cal_asset_analysis(self, data, code=None):
+        """
+        计算标的本身(买入持有)的收益率、年化和最大回撤
+        :param data: 行情数据
+        :param code: 股票代码，为None时使用data中的code列
+        :return: pd.DataFrame
+        """
+        if len(data) == 0:
+            return None
+
+        if code is None and "code" in data:
+            code = data["code"].iloc[0]
+        cache_key = (code, data["date"].iloc[0], data["date"].iloc[-1], len(data))
+        if cache_key not in self.asset_analysis_cache:
+            self.asset_analysis_cache[cache_key] = self._cal_asset_analysis(data)
+        return self.asset_analysis_cache[cache_key].copy()
+
+    def _cal_asset_analysis(self, data):
         # 计算标的收益率
-        asset_pct = data.close[len(data) - 1] / data.close[0]
+        asset_pct = data["close"].iloc[-1] / data["close"].iloc[0]
 
         # 计算标的年化
         asset_pct_annual_return = asset_pct ** (250 / len(data)) - 1
@@ -0,0 +1,92 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/18 13:10
+# @Author  : Adolf
+# @File    : process_pool.py
+# @Function: 回测用的进程池，共享状态在子进程初始化时传入一次，任务只传参数
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+_WORKER_STATE = None
+
+
+def _init_worker(state):
+    global _WORKER_STATE
+    _WORKER_STATE = state
+
+
+def get_worker_state():
+    """在任务函数中获取进程池初始化时传入的共享状态(例如已经加载好数据的策略对象)"""
+    return _WORKER_STATE
+
+
+def get_mp_context():
+    # fork启动时子进程直接继承父进程内存中的数据，不需要pickle策略对象和行情数据
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context()
+
+
+def pool_map(
+    func, tasks, workers=1, state=None, chunksize=1, max_in_flight=None, discard=None
+):
+    """
+    按任务顺序返回func(task)的结果，workers<=1时在当前进程中顺序执行
+    :param func: 模块级函数，通过get_worker_state()获取共享状态
+    :param tasks: 任务参数列表
+    :param workers: 进程数
+    :param state: 共享状态，每个子进程只初始化一次
+    :param chunksize: 每次发送给子进程的任务数量
+    :param max_in_flight: 已提交但还没有取走结果的任务数量上限，None表示一次提交全部任务
+    :param discard: 出错或者调用方提前结束时，对已经完成但没有取走的结果调用，
+                    用于释放结果占用的资源(例如共享内存)
+    :return: 结果生成器
+    """
+    tasks = list(tasks)
+    if workers <= 1 or len(tasks) <= 1:
+        previous_state = get_worker_state()
+        _init_worker(state)
+        try:
+            for task in tasks:
+                yield func(task)
+        finally:
+            _init_worker(previous_state)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(tasks)),
+        mp_context=get_mp_context(),
+        initializer=_init_worker,
+        initargs=(state,),
+    ) as executor:
+        if max_in_flight is None and discard is None:
+            yield from executor.map(func, tasks, chunksize=chunksize)
+            return
+        if max_in_flight is None:
+            max_in_flight = len(tasks)
+
+        # 结果被取走后才提交新的任务，任务很多时主进程中等待取走的结果不会堆积
+        pending = deque()
+        try:
+            for task in tasks:
+                if len(pending) >= max_in_flight:
+                    yield pending.popleft().result()
+                pending.append(executor.submit(func, task))
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            if discard is not None:
+                _discard_pending(pending, discard)
+
+
+def _discard_pending(pending, discard):
+    # 还没有开始的任务直接取消，已经开始的任务等待完成后释放结果
+    for future in pending:
+        if future.cancel():
+            continue
+        try:
+            result = future.result()
+        except Exception:
+            continue
+        discard(result)
@@ -0,0 +1,109 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/18 10:12
+# @Author  : Adolf
+# @File    : signal_trade.py
+# @Function: 向量化信号模式：根据整列的买卖信号配对出每一笔交易
+import numpy as np
+import pandas as pd
+
+
+def cal_next_day_start(dates):
+    """
+    计算每根K线之后第一根"不同日期"K线的位置，用于实现买入当天不能卖出的规则
+    :param dates: 日期序列，日线数据时每根K线日期都不同，30分钟数据时同一天有多根K线
+    :return: np.array，长度与dates相同
+    """
+    dates = np.asarray(dates)
+    if len(dates) == 0:
+        return np.zeros(0, dtype=np.int64)
+    # 相邻K线日期不同即为新的一天，得到单调递增的交易日编号
+    day_id = np.concatenate(([0], np.cumsum(dates[1:] != dates[:-1])))
+    return np.searchsorted(day_id, day_id, side="right")
+
+
+def pair_signals(buy_signal, sell_signal, dates=None):
+    """
+    将买卖信号配对成交易，规则与CoreTradeLogic.base_trade逐K线循环保持一致：
+    1、第一根K线只作为历史数据，不参与交易
+    2、同一时间只持有一个仓位，空仓时才会买入
+    3、买入当天不能卖出，卖出的K线上不会再次买入
+    4、最后没有卖出的仓位不计入交易记录
+    :param buy_signal: 买入信号，bool序列
+    :param sell_signal: 卖出信号，bool序列
+    :param dates: 日期序列，为None时认为每根K线都是不同的交易日
+    :return: (entries, exits, open_entry) 买入位置、卖出位置、最后未平仓的买入位置(没有则为-1)
+    """
+    buy_signal = np.asarray(buy_signal, dtype=bool)
+    sell_signal = np.asarray(sell_signal, dtype=bool)
+    n = len(buy_signal)
+    if len(sell_signal) != n:
+        raise ValueError("buy_signal and sell_signal must have the same length")
+
+    if dates is None:
+        next_day_start = np.arange(1, n + 1)
+    else:
+        next_day_start = cal_next_day_start(dates)
+
+    buy_idx = np.flatnonzero(buy_signal[1:]) + 1
+    sell_idx = np.flatnonzero(sell_signal)
+
+    entries = []
+    exits = []
+    open_entry = -1
+    # 每次循环跳过一整笔交易，循环次数等于交易次数而不是K线数量
+    pos = 1
+    while True:
+        k = np.searchsorted(buy_idx, pos)
+        if k == len(buy_idx):
+            break
+        entry = buy_idx[k]
+        j = np.searchsorted(sell_idx, max(entry + 1, next_day_start[entry]))
+        if j == len(sell_idx):
+            open_entry = entry
+            break
+        exit_ = sell_idx[j]
+        entries.append(entry)
+        exits.append(exit_)
+        pos = exit_ + 1
+
+    return (
+        np.array(entries, dtype=np.int64),
+        np.array(exits, dtype=np.int64),
+        int(open_entry),
+    )
+
+
+def build_transaction_records(
+    data, entries, exits, take_profit=None, stop_loss=None, sell_price=None
+):
+    """
+    根据买卖位置构造与OneTransactionRecord字段一致的交易记录表
+    :param data: 行情数据，需要包含code、date、close列
+    :param entries: 买入位置
+    :param exits: 卖出位置
+    :param take_profit: 每笔交易的止盈价格，None表示没有
+    :param stop_loss: 每笔交易的止损价格，None表示没有
+    :param sell_price: 每笔交易的卖出价格，None表示按卖出K线的收盘价
+    :return: pd.DataFrame
+    """
+    if len(entries) == 0:
+        return pd.DataFrame()
+
+    code = data["code"].to_numpy()
+    date = data["date"].to_numpy()
+    close = data["close"].to_numpy()
+
+    no_price = [None] * len(entries)
+    return pd.DataFrame(
+        {
+            "pos_asset": code[entries],
+            "buy_date": date[entries],
+            "buy_price": close[entries],
+            "sell_date": date[exits],
+            "sell_price": close[exits] if sell_price is None else sell_price,
+            "holding_time": exits - entries,
+            "take_profit": no_price if take_profit is None else take_profit,
+            "stop_loss": no_price if stop_loss is None else stop_loss,
+        }
+    )
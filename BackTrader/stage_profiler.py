@@ -0,0 +1,70 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/18 19:40
+# @Author  : Adolf
+# @File    : stage_profiler.py
+# @Function: 回测各阶段耗时的汇总，以及对指定股票的性能分析
+import cProfile
+import os
+
+import numpy as np
+import pandas as pd
+
+TIMING_COLUMNS = ["stage", "count", "total", "mean", "p95", "max"]
+
+
+def summarize_stage_timings(timing_list):
+    """
+    :param timing_list: [{"code": 股票代码, "stage": 阶段, "seconds": 耗时}, ...]
+    :return: pd.DataFrame，每个阶段一行，列为stage、count、total、mean、p95、max
+    """
+    if len(timing_list) == 0:
+        return pd.DataFrame(columns=TIMING_COLUMNS)
+
+    timing_df = pd.DataFrame(timing_list)
+    summary_df = timing_df.groupby("stage", sort=False)["seconds"].agg(
+        count="count",
+        total="sum",
+        mean="mean",
+        p95=lambda seconds: np.percentile(seconds, 95),
+        max="max",
+    )
+    return summary_df.sort_values("total", ascending=False).reset_index()
+
+
+def profile_call(func, output_path, profiler="cprofile", logger=None):
+    """
+    对func的一次调用做性能分析
+    :param func: 无参数的函数
+    :param output_path: 不带后缀的保存路径，cprofile保存为.prof，pyinstrument保存为.html
+    :param profiler: cprofile或者pyinstrument，pyinstrument没有安装时使用cprofile
+    :return: (func的返回值, 性能分析结果的保存路径)
+    """
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+
+    if profiler == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            if logger is not None:
+                logger.warning("没有安装pyinstrument,使用cProfile进行性能分析")
+        else:
+            instrument_profiler = Profiler()
+            instrument_profiler.start()
+            try:
+                result = func()
+            finally:
+                instrument_profiler.stop()
+                with open(f"{output_path}.html", "w") as f:
+                    f.write(instrument_profiler.output_html())
+            return result, f"{output_path}.html"
+
+    c_profiler = cProfile.Profile()
+    c_profiler.enable()
+    try:
+        result = func()
+    finally:
+        c_profiler.disable()
+        # 使用 python -m pstats 或者 snakeviz 查看
+        c_profiler.dump_stats(f"{output_path}.prof")
+    return result, f"{output_path}.prof"
@@ -0,0 +1,308 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/18 17:10
+# @Author  : Adolf
+# @File    : trade_snapshot.py
+# @Function: 逐K线回测的状态快照，每日增量运行时只计算、回测快照之后新增的K线
+"""
+快照保存在一个目录中：
+    snapshot.json       交易状态、策略状态、指标的递推状态、原始行情的摘要，
+                        只包含数字、字符串和列表，读取时不会执行任何代码
+    data-*.parquet      计算完指标、回测之前的行情，每次只追加新增的K线
+"""
+import json
+import os
+import uuid
+from dataclasses import asdict, dataclass, field, fields
+
+import numpy as np
+import pandas as pd
+
+from BackTrader.core_trade_logic import OneTransactionRecord
+
+# 回测时写入的买卖点列，不参与快照的校验
+MARK_COLUMNS = ("buy", "sell")
+SNAPSHOT_FILE = "snapshot.json"
+# 增量数据文件超过这个数量时合并成一个文件
+MAX_DATA_PARTS = 32
+
+
+def row_digest(data, start=0):
+    """
+    每一行的哈希与行号混合后按2**64取模求和，追加K线时只需要在原来的摘要上加上新增的行
+    :param data: 需要计算摘要的行
+    :param start: 第一行的行号
+    :return: int
+    """
+    if len(data) == 0:
+        return 0
+    row_hash = pd.util.hash_pandas_object(data, index=False).to_numpy()
+    position_hash = pd.util.hash_array(np.arange(start, start + len(data)))
+    # uint64的加法溢出后自动取模
+    return int(np.bitwise_xor(row_hash, position_hash).sum())
+
+
+def json_default(value):
+    # 交易记录中的价格、持仓时间可能是NumPy的标量
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+@dataclass
+class RawDigest:
+    rows: int = field(default=0, metadata={"help": "计算了摘要的原始K线数量"})
+    columns: list[str] = field(default_factory=list, metadata={"help": "参与摘要的列"})
+    digest: int = field(default=0, metadata={"help": "row_digest的结果"})
+
+    @classmethod
+    def of(cls, raw_data):
+        columns = [column for column in raw_data.columns if column not in MARK_COLUMNS]
+        return cls(
+            rows=len(raw_data),
+            columns=columns,
+            digest=row_digest(raw_data[columns]),
+        )
+
+    def match(self, raw_data):
+        """
+        判断原始行情是否是在快照基础上追加的，快照之前的任何一根K线不同(复权、数据修订)都返回False
+        :param raw_data: 计算指标之前的行情数据
+        :return: bool
+        """
+        columns = [column for column in raw_data.columns if column not in MARK_COLUMNS]
+        if columns != self.columns or self.rows > len(raw_data):
+            return False
+        return row_digest(raw_data.iloc[: self.rows][columns]) == self.digest
+
+    def extend(self, raw_data):
+        """
+        :param raw_data: 与快照匹配的行情数据
+        :return: RawDigest，在原来的摘要上只加上新增K线的部分
+        """
+        new_rows = raw_data.iloc[self.rows :][self.columns]
+        return RawDigest(
+            rows=len(raw_data),
+            columns=list(self.columns),
+            digest=(self.digest + row_digest(new_rows, start=self.rows)) % 2**64,
+        )
+
+
+@dataclass
+class TradeSnapshot:
+    last_position: int = field(default=-1, metadata={"help": "已经回测到的最后一根K线的位置"})
+    last_date: str = field(default=None, metadata={"help": "已经回测到的最后一根K线的日期"})
+    one_transaction_record: OneTransactionRecord = field(
+        default=None, metadata={"help": "当前未平仓的交易记录"}
+    )
+    history_positions: list[int] = field(
+        default_factory=list, metadata={"help": "历史K线缓冲区中的K线位置"}
+    )
+    transaction_record_list: list[OneTransactionRecord] = field(
+        default_factory=list, metadata={"help": "已经完成的交易记录"}
+    )
+    buy_positions: list[int] = field(default_factory=list, metadata={"help": "买点位置"})
+    sell_positions: list[int] = field(default_factory=list, metadata={"help": "卖点位置"})
+    raw_digest: RawDigest = field(
+        default=None, metadata={"help": "计算指标之前的行情摘要，用于校验历史数据是否有变化"}
+    )
+    strategy_state: object = field(
+        default=None, metadata={"help": "策略get_snapshot_state返回的逐K线状态"}
+    )
+    indicator_state: object = field(
+        default=None,
+        metadata={"help": "策略cal_incremental_indicators返回的指标状态，None表示不支持增量计算"},
+    )
+    data_parts: list = field(
+        default_factory=list, metadata={"help": "[文件名, K线数量]，按顺序拼接得到data"}
+    )
+    data: pd.DataFrame = field(
+        default=None,
+        repr=False,
+        metadata={"help": "计算完指标的行情，保存在data_parts中，不写入json"},
+    )
+    pretrade_marks: dict = field(
+        default=None,
+        repr=False,
+        metadata={"help": "回测之前data中买卖点列的值，保存时恢复，不写入json"},
+    )
+
+    @classmethod
+    def from_trade_state(
+        cls,
+        trade_state,
+        data,
+        raw_digest,
+        strategy_state=None,
+        indicator_state=None,
+        data_parts=None,
+        pretrade_marks=None,
+    ):
+        """
+        :param trade_state: 回测结束时的交易状态
+        :param data: 回测完成的行情数据
+        :param raw_digest: RawDigest，计算指标之前的行情摘要
+        :param strategy_state: get_snapshot_state的返回值
+        :param indicator_state: cal_incremental_indicators的返回值
+        :param data_parts: 上一个快照已经保存的数据文件，data是在它们的基础上追加的
+        :param pretrade_marks: 回测之前data中已有的买卖点列
+        """
+
+        def mark_positions(name):
+            if name not in data:
+                return []
+            return np.flatnonzero(data[name].to_numpy() == 1).tolist()
+
+        return cls(
+            last_position=len(data) - 1,
+            last_date=data["date"].iloc[-1] if len(data) > 0 else None,
+            one_transaction_record=trade_state.one_transaction_record,
+            history_positions=[
+                int(pos) for pos in trade_state.history_trading_step.positions()
+            ],
+            transaction_record_list=list(trade_state.transaction_record_list),
+            buy_positions=mark_positions("buy"),
+            sell_positions=mark_positions("sell"),
+            raw_digest=raw_digest,
+            strategy_state=strategy_state,
+            indicator_state=indicator_state,
+            data_parts=list(data_parts or []),
+            data=data,
+            pretrade_marks=pretrade_marks,
+        )
+
+    def match(self, raw_data):
+        """
+        判断新的行情数据是否是在快照基础上追加的
+        :param raw_data: 计算指标之前的行情数据
+        :return: bool
+        """
+        if self.raw_digest is None:
+            return False
+        return self.raw_digest.match(raw_data)
+
+    def match_data(self, data):
+        """
+        不支持增量计算指标的策略重新计算了全部指标，快照之前的指标需要与快照中的相同
+        :param data: 计算完指标的行情数据
+        :return: bool
+        """
+        if self.data is None or len(self.data) > len(data):
+            return False
+        columns = [column for column in data.columns if column not in MARK_COLUMNS]
+        saved_columns = [
+            column for column in self.data.columns if column not in MARK_COLUMNS
+        ]
+        if columns != saved_columns:
+            return False
+        prefix = data.iloc[: len(self.data)][columns].reset_index(drop=True)
+        return prefix.equals(self.data[columns])
+
+    def append_data(self, new_data):
+        """
+        在快照的行情后面追加新增K线计算完指标的结果，列类型与新数据一致
+        :param new_data: 新增的K线
+        :return: pd.DataFrame
+        """
+        data = pd.concat([self.data, new_data], ignore_index=True)
+        return data.astype(new_data.dtypes.to_dict(), copy=False)
+
+    def pretrade_data(self, start=0):
+        """
+        保存到快照中的行情，买卖点列恢复为回测之前的值，继续回测时按买卖点的位置重新标记，
+        策略状态无法恢复而全量回测时也不会带着之前的买卖点
+        :param start: 从这根K线开始
+        """
+        marks = self.pretrade_marks or {}
+        data = self.data.iloc[start:]
+        data = data.drop(
+            columns=[
+                name for name in MARK_COLUMNS if name in data and name not in marks
+            ]
+        )
+        return data.assign(**{name: values[start:] for name, values in marks.items()})
+
+    def to_json_state(self):
+        state = {
+            item.name: getattr(self, item.name)
+            for item in fields(self)
+            if item.name not in ("data", "pretrade_marks")
+        }
+        state["one_transaction_record"] = asdict(self.one_transaction_record)
+        state["transaction_record_list"] = [
+            asdict(record) for record in self.transaction_record_list
+        ]
+        state["raw_digest"] = asdict(self.raw_digest)
+        return state
+
+    @classmethod
+    def from_json_state(cls, state):
+        state = dict(state)
+        state["one_transaction_record"] = OneTransactionRecord(
+            **state["one_transaction_record"]
+        )
+        state["transaction_record_list"] = [
+            OneTransactionRecord(**record)
+            for record in state["transaction_record_list"]
+        ]
+        state["raw_digest"] = RawDigest(**state["raw_digest"])
+        return cls(**state)
+
+
+def save_snapshot(snapshot_dir, snapshot):
+    """
+    data_parts之后新增的K线写入一个新的parquet文件，再替换snapshot.json，
+    中途失败时旧的snapshot.json仍然指向完整的旧文件
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    data_parts = [list(part) for part in snapshot.data_parts]
+    saved_rows = sum(rows for _, rows in data_parts)
+    if saved_rows > len(snapshot.data) or len(data_parts) >= MAX_DATA_PARTS:
+        data_parts, saved_rows = [], 0
+
+    new_data = snapshot.pretrade_data(saved_rows)
+    if len(new_data) > 0 or len(data_parts) == 0:
+        part_name = f"data-{uuid.uuid4().hex}.parquet"
+        tmp_path = os.path.join(snapshot_dir, f"{part_name}.tmp")
+        new_data.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, os.path.join(snapshot_dir, part_name))
+        data_parts.append([part_name, len(new_data)])
+    snapshot.data_parts = data_parts
+
+    tmp_path = os.path.join(snapshot_dir, f"{SNAPSHOT_FILE}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(snapshot.to_json_state(), f, default=json_default, ensure_ascii=False)
+    os.replace(tmp_path, os.path.join(snapshot_dir, SNAPSHOT_FILE))
+
+    # 删除合并或者全量回测之后不再使用的数据文件
+    used_files = {name for name, _ in data_parts}
+    with os.scandir(snapshot_dir) as it:
+        for entry in it:
+            if entry.name.endswith(".parquet") and entry.name not in used_files:
+                os.remove(entry.path)
+
+
+def load_snapshot(snapshot_dir):
+    """
+    :param snapshot_dir: save_snapshot保存的目录
+    :return: TradeSnapshot，没有快照时返回None
+    """
+    snapshot_path = os.path.join(snapshot_dir, SNAPSHOT_FILE)
+    if not os.path.exists(snapshot_path):
+        return None
+    with open(snapshot_path, encoding="utf-8") as f:
+        snapshot = TradeSnapshot.from_json_state(json.load(f))
+
+    parts = [
+        pd.read_parquet(os.path.join(snapshot_dir, name))
+        for name, _ in snapshot.data_parts
+    ]
+    snapshot.data = pd.concat(parts, ignore_index=True)
+    if len(snapshot.data) != snapshot.last_position + 1:
+        raise ValueError(
+            f"{snapshot_dir} has {len(snapshot.data)} rows, "
+            f"expected {snapshot.last_position + 1}"
+        )
+    return snapshot
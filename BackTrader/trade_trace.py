@@ -0,0 +1,80 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/18 18:05
+# @Author  : Adolf
+# @File    : trade_trace.py
+# @Function: 交易事件追踪，关闭时回测循环中不做任何记录，开启时把事件写入定长环形缓冲区
+import json
+import os
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+# 事件类型
+BAR_EVENT = "bar"
+BUY_EVENT = "buy"
+SELL_EVENT = "sell"
+STOP_EVENT = "stop"
+
+TRACE_COLUMNS = ["event", "position", "date", "code", "price", "holding", "detail"]
+
+
+class TradeTracer:
+    """
+    只追踪一只股票的交易事件，回测循环中先判断enabled再调用record，关闭时没有额外的函数调用和字符串格式化
+    事件按(事件类型、K线位置、日期、股票代码、价格、是否持仓、附加信息)的元组保存，超过capacity后丢弃最早的事件
+    """
+
+    def __init__(self, capacity=100000):
+        self.capacity = capacity
+        self.enabled = False
+        self.events = deque(maxlen=capacity)
+
+    def clear(self):
+        self.events.clear()
+
+    def record(self, event, position, date, code, price, holding, detail=None):
+        self.events.append((event, position, date, code, price, holding, detail))
+
+    def record_many(self, event, positions, dates, codes, prices, holding, detail=None):
+        """
+        向量化模式下一次记录多个事件
+        :param positions: 事件所在的K线位置数组
+        """
+        for position, date, code, price in zip(positions, dates, codes, prices):
+            self.record(event, int(position), date, code, price, holding, detail)
+
+    def __len__(self):
+        return len(self.events)
+
+    def to_frame(self):
+        df = pd.DataFrame(list(self.events), columns=TRACE_COLUMNS)
+        # 附加信息的格式不固定，统一转成json字符串，方便保存为parquet
+        df["detail"] = [
+            None if detail is None else json.dumps(detail, default=str, ensure_ascii=False)
+            for detail in df["detail"]
+        ]
+        return df
+
+    def dump(self, path):
+        """
+        按文件后缀保存为parquet或者json
+        :param path: *.parquet或者*.json
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        df = self.to_frame()
+        if path.endswith(".parquet"):
+            df.to_parquet(path, index=False)
+        else:
+            df.to_json(path, orient="records", force_ascii=False, indent=2)
+        return path
+
+
+def sell_event_type(one_transaction_record):
+    """卖出价格不高于止损价时记为止损事件"""
+    stop_loss = one_transaction_record.stop_loss
+    if stop_loss is not None and not np.isnan(stop_loss):
+        if one_transaction_record.sell_price <= stop_loss:
+            return STOP_EVENT
+    return SELL_EVENT
@@ -0,0 +1,75 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/18 14:20
+# @Author  : Adolf
+# @File    : universe_runner.py
+# @Function: 命令行运行多股票/全市场回测
+"""
+示例:
+python -m BackTrader.universe_runner \
+    --strategy StrategyLib.OneAssetStrategy.Ma5Ma10:Ma5Ma10Strategy \
+    --code ALL_MARKET --workers 32 --result-path Data/Result/ma5ma10.csv
+"""
+
+import argparse
+import importlib
+import json
+
+
+def load_strategy_class(strategy_path):
+    module_name, class_name = strategy_path.split(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description="多股票/全市场回测")
+    parser.add_argument(
+        "--strategy", required=True, help="策略类路径，格式为module:ClassName"
+    )
+    parser.add_argument(
+        "--code",
+        default=["ALL_MARKET"],
+        nargs="+",
+        help="ALL_MARKET、ALL_MARKET_<n>或者多个股票代码",
+    )
+    parser.add_argument("--workers", type=int, default=1, help="进程数")
+    parser.add_argument("--chunk-size", type=int, default=16, help="每次分发的股票数量")
+    parser.add_argument("--start", default=None, help="开始时间")
+    parser.add_argument("--end", default=None, help="结束时间")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--params", default="{}", help="策略参数,json格式")
+    parser.add_argument("--result-path", default=None, help="结果保存路径(csv)")
+    parser.add_argument("--log-level", default="SUCCESS", help="日志级别")
+    parser.add_argument(
+        "--chart-top-n", type=int, default=0, help="回测结束后为盈亏比最高和最低的N只股票画图"
+    )
+    parser.add_argument("--chart-dir", default="ShowHtml/Universe", help="图表保存目录")
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    args = parse_args(args)
+    code_name = args.code[0] if len(args.code) == 1 else args.code
+    if isinstance(code_name, str) and "ALL_MARKET" not in code_name.upper():
+        code_name = [code_name]
+
+    config = {
+        "LOG_LEVEL": args.log_level,
+        "CODE_NAME": code_name,
+        "RANDOM_SEED": args.seed,
+        "START_STAMP": args.start,
+        "END_STAMP": args.end,
+        "STRATEGY_PARAMS": json.loads(args.params),
+        "WORKERS": args.workers,
+        "UNIVERSE_CHUNK_SIZE": args.chunk_size,
+        "UNIVERSE_RESULT_PATH": args.result_path,
+        "CHART_TOP_N": args.chart_top_n,
+        "CHART_DIR": args.chart_dir,
+    }
+    strategy = load_strategy_class(args.strategy)(config)
+    strategy.run()
+    return strategy
+
+
+if __name__ == "__main__":
+    main()
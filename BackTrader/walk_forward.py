@@ -0,0 +1,75 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/18 21:10
+# @Author  : Adolf
+# @File    : walk_forward.py
+# @Function: 滚动窗口的样本内寻优、样本外检验
+from dataclasses import dataclass, field
+
+import numpy as np
+
+
+@dataclass
+class WalkForwardWindow:
+    window: int = field(default=0, metadata={"help": "窗口编号"})
+    train_start: str = field(default=None, metadata={"help": "样本内开始时间(包含)"})
+    train_end: str = field(default=None, metadata={"help": "样本内结束时间(包含)"})
+    test_start: str = field(default=None, metadata={"help": "样本外开始时间(包含)"})
+    test_end: str = field(default=None, metadata={"help": "样本外结束时间(包含)"})
+
+
+def walk_forward_windows(dates, train_size, test_size, step=None):
+    """
+    按K线数量划分滚动窗口，每个窗口的样本外紧接在样本内之后，最后一个样本外不足test_size时截断。
+    窗口按日期回测，日内K线的窗口边界向后对齐到完整的一天，同一天的K线不会同时出现在样本内和样本外
+    :param dates: 按时间排序的日期序列
+    :param train_size: 样本内的K线数量
+    :param test_size: 样本外的K线数量
+    :param step: 相邻窗口之间滚动的K线数量，None表示等于test_size，样本外首尾相接
+    :return: list[WalkForwardWindow]
+    """
+    if train_size < 1 or test_size < 1:
+        raise ValueError("train_size and test_size must be greater than 0")
+    if step is None:
+        step = test_size
+    if step < 1:
+        raise ValueError("step must be greater than 0")
+
+    dates = list(dates)
+    n = len(dates)
+    date_values = np.asarray(dates)
+    # 每一天第一根K线的位置，最后加上n方便查找最后一天的结束位置
+    day_starts = np.append(
+        np.flatnonzero(np.r_[True, date_values[1:] != date_values[:-1]]), n
+    )
+
+    def next_day_start(pos):
+        # pos所在的一天如果不是从pos开始，对齐到下一天的开始
+        return int(day_starts[np.searchsorted(day_starts, min(pos, n))])
+
+    window_list = []
+    last_train_start = None
+    for pos in range(0, n - train_size, step):
+        # 每个边界分别对齐，相邻窗口的样本外仍然首尾相接
+        train_start = next_day_start(pos)
+        test_start = next_day_start(pos + train_size)
+        if test_start >= n:
+            break
+        # step小于一天的K线数量时，对齐之后的窗口可能重复
+        if train_start == last_train_start or train_start >= test_start:
+            continue
+        test_end = next_day_start(pos + train_size + test_size) - 1
+        if test_end < test_start:
+            continue
+        last_train_start = train_start
+
+        window_list.append(
+            WalkForwardWindow(
+                window=len(window_list),
+                train_start=dates[train_start],
+                train_end=dates[test_start - 1],
+                test_start=dates[test_start],
+                test_end=dates[test_end],
+            )
+        )
+    return window_list
@@ -0,0 +1,317 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/18 19:05
+# @Author  : Adolf
+# @File    : backtest_benchmark.py
+# @Function: 回测各个环节的性能基准，结果保存为json用于不同版本之间的对比
+"""
+示例:
+python -m Benchmark.backtest_benchmark --sizes 1000 10000 100000 --freq day 30min \
+    --output Benchmark/Result/benchmark.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from Benchmark.synthetic_data import make_ohlcv
+from BackTrader.base_back_trader import TradeStructure
+from BackTrader.position_analysis import BaseTransactionAnalysis
+from Utils.TechnicalIndicators.basic_indicators import KDJ, MACD, SMA
+
+BENCHMARK_CODE = "sh.600000"
+
+
+class BenchmarkStrategy(TradeStructure):
+    """5日均线和10日均线交叉，逐K线回测"""
+
+    stateless_trade = True
+
+    def cal_technical_indicators(self, indicators_config):
+        close = self.data["close"].to_numpy()
+        self.data["sma5"] = SMA(close, timeperiod=5)
+        self.data["sma10"] = SMA(close, timeperiod=10)
+
+    def buy_logic(self):
+        return bool(
+            self.trade_state.trading_step.sma5 > self.trade_state.trading_step.sma10
+            and self.trade_state.history_trading_step[0].sma5
+            < self.trade_state.history_trading_step[0].sma10
+        )
+
+    def sell_logic(self):
+        return bool(
+            self.trade_state.trading_step.sma5 < self.trade_state.trading_step.sma10
+            and self.trade_state.history_trading_step[0].sma5
+            > self.trade_state.history_trading_step[0].sma10
+        )
+
+
+def reset_peak_rss():
+    """
+    Linux下把进程的内存峰值(VmHWM)重置为当前内存，用于统计单个环节的内存峰值
+    :return: bool 不支持时返回False
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return False
+    return True
+
+
+def proc_status_mb(name):
+    """
+    读取/proc/self/status中的内存统计(MB)，不支持的平台返回None
+    :param name: VmRSS为当前内存，VmHWM为上次reset_peak_rss之后的内存峰值
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(f"{name}:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_mb():
+    """当前进程从启动开始累计的内存峰值(MB)，不支持resource的平台返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux单位是KB，macOS单位是字节
+    if sys.platform == "darwin":
+        return max_rss / 1024**2
+    return max_rss / 1024
+
+
+def time_stage(func, setup=None, repeat=3):
+    """
+    多次运行取最短时间，setup的时间不计入
+    :param func: 被计时的函数，参数为setup的返回值
+    :param setup: 每次运行前准备输入的函数
+    :return: (最短时间, 最后一次运行的返回值, (开始时的内存, 内存峰值))，内存单位为MB，
+        不支持统计单个环节的内存峰值时为None
+    """
+    best = float("inf")
+    result = None
+    start_rss = proc_status_mb("VmRSS") if reset_peak_rss() else None
+    for _ in range(repeat):
+        args = () if setup is None else (setup(),)
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    peak = None
+    if start_rss is not None:
+        peak = (start_rss, proc_status_mb("VmHWM"))
+    return best, result, peak
+
+
+def stage_result(seconds, n_bars, peak):
+    """
+    :param peak: time_stage返回的(环节开始时的内存, 环节中的内存峰值)，不支持时为None
+    """
+    start_rss, stage_peak = (None, None) if peak is None else peak
+    return {
+        "seconds": seconds,
+        "bars_per_sec": n_bars / seconds if seconds > 0 else None,
+        "stage_peak_rss_mb": stage_peak,
+        "stage_rss_increase_mb": (
+            stage_peak - start_rss if stage_peak is not None else None
+        ),
+        # ru_maxrss不能重置，是进程内之前所有环节的累计峰值
+        "process_peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def cal_basic_indicators(data):
+    close = data["close"].to_numpy()
+    high = data["high"].to_numpy()
+    low = data["low"].to_numpy()
+    for timeperiod in (5, 10, 20):
+        SMA(close, timeperiod=timeperiod)
+    MACD(close)
+    KDJ(close, high, low)
+
+
+def run_benchmark_case(case):
+    """
+    在一个独立的工作目录中对一种数据规模计时
+    :param case: dict，包含freq、n_bars、seed、repeat
+    :return: dict
+    """
+    freq, n_bars, repeat = case["freq"], case["n_bars"], case["repeat"]
+    stages = {}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        cwd = os.getcwd()
+        os.chdir(work_dir)
+        try:
+            # 与get_data_path使用相同的路径，run_one_stock不会去下载数据
+            data_path = f"Data/Baostock/day/{BENCHMARK_CODE}_None_None.csv"
+            os.makedirs(os.path.dirname(data_path), exist_ok=True)
+            make_ohlcv(n_bars, freq=freq, seed=case["seed"], code=BENCHMARK_CODE).to_csv(
+                data_path, index=False
+            )
+
+            strategy = BenchmarkStrategy(
+                {"LOG_LEVEL": "ERROR", "CODE_NAME": BENCHMARK_CODE, "HEADLESS": True}
+            )
+
+            seconds, _, peak = time_stage(
+                lambda: strategy.load_dataset(data_path), repeat=repeat
+            )
+            stages["load_dataset"] = stage_result(seconds, n_bars, peak)
+            raw_data = strategy.data.copy()
+
+            seconds, _, peak = time_stage(
+                lambda: cal_basic_indicators(raw_data), repeat=repeat
+            )
+            stages["basic_indicators"] = stage_result(seconds, n_bars, peak)
+
+            strategy.data = raw_data.copy()
+            strategy.prepare_indicators(strategy.config.STRATEGY_PARAMS)
+            indicator_data = strategy.data
+
+            seconds, transaction_record_df, peak = time_stage(
+                strategy.base_trade, setup=indicator_data.copy, repeat=repeat
+            )
+            stages["base_trade"] = stage_result(seconds, n_bars, peak)
+
+            def cal_analysis():
+                analysis = BaseTransactionAnalysis(logger=strategy.logger)
+                analysis.cal_asset_analysis(indicator_data)
+                if len(transaction_record_df) > 0:
+                    analysis.cal_trader_analysis(transaction_record_df.copy())
+
+            seconds, _, peak = time_stage(cal_analysis, repeat=repeat)
+            stages["transaction_analysis"] = stage_result(seconds, n_bars, peak)
+
+            seconds, _, peak = time_stage(
+                lambda: strategy.run_one_stock(code_name=BENCHMARK_CODE), repeat=repeat
+            )
+            stages["run_one_stock"] = stage_result(seconds, n_bars, peak)
+        finally:
+            os.chdir(cwd)
+
+    return {
+        "freq": freq,
+        "n_bars": n_bars,
+        "trade_nums": len(transaction_record_df),
+        "stages": stages,
+    }
+
+
+def get_git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def get_meta(args):
+    return {
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "git_commit": get_git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "seed": args.seed,
+        "repeat": args.repeat,
+    }
+
+
+def run_benchmark(cases, in_process=False):
+    if in_process:
+        return [run_benchmark_case(case) for case in cases]
+
+    # 每种数据规模在新的进程中运行，内存峰值互不影响
+    results = []
+    for case in cases:
+        with ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            results.append(executor.submit(run_benchmark_case, case).result())
+    return results
+
+
+def summary_table(results):
+    rows = []
+    for result in results:
+        for stage_name, stage in result["stages"].items():
+            rows.append(
+                {
+                    "freq": result["freq"],
+                    "n_bars": result["n_bars"],
+                    "stage": stage_name,
+                    **stage,
+                }
+            )
+    return pd.DataFrame(rows)
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description="回测性能基准")
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="K线数量"
+    )
+    parser.add_argument(
+        "--freq", nargs="+", default=["day", "30min"], choices=["day", "30min"], help="K线周期"
+    )
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--repeat", type=int, default=3, help="每个环节运行的次数，取最短时间")
+    parser.add_argument(
+        "--output", default="Benchmark/Result/backtest_benchmark.json", help="结果保存路径(json)"
+    )
+    parser.add_argument(
+        "--in-process", action="store_true", help="在当前进程中运行，不单独统计每种规模的内存峰值"
+    )
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    args = parse_args(args)
+    cases = [
+        {"freq": freq, "n_bars": n_bars, "seed": args.seed, "repeat": args.repeat}
+        for freq in args.freq
+        for n_bars in args.sizes
+    ]
+    report = {
+        "meta": get_meta(args),
+        "results": run_benchmark(cases, in_process=args.in_process),
+    }
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print(summary_table(report["results"]).to_string(index=False))
+    print(f"benchmark result saved to {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/18 18:50
+# @Author  : Adolf
+# @File    : synthetic_data.py
+# @Function: 按随机种子生成随机游走的日线和30分钟K线，格式与Baostock下载的数据一致
+import numpy as np
+import pandas as pd
+
+# A股30分钟K线每天8根，Baostock的time格式为YYYYMMDDHHMMSSsss
+MIN30_TIMES = ["1000", "1030", "1100", "1130", "1330", "1400", "1430", "1500"]
+
+
+def trade_days(n_days, start_date="1990-01-02"):
+    """从start_date开始的n_days个工作日，使用numpy的日期计算，超过pandas时间戳范围也可以生成"""
+    days = np.busday_offset(
+        np.datetime64(start_date, "D"), np.arange(n_days), roll="forward"
+    )
+    return np.datetime_as_string(days, unit="D")
+
+
+def make_ohlcv(n_bars, freq="day", seed=42, code="sh.600000", start_date="1990-01-02"):
+    """
+    :param n_bars: K线数量
+    :param freq: day或者30min
+    :param seed: 随机种子，相同的参数生成相同的数据
+    :param code: 股票代码
+    :param start_date: 第一根K线的日期
+    :return: pd.DataFrame，列为date、(time)、code、open、high、low、close、volume、amount、turn
+    """
+    if freq not in ("day", "30min"):
+        raise ValueError(f"freq must be day or 30min, got {freq}")
+
+    rng = np.random.default_rng(seed)
+    bars_per_day = 1 if freq == "day" else len(MIN30_TIMES)
+    volatility = 0.02 / np.sqrt(bars_per_day)
+
+    # 对数收益率随机游走，收盘价保留两位小数
+    log_close = np.log(10.0) + np.cumsum(rng.normal(0, volatility, n_bars))
+    close = np.round(np.exp(log_close), 2)
+    open_ = np.round(
+        np.concatenate(([close[0]], close[:-1])) * np.exp(rng.normal(0, volatility / 4, n_bars)),
+        2,
+    )
+    high = np.round(np.maximum(open_, close) * (1 + rng.uniform(0, volatility, n_bars)), 2)
+    low = np.round(np.minimum(open_, close) * (1 - rng.uniform(0, volatility, n_bars)), 2)
+    volume = rng.integers(100000, 10000000, n_bars) // bars_per_day
+    amount = np.round(volume * close, 2)
+    turn = np.round(rng.uniform(0.1, 5.0, n_bars) / bars_per_day, 6)
+
+    n_days = -(-n_bars // bars_per_day)
+    days = trade_days(n_days, start_date=start_date)
+    data = {"date": np.repeat(days, bars_per_day)[:n_bars]}
+    if freq == "30min":
+        times = np.tile(MIN30_TIMES, n_days)[:n_bars]
+        data["time"] = np.char.add(
+            np.char.add(np.char.replace(data["date"], "-", ""), times), "00000"
+        )
+    data.update(
+        {
+            "code": code,
+            "open": open_,
+            "high": high,
+            "low": low,
+            "close": close,
+            "volume": volume,
+            "amount": amount,
+            "turn": turn,
+        }
+    )
+    return pd.DataFrame(data)
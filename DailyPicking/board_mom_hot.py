@@ -12,11 +12,10 @@ from datetime import date
 
 # from pprint import pprint
 import akshare as ak
-import numpy as np
 import pandas as pd
-from sklearn.linear_model import LinearRegression
 
 from GetBaseData.ch_eng_mapping import ch_eng_mapping_dict
+from Utils.TechnicalIndicators.basic_indicators import rolling_regression
 
 # from itertools import reduce
 
@@ -24,11 +23,6 @@ today = date.today()
 today = today.strftime("%Y%m%d")
 
 
-def normalization(data):
-    _range = np.max(data) - np.min(data)
-    return (data - np.min(data)) / _range
-
-
 def cal_one_board_mom(board_data_path, period=20):
     data = pd.read_csv("Data/BoardData/industry_origin/" + board_data_path)
     data = data[["date", "open", "high", "low", "close", "volume"]]
@@ -36,18 +30,9 @@ def cal_one_board_mom(board_data_path, period=20):
     data.reset_index(drop=True, inplace=True)
     data["mid"] = (data["open"] + data["close"] + data["high"] + data["low"]) / 4
 
-    model = LinearRegression()
-    x = np.linspace(0, 1, period).reshape(-1, 1)
-
-    y_close = data.close.values.reshape(-1, 1)
-    y_close = normalization(y_close)
-    model.fit(x, y_close)
-
-    # print(model.coef_[0][0])
-    R2 = model.score(x, y_close)
-    # print(data)
-    # print(R2)
-    return (model.coef_[0][0], R2)
+    # 窗口归一化后以linspace(0, 1, period)为自变量拟合
+    slope, _, R2 = rolling_regression(data.close.values, period, normalize=True)
+    return (slope[-1] * (period - 1), R2[-1])
 
 
 # cal_one_board_mom("汽车整车.csv")
@@ -8,9 +8,10 @@ LastEditors: adolf
 
 import numpy as np
 import pandas as pd
-from sklearn.linear_model import LinearRegression  # , Ridge, Lasso
 
 from BackTrader.market_choose import MarketChoose
+from BackTrader.market_panel import select_top_k
+from Utils.TechnicalIndicators.basic_indicators import rolling_regression
 
 
 class BoardMoMStrategy(MarketChoose):
@@ -18,31 +19,6 @@ class BoardMoMStrategy(MarketChoose):
         super().__init__(*args, **kwargs)
         self.board_data_path = "Data/BoardData/industry_origin/"
 
-        # 线性回归
-        self.model = LinearRegression()
-        # 岭回归
-        # model = Ridge(alpha=1.0, fit_intercept=True)
-        # Lasso回归
-        # model = Lasso(alpha=1.0, fit_intercept=True)
-
-    @staticmethod
-    def normalization(data):
-        _range = np.max(data) - np.min(data)
-        return (data - np.min(data)) / _range
-
-    def cal_one_date_mom(self, origin_data, period=20):
-        """
-        计算一天的mom
-        :param origin_data: 一天的原始数据
-        :param period: mom周期
-        """
-        x = np.linspace(0, 1, period).reshape(-1, 1)
-        y = origin_data.values.reshape(-1, 1)
-        y = self.normalization(y)
-
-        self.model.fit(x, y)
-        return self.model.coef_[0][0]
-
     def cal_one_data(self, file_name="", period=20):
         """
         计算一个板块的mom
@@ -54,11 +30,11 @@ class BoardMoMStrategy(MarketChoose):
         data["mid"] = (data["open"] + data["close"] + data["high"] + data["low"]) / 4
         # self.logger.debug(data)
 
-        data["line_w"] = (
-            data["close"]
-            .rolling(window=period)
-            .apply(lambda x: self.cal_one_date_mom(x, period))
+        # 每个窗口归一化后以linspace(0, 1, period)为自变量拟合，斜率是按位置拟合的period-1倍
+        slope, _, _ = rolling_regression(
+            data["close"].to_numpy(dtype=np.double), period, normalize=True
         )
+        data["line_w"] = slope * (period - 1)
 
         data = data[["date", "close", "line_w"]]
         data.rename(
@@ -73,23 +49,21 @@ class BoardMoMStrategy(MarketChoose):
         return data
 
     def choose_rule(self, data):
-        for index, row in data.iterrows():
-            tmp_mom = row[
-                [
-                    "{}_mom".format(board_name.split(".")[0])
-                    for board_name in self.all_data_list
-                    if not pd.isna(row["{}_mom".format(board_name.split(".")[0])])
-                ]
-            ]
-            tmp_mom = tmp_mom.to_dict()
-            tmp_mom = sorted(tmp_mom.items(), key=lambda x: x[1], reverse=True)
-
-            try:
-                # data.loc[index, "top_mom"] = tmp_mom[0][0].replace("_mom", "")
-                data.loc[index, "choose_assert"] = tmp_mom[0][0].replace("_mom", "")
-                # data.loc[index,"choose_value"] = row[tmp_mom[0][0].replace("_mom", "_close")]
-            except Exception as e:
-                self.logger.warning(e)
+        board_list = [board_name.split(".")[0] for board_name in self.all_data_list]
+        # 每天选择mom最大的板块，mom相同时选择all_data_list中靠前的板块
+        top_index, _ = select_top_k(
+            data[["{}_mom".format(board) for board in board_list]].to_numpy(
+                dtype=np.double
+            ),
+            k=1,
+            min_score=self.config.MIN_SCORE,
+        )
+        top_index = top_index[:, 0]
+        data["choose_assert"] = np.where(
+            top_index >= 0, np.array(board_list, dtype=object)[top_index], np.nan
+        )
+        if (top_index < 0).any():
+            self.logger.warning(f"{(top_index < 0).sum()}天没有可以选择的板块")
 
         self.logger.debug(data)
 
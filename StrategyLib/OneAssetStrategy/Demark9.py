@@ -17,6 +17,8 @@ class Demark9Strategy(TradeStructure):
     使用Demark9策略进行交易
     """
 
+    stateless_trade = True
+
     def cal_technical_indicators(self, indicators_config):
         self.logger.debug(indicators_config)
 
@@ -22,11 +22,16 @@ class MaEmaCrossover(TradeStructure):
     6、profit-loss ratio 1:1.5
     """
 
-    def cal_technical_indicators(self, indicators_config):
-        self.logger.debug(indicators_config)
+    stateless_trade = True
+
+    def cal_shared_indicators(self):
         self.data = self.data[
             ["date", "open", "high", "low", "close", "volume", "code"]
         ]
+        self.data["rsi"] = ta.rsi(self.data["close"])
+
+    def cal_technical_indicators(self, indicators_config):
+        self.logger.debug(indicators_config)
 
         self.data["ma"] = ta.sma(
             self.data["close"], length=indicators_config["sma_length"]
@@ -35,8 +40,6 @@ class MaEmaCrossover(TradeStructure):
             self.data["close"], length=indicators_config["ema_length"]
         )
 
-        self.data["rsi"] = ta.rsi(self.data["close"])
-
         self.logger.debug(self.data.tail(30))
 
     def buy_logic(self):
@@ -66,6 +69,23 @@ class MaEmaCrossover(TradeStructure):
         else:
             return False
 
+    def signal_logic(self, data):
+        # 与buy_logic的条件一致，卖出只由exit_levels的止盈止损决定
+        buy_signal = (
+            (data["ma"] > data["ema"])
+            & (data["close"] > data["open"])
+            & (data["rsi"] > 50)
+            & (data["rsi"] < 70)
+            & (data["close"] > data["ma"])
+        )
+        return buy_signal.to_numpy(), None
+
+    def exit_levels(self, data):
+        stop_loss = data["ma"].to_numpy()
+        close = data["close"].to_numpy()
+        take_profit = (close - stop_loss) * 1.5 + close
+        return stop_loss, take_profit
+
     def sell_logic(self):
         self.logger.debug(self.trade_state.trading_step)
         self.logger.debug(self.trade_state.one_transaction_record)
@@ -18,15 +18,21 @@ class Ma5Ma10Strategy(TradeStructure):
     5日均线和10日均线策略,当5日均线上穿10日均线时买入,当5日均线下穿10日均线时卖出
     """
 
-    def cal_technical_indicators(self, indicators_config):
-        self.logger.debug(indicators_config)
+    stateless_trade = True
 
+    def cal_shared_indicators(self):
         self.data["sma5"] = ta.sma(self.data["close"], length=5)
         self.data["sma10"] = ta.sma(self.data["close"], length=10)
 
+    def cal_technical_indicators(self, indicators_config):
+        self.logger.debug(indicators_config)
+
     # def buy_logic(self, trading_step, one_transaction_record, history_trading_step):
     def buy_logic(self):
-        self.logger.debug(pformat(self.trade_state, indent=4, width=20))
+        # 只有输出DEBUG日志时才格式化交易状态
+        self.logger.opt(lazy=True).debug(
+            "{}", lambda: pformat(self.trade_state, indent=4, width=20)
+        )
         if (
             self.trade_state.trading_step.sma5 > self.trade_state.trading_step.sma10
             and self.trade_state.history_trading_step[0].sma5
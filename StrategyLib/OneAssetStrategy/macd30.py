@@ -8,6 +8,8 @@ from BackTrader.base_back_trader import TradeStructure
 class MACD309Strategy(TradeStructure):
     """ """
 
+    stateless_trade = True
+
     def load_dataset(self, data_path, start_stamp=None, end_stamp=None):
         min30_data_path = data_path.replace(
             "Data/RealData/hfq/", "Data/RealData/Baostock/30min/"
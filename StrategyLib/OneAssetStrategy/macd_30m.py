@@ -1,7 +1,15 @@
-import pandas as pd
+import numpy as np
 from finta import TA
 
 from BackTrader.base_back_trader import TradeStructure
+from BackTrader.data_loader import load_market_data
+from BackTrader.multi_timeframe import (
+    MACD_START_STATE,
+    PartialDayMACD,
+    macd_factors,
+    macd_step,
+    map_to_day_index,
+)
 from StrategyLib.OneAssetStrategy.macd_30m_dayMacd import MACD30DayMacdStrategy
 
 
@@ -15,19 +23,23 @@ class MACD30CurMacdStrategy(TradeStructure):
         day_data_path = data_path.replace(
             "Data/RealData/hfq/", "Data/RealData/Baostock/day/"
         )
-        self.data = pd.read_csv(min30_data_path)
-        self.data = self.data[
-            (self.data["date"] >= start_stamp) & (self.data["date"] <= end_stamp)
-        ]
+        self.data = load_market_data(
+            min30_data_path,
+            start_stamp=start_stamp,
+            end_stamp=end_stamp,
+            price_dtype=self.config.PRICE_DTYPE,
+            engine=self.config.CSV_ENGINE,
+        )
         self.data["buy"] = 0
         self.data["sell"] = 0
         self.hist_ratio = 0.005
-        self.day_data = pd.read_csv(day_data_path)
-        self.day_data = self.day_data[
-            (self.day_data["date"] >= start_stamp)
-            & (self.day_data["date"] <= end_stamp)
-        ]
-        self.day_data["index"] = list(range(len(self.day_data)))
+        self.day_data = load_market_data(
+            day_data_path,
+            start_stamp=start_stamp,
+            end_stamp=end_stamp,
+            price_dtype=self.config.PRICE_DTYPE,
+            engine=self.config.CSV_ENGINE,
+        )
 
         # self.logger.debug((self.data.head()))
 
@@ -50,58 +62,76 @@ class MACD30CurMacdStrategy(TradeStructure):
         self.data["MACD"], self.data["SIGNAL"] = [macd_df["MACD"], macd_df["SIGNAL"]]
         self.data["HISTOGRAM"] = self.data["MACD"] - self.data["SIGNAL"]
         self.data["index"] = list(range(len(self.data)))
+        self.data["day_index"] = map_to_day_index(
+            self.data["date"], self.day_data["date"]
+        )
         self.data["buy"] = 0
         self.data["sell"] = 0
 
-    def buy_logic(self):
-        # 用30分钟的close价格作为日线价格重新计算macd
-        self.day_data.loc[
-            self.day_data["date"] == self.trade_state.trading_step.date, "close"
-        ] = self.trade_state.trading_step.close
-        macd_day = TA.MACD(self.day_data)
-        self.day_data["MACD_day"], self.day_data["SIGNAL_day"] = [
-            macd_day["MACD"],
-            macd_day["SIGNAL"],
-        ]
-        self.day_data["HISTOGRAM_day"] = (
-            self.day_data["MACD_day"] - self.day_data["SIGNAL_day"]
+    def cal_incremental_indicators(self, indicators_config, indicator_state):
+        # 30分钟MACD与TA.MACD逐位相同，逐根K线递推，从快照继续回测时只计算新增的K线
+        if indicator_state is None:
+            indicator_state = {"rows": 0, "state": MACD_START_STATE}
+        state = tuple(tuple(item) for item in indicator_state["state"])
+        factors = macd_factors()
+        close = self.data["close"].to_numpy()
+        macd = np.empty(len(close))
+        signal = np.empty(len(close))
+        for i, value in enumerate(close):
+            state, macd[i], signal[i] = macd_step(state, value, factors)
+
+        rows = indicator_state["rows"]
+        self.data["MACD"], self.data["SIGNAL"] = macd, signal
+        self.data["HISTOGRAM"] = self.data["MACD"] - self.data["SIGNAL"]
+        self.data["index"] = np.arange(rows, rows + len(self.data))
+        self.data["day_index"] = map_to_day_index(
+            self.data["date"], self.day_data["date"]
         )
-        self.day_data["HISTOGRAM_ratio"] = (
-            self.day_data["MACD_day"] / self.day_data["SIGNAL_day"]
+        self.data["buy"] = 0
+        self.data["sell"] = 0
+        return {
+            "rows": rows + len(self.data),
+            "state": [list(item) for item in state],
+        }
+
+    def base_trade(self, data, snapshot=None):
+        # 每次回测从原始日线收盘价开始，按30分钟K线逐日推进日线MACD，
+        # 从快照继续回测时在set_snapshot_state中恢复快照时的状态
+        self.day_macd = PartialDayMACD(self.day_data["close"].to_numpy())
+        return super().base_trade(data, snapshot)
+
+    def get_snapshot_state(self):
+        # 日线MACD在buy_logic、sell_logic中逐K线推进，需要和原始日线收盘价一起保存
+        return {
+            "raw_day_close": self.day_data["close"].to_numpy().tolist(),
+            "day_macd": self.day_macd.get_state(),
+        }
+
+    def set_snapshot_state(self, state):
+        raw_day_close = np.asarray(state["raw_day_close"], dtype=np.double)
+        day_close = self.day_data["close"].to_numpy()
+        # 快照之前的日线收盘价被修订(例如当天未收盘时保存的快照)时无法恢复
+        if len(raw_day_close) > len(day_close) or not np.array_equal(
+            raw_day_close, day_close[: len(raw_day_close)], equal_nan=True
+        ):
+            return False
+        self.day_macd.set_state(state["day_macd"])
+        return True
+
+    def update_day_macd(self):
+        # 用30分钟的close价格作为当天的日线价格，在前一天收盘的MACD状态上更新当天的macd
+        day_index = int(self.trade_state.trading_step.day_index)
+        macd_day, _, histogram_day = self.day_macd.update(
+            day_index, self.trade_state.trading_step.close
         )
-        allow_diff = self.trade_state.trading_step.close * self.hist_ratio
-        cur_index = self.day_data.loc[
-            self.day_data["date"] == self.trade_state.trading_step.date, "index"
-        ].item()
-        new_data = self.day_data[["date", "HISTOGRAM_day", "MACD_day", "SIGNAL_day"]]
-
-        # self.data=pd.merge(self.data,new_data,on="date")
-
-        increase_three_days = False
-        if cur_index >= 2:
-            increase_three_days = (
-                self.day_data.loc[
-                    self.day_data["index"] == cur_index, "HISTOGRAM_day"
-                ].item()
-                > self.day_data.loc[
-                    self.day_data["index"] == cur_index - 1, "HISTOGRAM_day"
-                ].item()
-                > self.day_data.loc[
-                    self.day_data["index"] == cur_index - 2, "HISTOGRAM_day"
-                ].item()
-            )
-        if cur_index > 4:
-            last_five_list = self.day_data.iloc[cur_index - 4 : cur_index]
-        else:
-            last_five_list = self.day_data.iloc[:cur_index]
-        last_five_avg_val = last_five_list["HISTOGRAM_day"].mean()
-        HISTOGRAM_bigger_than = (
-            self.day_data.loc[
-                self.day_data["date"] == self.trade_state.trading_step.date,
-                "HISTOGRAM_day",
-            ].item()
-            > last_five_avg_val
+        return day_index, macd_day, histogram_day
+
+    def buy_logic(self):
+        cur_index, macd_day, histogram_day = self.update_day_macd()
+        last_five_avg_val = self.day_macd.histogram_mean(
+            max(cur_index - 4, 0), cur_index
         )
+        HISTOGRAM_bigger_than = histogram_day > last_five_avg_val
 
         # if HISTOGRAM_bigger_than  and increase_three_days \
         #         and self.trade_state.trading_step.HISTOGRAM>=-0:
@@ -110,81 +140,20 @@ class MACD30CurMacdStrategy(TradeStructure):
         if (
             self.trade_state.trading_step.HISTOGRAM > 0
             and HISTOGRAM_bigger_than
-            and self.day_data.loc[
-                self.day_data["index"] == cur_index, "MACD_day"
-            ].item()
-            > -30
+            and macd_day > -30
         ):
             #     pdb.set_trace()
             return True
         return False
 
     def sell_logic(self):
-        self.day_data.loc[
-            self.day_data["date"] == self.trade_state.trading_step.date, "close"
-        ] = self.trade_state.trading_step.close
-        macd_day = TA.MACD(self.day_data)
-        self.day_data["MACD_day"], self.day_data["SIGNAL_day"] = [
-            macd_day["MACD"],
-            macd_day["SIGNAL"],
-        ]
-        self.day_data["HISTOGRAM_day"] = (
-            self.day_data["MACD_day"] - self.day_data["SIGNAL_day"]
-        )
-        self.day_data["HISTOGRAM_ratio"] = (
-            self.day_data["MACD_day"] / self.day_data["SIGNAL_day"]
-        )
-        new_day_data = self.day_data[
-            ["date", "HISTOGRAM_day", "MACD_day", "SIGNAL_day"]
-        ]
-
-        # self.data=pd.merge(self.data,new_day_data,on="date")
-
-        allow_diff = 0.1
-        cur_index = self.day_data.loc[
-            self.day_data["date"] == self.trade_state.trading_step.date, "index"
-        ].item()
-        if cur_index > 3:
-            last_five_list = self.day_data.iloc[cur_index - 3 : cur_index]
-        else:
-            last_five_list = self.day_data.iloc[:cur_index]
-        last_five_avg_val = last_five_list["HISTOGRAM_day"].mean()
-        HISTOGRAM_smaller_than = (
-            self.day_data.loc[
-                self.day_data["date"] == self.trade_state.trading_step.date,
-                "HISTOGRAM_day",
-            ].item()
-            < last_five_avg_val
-        )
-        cur_index = self.day_data.loc[
-            self.day_data["date"] == self.trade_state.trading_step.date, "index"
-        ].item()
-        decrease_three_days = False
-        if cur_index >= 2:
-            decrease_three_days = (
-                self.day_data.loc[
-                    self.day_data["index"] == cur_index, "HISTOGRAM_day"
-                ].item()
-                < self.day_data.loc[
-                    self.day_data["index"] == cur_index - 1, "HISTOGRAM_day"
-                ].item()
-                < self.day_data.loc[
-                    self.day_data["index"] == cur_index - 2, "HISTOGRAM_day"
-                ].item()
-            )
+        _, macd_day, _ = self.update_day_macd()
 
         # if  self.trade_state.trading_step.HISTOGRAM <= 0  and HISTOGRAM_smaller_than and decrease_three_days:
         # if self.trade_state.trading_step.HISTOGRAM_day <= 0.1:
 
         # if self.trade_state.trading_step._5_10 <= 0 and self.trade_state.trading_step.HISTOGRAM < 0:
-        HISTOGRAM_smaller_than = True
-        if (
-            self.trade_state.trading_step.HISTOGRAM < 0
-            and self.day_data.loc[
-                self.day_data["index"] == cur_index, "MACD_day"
-            ].item()
-            < 20
-        ):
+        if self.trade_state.trading_step.HISTOGRAM < 0 and macd_day < 20:
             #     if self.trade_state.one_transaction_record.buy_date is not None:
             #         self.data.loc[self.data["index"] == self.trade_state.trading_step["index"], "sell"] = 1
             return True
@@ -3,11 +3,14 @@ import pandas as pd
 # import pandas_ta as ta
 # from finta import TA
 from BackTrader.base_back_trader import TradeStructure
+from BackTrader.data_loader import load_market_data
 
 
 class MACD30DayMacdStrategy(TradeStructure):
     """ """
 
+    stateless_trade = True
+
     def load_dataset(self, data_path, start_stamp=None, end_stamp=None):
         min30_data_path = data_path.replace(
             "Data/RealData/hfq/", "Data/RealData/Baostock/30min/"
@@ -17,16 +20,20 @@ class MACD30DayMacdStrategy(TradeStructure):
         )
         self.data = {}
         # self.logger.debug(data_path)
-        self.data["30min"] = pd.read_csv(min30_data_path)
-        self.data["day"] = pd.read_csv(day_data_path)
-        self.data["day"] = self.data["day"][
-            (self.data["day"]["date"] >= start_stamp)
-            & (self.data["day"]["date"] <= end_stamp)
-        ]
-        self.data["30min"] = self.data["30min"][
-            (self.data["30min"]["date"] >= start_stamp)
-            & (self.data["30min"]["date"] <= end_stamp)
-        ]
+        self.data["30min"] = load_market_data(
+            min30_data_path,
+            start_stamp=start_stamp,
+            end_stamp=end_stamp,
+            price_dtype=self.config.PRICE_DTYPE,
+            engine=self.config.CSV_ENGINE,
+        )
+        self.data["day"] = load_market_data(
+            day_data_path,
+            start_stamp=start_stamp,
+            end_stamp=end_stamp,
+            price_dtype=self.config.PRICE_DTYPE,
+            engine=self.config.CSV_ENGINE,
+        )
         self.data["30min"]["buy"] = 0
         self.data["30min"]["sell"] = 0
         self.data["30min"]["index"] = list(range(len(self.data["30min"])))
@@ -17,6 +17,8 @@ from BackTrader.base_back_trader import TradeStructure
 class MACDdayStrategy(TradeStructure):
     """ """
 
+    stateless_trade = True
+
     def load_dataset(self, data_path, start_stamp=None, end_stamp=None):
         self.logger.info(data_path)
         if not os.path.exists(data_path):
@@ -24,6 +24,8 @@ class Ma5Ma10Strategy(TradeStructure):
     5日均线和10日均线策略,当5日均线上穿10日均线时买入,当5日均线下穿10日均线时卖出
     """
 
+    stateless_trade = True
+
     def cal_technical_indicators(self, indicators_config):
         self.logger.debug(indicators_config)
 
@@ -34,7 +36,10 @@ class Ma5Ma10Strategy(TradeStructure):
 
     # def buy_logic(self, trading_step, one_transaction_record, history_trading_step):
     def buy_logic(self):
-        self.logger.debug(pformat(self.trade_state, indent=4, width=20))
+        # 只有输出DEBUG日志时才格式化交易状态
+        self.logger.opt(lazy=True).debug(
+            "{}", lambda: pformat(self.trade_state, indent=4, width=20)
+        )
         return bool(
             self.trade_state.trading_step.sma5 > self.trade_state.trading_step.sma10
             and self.trade_state.history_trading_step[0].sma5
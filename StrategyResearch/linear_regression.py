@@ -20,9 +20,10 @@ import psutil
 # import matplotlib.pyplot as plt
 import ray
 from loguru import logger
-from sklearn.linear_model import LinearRegression
 from tqdm.auto import tqdm
 
+from Utils.TechnicalIndicators.basic_indicators import rolling_regression
+
 pd.set_option("display.max_columns", None)
 
 ray.init(num_cpus=psutil.cpu_count(logical=False))
@@ -40,43 +41,6 @@ with open(board_data_path + "ALL_INDUSTRY_BOARD.json") as f:
 board_list = list(board_dict.keys())
 
 
-def normalization(data):
-    _range = np.max(data) - np.min(data)
-    return (data - np.min(data)) / _range
-
-
-def cal_one_date_mom(origin_data, period=20):
-    x = np.linspace(0, 1, period).reshape(-1, 1)
-
-    logger.debug(origin_data)
-
-    y = origin_data.values.reshape(-1, 1)
-
-    y = normalization(y)
-    # 线性回归
-    model = LinearRegression()
-
-    # 岭回归
-    # model = Ridge(alpha=1.0, fit_intercept=True)
-    # Lasso回归
-    # model = Lasso(alpha=1.0, fit_intercept=True)
-    model.fit(x, y)
-
-    # yFit = model.predict(x)
-
-    # 输出回归结果 XUPT
-    # print('回归截距: w0={}'.format(model.intercept_[0]))  # w0: 截距
-    # print('回归系数: w1={}'.format(model.coef_[0][0]))  # w1,..wm: 回归系数
-
-    # print('R2 确定系数：{:.4f}'.format(model.score(x, y)))  # R2 判定系数
-    # print('均方误差：{:.4f}'.format(mean_squared_error(y, yFit)))  # MSE 均方误差
-    # print('平均绝对值误差：{:.4f}'.format(mean_absolute_error(y, yFit)))  # MAE 平均绝对误差
-    # print('中位绝对值误差：{:.4f}'.format(median_absolute_error(y, yFit)))  # 中值绝对误差
-
-    # return (model.coef_[0][0], model.score(x, y))
-    return model.coef_[0][0]
-
-
 # one_board = "汽车零部件"
 @ray.remote
 def cal_linear_regression(board_name):
@@ -90,13 +54,11 @@ def cal_linear_regression(board_name):
     logger.info(df)
     time_period = 20
 
-    df["line_w"] = (
-        df["close"]
-        .rolling(window=time_period)
-        .apply(lambda x: cal_one_date_mom(x, time_period))
+    # 每个窗口归一化后以linspace(0, 1, time_period)为自变量拟合
+    slope, _, _ = rolling_regression(
+        df["close"].to_numpy(dtype=np.double), time_period, normalize=True
     )
-    # df['line_w'], df['line_R2'] = zip(*df['close'].rolling(
-    # window=time_period).apply(lambda x: cal_one_date_mom(x, time_period)))
+    df["line_w"] = slope * (time_period - 1)
 
     df = df[["date", "close", "line_w"]]
     df.rename(
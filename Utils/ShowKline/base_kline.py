@@ -5,23 +5,23 @@
 # @Author  : Adolf
 # @File    : base_kline.py
 
+import numpy as np
 from pyecharts import options as opts
 from pyecharts.charts import Bar, Grid, Kline, Line
 from pyecharts.commons.utils import JsCode
 from pyecharts.options import InitOpts
 
+from Utils.TechnicalIndicators.basic_indicators import SMA
+
 
 def calculate_ma(input_data, day_count: int):
-    result: list[float | str] = []
+    close = np.array([float(data[1]) for data in input_data["datas"]], dtype=np.double)
+    n = len(input_data["times"])
 
-    for i in range(len(input_data["times"])):
-        if i < day_count:
-            result.append("-")
-            continue
-        sum_total = 0.0
-        for j in range(day_count):
-            sum_total += float(input_data["datas"][i - j][1])
-        result.append(abs(float("%.2f" % (sum_total / day_count))))
+    # 由补偿前缀和计算移动平均，与K线数量和周期的乘积无关
+    ma = SMA(close[:n], timeperiod=day_count)
+    result: list[float | str] = ["-"] * min(day_count, n)
+    result += [abs(float("%.2f" % value)) for value in ma[day_count:]]
     return result
 
 
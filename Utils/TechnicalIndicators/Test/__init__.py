@@ -0,0 +1,5 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/18 23:50
+# @Author  : Adolf
+# @File    : __init__.py
@@ -0,0 +1,136 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/18 23:50
+# @Author  : Adolf
+# @File    : test_basic_indicators.py
+# @Function:
+import numpy as np
+import pytest
+
+from Utils.TechnicalIndicators.basic_indicators import (
+    ATR,
+    EMA,
+    KDJ,
+    MACD,
+    RSI,
+    SMA,
+    rolling_max,
+    rolling_min,
+    rolling_regression,
+)
+
+
+def test_sma_expanding_warm_up_and_periods():
+    close = np.array([1.0, 2.0, 3.0, 4.0, 5.0, 6.0])
+    np.testing.assert_array_equal(SMA(close, 3), [1.0, 1.5, 2.0, 3.0, 4.0, 5.0])
+
+    ma = SMA(close, [2, 4])
+    assert ma.shape == (2, 6)
+    np.testing.assert_array_equal(ma[0], SMA(close, 2))
+    np.testing.assert_array_equal(ma[1], [1.0, 1.5, 2.0, 2.5, 3.5, 4.5])
+
+    close[2] = np.nan
+    np.testing.assert_array_equal(
+        SMA(close, 2), [1.0, 1.5, np.nan, np.nan, 4.5, 5.5]
+    )
+
+
+def test_sma_long_series_precision():
+    # 前缀和的量级远大于窗口内的数值时，补偿后的窗口和仍然准确
+    close = np.full(1_000_000, 0.1)
+    close[::2] = 1e8 + 0.3
+    np.testing.assert_array_equal(SMA(close, 2)[1:], np.full(999_999, 50000000.2))
+
+
+def test_2d_rows_match_1d():
+    rng = np.random.default_rng(0)
+    close = 10 + rng.normal(0, 0.2, (3, 60)).cumsum(axis=1)
+    high = close + rng.random((3, 60))
+    low = close - rng.random((3, 60))
+    # 第二只股票晚上市，第三只股票没有数据
+    for values in (close, high, low):
+        values[1, :25] = np.nan
+        values[2] = np.nan
+
+    batch = [SMA(close, [5, 10]), EMA(close, 10), MACD(close), KDJ(close, high, low)]
+    for row, start in ((0, 0), (1, 25)):
+        c, h, l_ = close[row, start:], high[row, start:], low[row, start:]
+        single = [SMA(c, [5, 10]), EMA(c, 10), MACD(c), KDJ(c, h, l_)]
+        np.testing.assert_array_equal(batch[0][:, row, start:], single[0])
+        np.testing.assert_array_equal(batch[1][row, start:], single[1])
+        for batch_values, values in zip(batch[2] + batch[3], single[2] + single[3]):
+            np.testing.assert_array_equal(batch_values[row, start:], values)
+            assert np.isnan(batch_values[row, :start]).all()
+    assert np.isnan(batch[2][0][2]).all()
+    assert np.isnan(batch[3][0][2]).all()
+
+
+def test_rolling_extrema_match_window_slices():
+    values = np.random.default_rng(1).random(103)
+    for window in (1, 4, 9, 200):
+        np.testing.assert_array_equal(
+            rolling_max(values, window),
+            [values[max(0, i - window + 1) : i + 1].max() for i in range(len(values))],
+        )
+        np.testing.assert_array_equal(
+            rolling_min(values, window),
+            [values[max(0, i - window + 1) : i + 1].min() for i in range(len(values))],
+        )
+
+
+def test_kdj_period():
+    close = np.array([10.0, 10.5, 10.2, 10.8, 11.0, 10.6])
+    high, low = close + 0.5, close - 0.5
+    k, d, j = KDJ(close, high, low, n=3)
+
+    hv = np.array([high[max(0, i - 2) : i + 1].max() for i in range(6)])
+    lv = np.array([low[max(0, i - 2) : i + 1].min() for i in range(6)])
+    rsv = (close - lv) / (hv - lv) * 100
+    # 前n根K线的K、D等于RSV
+    np.testing.assert_array_equal(k[:3], rsv[:3].round(4))
+    np.testing.assert_array_equal(d[:3], rsv[:3].round(4))
+    assert k[3] == round((2 / 3) * rsv[2] + (1 / 3) * rsv[3], 4)
+
+
+def test_rolling_regression_matches_polyfit():
+    rng = np.random.default_rng(2)
+    close = 1000 + np.cumsum(rng.normal(size=80))
+    close[40] = np.nan
+    window = 20
+    slope, intercept, rsq = rolling_regression(close, window)
+    norm_slope, norm_intercept, norm_rsq = rolling_regression(
+        close, window, normalize=True
+    )
+
+    assert np.isnan(slope[: window - 1]).all()
+    # 窗口内有nan时结果为nan
+    assert np.isnan(slope[40 : 40 + window]).all()
+    assert not np.isnan(slope[40 + window :]).any()
+    np.testing.assert_array_equal(norm_rsq, rsq)
+
+    x = np.arange(window)
+    for i in [window - 1, 39, 40 + window, len(close) - 1]:
+        y = close[i - window + 1 : i + 1]
+        w1, w0 = np.polyfit(x, y, 1)
+        np.testing.assert_allclose([slope[i], intercept[i]], [w1, w0], rtol=1e-9)
+        assert rsq[i] == pytest.approx(np.corrcoef(x, y)[0, 1] ** 2, rel=1e-9)
+
+        y = (y - y.min()) / (y.max() - y.min())
+        w1, w0 = np.polyfit(x, y, 1)
+        np.testing.assert_allclose(
+            [norm_slope[i], norm_intercept[i]], [w1, w0], rtol=1e-9, atol=1e-12
+        )
+
+
+def test_rsi_atr():
+    close = np.array([10.0, 10.5, 10.2, 10.2, 11.0])
+    rsi = RSI(close, timeperiod=3)
+    assert np.isnan(rsi[0])
+    assert rsi[1] == 100
+    # 上涨幅度 0.5, 1/3, 2/9；涨跌幅度 0.5, 13/30, 13/45
+    assert rsi[2] == rsi[3] == round(100 / 1.3, 4)
+    assert RSI([10.0, 10.0], timeperiod=3)[1] == 50
+
+    atr = ATR(close, close + 0.3, close - 0.4, timeperiod=3)
+    # 第一根K线的真实波幅为最高价减最低价，之后还要和前一天收盘价比较
+    np.testing.assert_allclose(atr, [0.7, 0.75, 2.2 / 3, 2.2 / 3, 2.5 / 3], atol=1e-4)
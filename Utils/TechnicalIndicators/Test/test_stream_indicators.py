@@ -0,0 +1,69 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/19 00:20
+# @Author  : Adolf
+# @File    : test_stream_indicators.py
+# @Function:
+import json
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from Utils.TechnicalIndicators.basic_indicators import ATR, EMA, KDJ, MACD, RSI, SMA
+from Utils.TechnicalIndicators.stream_indicators import (
+    StreamATR,
+    StreamEMA,
+    StreamKDJ,
+    StreamMACD,
+    StreamRSI,
+    StreamSMA,
+)
+
+rng = np.random.default_rng(3)
+close = np.round(10 + np.cumsum(rng.normal(0, 0.2, 400)), 2)
+high = np.round(close + rng.random(400) * 0.3, 2)
+low = np.round(close - rng.random(400) * 0.3, 2)
+close[50] = high[50] = low[50] = np.nan
+# 连续几天一字板
+close[100:105] = high[100:105] = low[100:105] = close[99]
+
+
+def stream(indicator):
+    res = []
+    for i, (c, h, l) in enumerate(zip(close, high, low)):
+        bar = SimpleNamespace(close=c, high=h, low=l)
+        if i % 7 == 3:
+            # 盘中先更新几次，收盘后用最终的K线替换
+            indicator.update({"close": c + 1, "high": h + 2, "low": l - 2})
+            indicator = type(indicator).from_state(
+                json.loads(json.dumps(indicator.get_state()))
+            )
+            indicator.replace_last({"close": c - 1, "high": h + 1, "low": l - 3})
+            res.append(indicator.replace_last(bar))
+        else:
+            res.append(indicator.update(bar))
+    return np.array(res, dtype=np.double).T
+
+
+@pytest.mark.parametrize(
+    "indicator, expected",
+    [
+        (StreamSMA(5), SMA(close, 5)),
+        (StreamSMA(30), SMA(close, 30)),
+        (StreamEMA(12), EMA(close, 12)),
+        (StreamMACD(), np.array(MACD(close))),
+        (StreamKDJ(), np.array(KDJ(close, high, low))),
+        (StreamRSI(6), RSI(close, 6)),
+        (StreamATR(), ATR(close, high, low)),
+    ],
+)
+def test_stream_matches_batch(indicator, expected):
+    np.testing.assert_array_equal(stream(indicator), expected)
+
+
+def test_stream_accepts_close_price():
+    sma = StreamSMA(2)
+    assert [sma.update(x) for x in (1.0, 2.0, 4.0)] == [1.0, 1.5, 3.0]
+    assert sma.replace_last(6.0) == 4.0
+    assert np.isnan(StreamRSI().update(1.0))
@@ -5,47 +5,108 @@
 # @File    : basic_indicators.py
 # @Function:
 """
-常用技术分析指标：MA, MACD
+常用技术分析指标：MA, MACD, KDJ, RSI, ATR
 """
 
 import numpy as np
 
 
+def first_valid_index(values):
+    """二维数组每行第一个非nan值的位置，全为nan的行为列数"""
+    valid = ~np.isnan(values)
+    return np.where(valid.any(axis=-1), valid.argmax(axis=-1), values.shape[-1])
+
+
+def compensated_cumsum(values):
+    """
+    沿最后一维带舍入误差补偿的前缀和，用TwoSum算出每一步加法的舍入误差再单独累加，长序列相减时误差不会随前缀和的量级放大
+    :param values: np.array，一维或二维
+    :return: (prefix, error) 补偿后的前缀和为prefix + error，都在开头补0，最后一维长度加1
+    """
+    pad = np.zeros(values.shape[:-1] + (1,))
+    prefix = np.concatenate((pad, np.cumsum(values, axis=-1)), axis=-1)
+    previous = prefix[..., :-1]
+    virtual = prefix[..., 1:] - previous
+    error = (previous - (prefix[..., 1:] - virtual)) + (values - virtual)
+    return prefix, np.concatenate((pad, np.cumsum(error, axis=-1)), axis=-1)
+
+
 def SMA(close: np.array, timeperiod=5):
     """简单移动平均
     https://baike.baidu.com/item/%E7%A7%BB%E5%8A%A8%E5%B9%B3%E5%9D%87%E7%BA%BF/217887
     :param close: np. Array
-        收盘价序列
-    :param timeperiod: int
-        均线参数
+        收盘价序列；二维数组时每行一只股票，上市前用nan填充，每行从第一个非nan的值开始计算
+    :param timeperiod: int or list[int]
+        均线参数，前timeperiod-1个值为从第一根K线开始的均值；传入多个周期时共用一次前缀和
     :return: np. Array
+        timeperiod为list时在最前面增加一维，每个周期对应一项
     """
+    close = np.asarray(close, dtype=np.double)
+    is_nan = np.isnan(close)
+    prefix, error = compensated_cumsum(np.where(is_nan, 0.0, close))
+    nan_prefix = np.concatenate(
+        (np.zeros(close.shape[:-1] + (1,), dtype=np.int64), np.cumsum(is_nan, axis=-1)),
+        axis=-1,
+    )
+
+    end = np.arange(1, close.shape[-1] + 1)
+    first = 0 if close.ndim == 1 else first_valid_index(close)[:, None]
     res = []
-    for i in range(len(close)):
-        if i < timeperiod:
-            seq = close[0 : i + 1]
-        else:
-            seq = close[i - timeperiod + 1 : i + 1]
-        res.append(seq.mean())
-    return np.array(res, dtype=np.double).round(4)
+    for period in np.atleast_1d(timeperiod):
+        start = np.broadcast_to(np.maximum(end - period, first), close.shape)
+        window_sum = (prefix[..., end] - np.take_along_axis(prefix, start, axis=-1)) + (
+            error[..., end] - np.take_along_axis(error, start, axis=-1)
+        )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ma = window_sum / (end - start)
+        # 窗口内有nan或者还没有上市时均值为nan
+        ma[
+            (nan_prefix[..., end] > np.take_along_axis(nan_prefix, start, axis=-1))
+            | (end <= start)
+        ] = np.nan
+        res.append(ma)
+
+    res = np.array(res, dtype=np.double).round(4)
+    return res if np.ndim(timeperiod) else res[0]
+
+
+def _ema_rows(close, timeperiod):
+    """二维数组沿时间方向递推，每一步同时计算所有股票，每行从第一个非nan的值开始"""
+    values = np.ascontiguousarray(close.T)
+    res = np.empty_like(values)
+    started = np.zeros(values.shape[1], dtype=bool)
+    ema = np.full(values.shape[1], np.nan)
+    for i in range(len(values)):
+        first = ~started & ~np.isnan(values[i])
+        ema = np.where(
+            first, values[i], (2 * values[i] + ema * (timeperiod - 1)) / (timeperiod + 1)
+        )
+        started |= first
+        res[i] = ema
+    return res.T
 
 
 def EMA(close: np.array, timeperiod=5):
     """
     https://baike.baidu.com/item/EMA/12646151
     :param close: np. array
-        收盘价序列
+        收盘价序列；二维数组时每行一只股票，上市前用nan填充，每行从第一个非nan的值开始计算
     :param timeperiod: int
         均线参数
     :return: np.array
     """
+    close = np.asarray(close, dtype=np.double)
+    if close.ndim == 2:
+        return _ema_rows(close, timeperiod).round(4)
+
     res = []
-    for i in range(len(close)):
-        if i < 1:
-            res.append(close[i])
+    ema = None
+    for value in close.tolist():
+        if ema is None:
+            ema = value
         else:
-            ema = (2 * close[i] + res[i - 1] * (timeperiod - 1)) / (timeperiod + 1)
-            res.append(ema)
+            ema = (2 * value + ema * (timeperiod - 1)) / (timeperiod + 1)
+        res.append(ema)
     return np.array(res, dtype=np.double).round(4)
 
 
@@ -53,7 +114,7 @@ def MACD(close: np.array, fastperiod=12, slowperiod=26, signalperiod=9):
     """MACD 异同移动平均线
     https://baike.baidu.com/item/MACD%E6%8C%87%E6%A0%87/6271283
     :param close: np.array
-        收盘价序列
+        收盘价序列；二维数组时每行一只股票，一次计算全部股票
     :param fastperiod: int
         快周期，默认值 12
     :param slowperiod: int
@@ -71,63 +132,223 @@ def MACD(close: np.array, fastperiod=12, slowperiod=26, signalperiod=9):
     return diff.round(4), dea.round(4), macd.round(4)
 
 
-def KDJ(close: np.array, high: np.array, low: np.array):
+def _rolling_extreme(values, window, func):
     """
-    :param close: 收盘价序列
-    :param high: 最高价序列
-    :param low: 最低价序列
-    :return:
+    van Herk/Gil-Werman算法：按window分块，块内的前缀极值和后缀极值各算一次，
+    每个窗口的极值为两个块的值再比较一次，计算量与window无关
     """
-    n = 9
-    hv = []
-    lv = []
-    for i in range(len(close)):
-        if i < n:
-            h_ = high[0 : i + 1]
-            l_ = low[0 : i + 1]
-        else:
-            h_ = high[i - n + 1 : i + 1]
-            l_ = low[i - n + 1 : i + 1]
-        hv.append(max(h_))
-        lv.append(min(l_))
+    n = values.shape[-1]
+    n_blocks = -(-n // window)
+    pad = np.full(values.shape[:-1] + (n_blocks * window - n,), np.nan)
+    blocks = np.concatenate((values, pad), axis=-1).reshape(
+        values.shape[:-1] + (n_blocks, window)
+    )
+    prefix = func.accumulate(blocks, axis=-1).reshape(values.shape[:-1] + (-1,))
+    suffix = func.accumulate(blocks[..., ::-1], axis=-1)[..., ::-1].reshape(
+        values.shape[:-1] + (-1,)
+    )
 
-    hv = np.around(hv, decimals=2)
-    lv = np.around(lv, decimals=2)
-    rsv = np.where(hv == lv, 0, (close - lv) / (hv - lv) * 100)
+    # 前window-1个值为从第一个值开始的极值，正好是第一个块的前缀极值
+    res = prefix[..., :n].copy()
+    if n >= window:
+        res[..., window - 1 :] = func(
+            suffix[..., : n - window + 1], prefix[..., window - 1 : n]
+        )
+    return res
 
+
+def rolling_max(values, window):
+    """沿最后一维的滚动最大值，忽略nan，前window-1个值为从第一个值开始的最大值"""
+    return _rolling_extreme(np.asarray(values, dtype=np.double), window, np.fmax)
+
+
+def rolling_min(values, window):
+    """沿最后一维的滚动最小值，忽略nan，前window-1个值为从第一个值开始的最小值"""
+    return _rolling_extreme(np.asarray(values, dtype=np.double), window, np.fmin)
+
+
+def _kd_rows(rsv, first, n):
+    """二维数组的K、D递推，每一步同时计算所有股票，每行从第一个非nan的值开始"""
+    values = np.ascontiguousarray(rsv.T)
+    warm_up = np.arange(len(values))[:, None] - first < n
+    k = np.empty_like(values)
+    d = np.empty_like(values)
+    k_ = d_ = np.full(values.shape[1], np.nan)
+    for i in range(len(values)):
+        k_ = np.where(warm_up[i], values[i], (2 / 3) * k_ + (1 / 3) * values[i])
+        d_ = np.where(warm_up[i], k_, (2 / 3) * d_ + (1 / 3) * k_)
+        k[i] = k_
+        d[i] = d_
+    return k.T, d.T
+
+
+def _kd_series(rsv, n):
     k = []
     d = []
-    j = []
-    for i in range(len(rsv)):
+    k_ = d_ = 0.0
+    for i, rsv_ in enumerate(rsv.tolist()):
         if i < n:
-            k_ = rsv[i]
+            k_ = rsv_
             d_ = k_
         else:
-            k_ = (2 / 3) * k[i - 1] + (1 / 3) * rsv[i]
-            d_ = (2 / 3) * d[i - 1] + (1 / 3) * k_
-
+            k_ = (2 / 3) * k_ + (1 / 3) * rsv_
+            d_ = (2 / 3) * d_ + (1 / 3) * k_
         k.append(k_)
         d.append(d_)
-        j.append(3 * k_ - 2 * d_)
+    return np.array(k, dtype=np.double), np.array(d, dtype=np.double)
+
 
-    k = np.array(k, dtype=np.double)
-    d = np.array(d, dtype=np.double)
-    j = np.array(j, dtype=np.double)
+def KDJ(close: np.array, high: np.array, low: np.array, n=9):
+    """
+    :param close: 收盘价序列；二维数组时每行一只股票，上市前用nan填充，每行从第一个非nan的值开始计算
+    :param high: 最高价序列
+    :param low: 最低价序列
+    :param n: RSV的周期，前n根K线的K、D直接取RSV
+    :return: (k, d, j)
+    """
+    close = np.asarray(close, dtype=np.double)
+    hv = np.around(rolling_max(high, n), decimals=2)
+    lv = np.around(rolling_min(low, n), decimals=2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsv = np.where(hv == lv, 0, (close - lv) / (hv - lv) * 100)
+
+    if close.ndim == 2:
+        k, d = _kd_rows(rsv, first_valid_index(close), n)
+    else:
+        k, d = _kd_series(rsv, n)
+    j = 3 * k - 2 * d
     return k.round(4), d.round(4), j.round(4)
 
 
+def _wilder_series(values, timeperiod):
+    """通达信SMA(X,N,1)的递推，第一个值直接取X"""
+    res = []
+    y = None
+    for value in values.tolist():
+        if y is None:
+            y = value
+        else:
+            y = (value + (timeperiod - 1) * y) / timeperiod
+        res.append(y)
+    return np.array(res, dtype=np.double)
+
+
+def RSI(close: np.array, timeperiod=14):
+    """相对强弱指标
+    https://baike.baidu.com/item/RSI%E6%8C%87%E6%A0%87/2404946
+    :param close: np.array
+        收盘价序列
+    :param timeperiod: int
+        上涨幅度和涨跌幅度都用SMA(X,N,1)平滑，第一根K线没有涨跌为nan，没有涨跌时为50
+    :return: np.array
+    """
+    close = np.asarray(close, dtype=np.double)
+    res = np.full(close.shape, np.nan)
+    if len(close) < 2:
+        return res
+    diff = np.diff(close)
+    up = _wilder_series(np.maximum(diff, 0), timeperiod)
+    total = _wilder_series(np.abs(diff), timeperiod)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        res[1:] = np.where(total == 0, 50, up / total * 100)
+    return res.round(4)
+
+
+def ATR(close: np.array, high: np.array, low: np.array, timeperiod=14):
+    """真实波幅均值
+    https://baike.baidu.com/item/%E5%B9%B3%E5%9D%87%E7%9C%9F%E5%AE%9E%E6%B3%A2%E5%B9%85/12001745
+    :param close: 收盘价序列
+    :param high: 最高价序列
+    :param low: 最低价序列
+    :param timeperiod: 真实波幅的均线参数，第一根K线的真实波幅为最高价减最低价
+    :return: np.array
+    """
+    close = np.asarray(close, dtype=np.double)
+    high = np.asarray(high, dtype=np.double)
+    low = np.asarray(low, dtype=np.double)
+    tr = high - low
+    tr[1:] = np.maximum(
+        tr[1:],
+        np.maximum(np.abs(close[:-1] - high[1:]), np.abs(close[:-1] - low[1:])),
+    )
+    return SMA(tr, timeperiod=timeperiod)
+
+
+def rolling_regression(values, window, normalize=False):
+    """
+    对每个长度为window的窗口以0, 1, ..., window-1为自变量做最小二乘直线拟合，斜率、截距和R²由滚动求和直接得到
+    :param values: 一维或二维数组，沿最后一维滚动
+    :param window: 窗口长度
+    :param normalize: 每个窗口先按窗口内的最小值、最大值归一化到[0, 1]再拟合，R²不受影响
+    :return: (slope, intercept, rsq) 与values形状相同，前window-1个值以及窗口内有nan时为nan
+    """
+    values = np.asarray(values, dtype=np.double)
+    n = values.shape[-1]
+    slope = np.full(values.shape, np.nan)
+    intercept = np.full(values.shape, np.nan)
+    rsq = np.full(values.shape, np.nan)
+    if n < window:
+        return slope, intercept, rsq
+
+    is_nan = np.isnan(values)
+    # 减去整体均值后再求和，减小平方和相减时的精度损失，斜率和R²不受平移影响
+    with np.errstate(invalid="ignore"):
+        offset = np.nan_to_num(np.nanmean(values, axis=-1, keepdims=True))
+    y = np.where(is_nan, 0.0, values - offset)
+    index = np.arange(n)
+
+    end = np.arange(window, n + 1)
+    start = end - window
+
+    def window_sum(array):
+        prefix, error = compensated_cumsum(array)
+        return (prefix[..., end] - prefix[..., start]) + (
+            error[..., end] - error[..., start]
+        )
+
+    sum_y = window_sum(y)
+    # 窗口内第k根K线的自变量为k，等于index减去窗口开始的位置
+    sum_xy = window_sum(index * y) - start * sum_y
+    sum_yy = window_sum(y * y)
+    has_nan = window_sum(is_nan.astype(np.double)) > 0
+
+    x_mean = (window - 1) / 2
+    sxx = window * (window * window - 1) / 12
+    sxy = sum_xy - x_mean * sum_y
+    syy = sum_yy - sum_y * sum_y / window
+    with np.errstate(divide="ignore", invalid="ignore"):
+        window_slope = sxy / sxx
+        window_intercept = sum_y / window - window_slope * x_mean + offset
+        window_rsq = window_slope * sxy / syy
+
+    if normalize:
+        low = rolling_min(values, window)[..., window - 1 :]
+        value_range = rolling_max(values, window)[..., window - 1 :] - low
+        with np.errstate(divide="ignore", invalid="ignore"):
+            window_slope = window_slope / value_range
+            window_intercept = (window_intercept - low) / value_range
+
+    for res, window_res in (
+        (slope, window_slope),
+        (intercept, window_intercept),
+        (rsq, window_rsq),
+    ):
+        res[..., window - 1 :] = np.where(has_nan, np.nan, window_res)
+    return slope, intercept, rsq
+
+
 def RSQ(close) -> float:
     """拟合优度 R SQuare
     :param close: 收盘价序列
     :return:
     """
-    x = list(range(len(close)))
-    y = np.array(close)
-    x_squred_sum = sum([x1 * x1 for x1 in x])
-    xy_product_sum = sum([x[i] * y[i] for i in range(len(x))])
+    y = np.asarray(close, dtype=np.double)
+    x = np.arange(len(y), dtype=np.double)
     num = len(x)
-    x_sum = sum(x)
-    y_sum = sum(y)
+    x_squred_sum = (x * x).sum()
+    xy_product_sum = (x * y).sum()
+    x_sum = x.sum()
+    y_sum = y.sum()
     delta = float(num * x_squred_sum - x_sum * x_sum)
     if delta == 0:
         return 0
@@ -135,13 +356,8 @@ def RSQ(close) -> float:
     slope = (1 / delta) * (num * xy_product_sum - x_sum * y_sum)
 
     y_mean = np.mean(y)
-    ss_tot = sum([(y1 - y_mean) * (y1 - y_mean) for y1 in y]) + 0.00001
-    ss_err = sum(
-        [
-            (y[i] - slope * x[i] - y_intercept) * (y[i] - slope * x[i] - y_intercept)
-            for i in range(len(x))
-        ]
-    )
+    ss_tot = ((y - y_mean) ** 2).sum() + 0.00001
+    ss_err = ((y - slope * x - y_intercept) ** 2).sum()
     rsq = 1 - ss_err / ss_tot
 
     return round(rsq, 4)
@@ -0,0 +1,376 @@
+# ！/usr/bin/env python
+# @Project : stock_quant
+# @Date    : 2026/10/18 23:55
+# @Author  : Adolf
+# @File    : stream_indicators.py
+# @Function: 逐根K线更新的技术指标，结果与basic_indicators中一维序列的计算完全一致
+"""
+每个指标只保存递推需要的状态(环形缓冲区、EMA累加值)，update(bar)追加一根K线，
+replace_last(bar)用同一时间的新数据替换最后一根K线(盘中K线还没有走完时使用)，
+get_state()/from_state()保存和恢复状态，状态只包含list、float、int，可以直接存成json
+"""
+import math
+from collections import deque
+from collections.abc import Mapping
+
+import numpy as np
+
+
+def _bar_price(bar, name="close"):
+    """bar可以是数字(当作收盘价)、字典或者带close、high、low属性的对象(RawBar、itertuples的行)"""
+    if isinstance(bar, (int, float, np.number)):
+        return float(bar)
+    if isinstance(bar, Mapping):
+        return float(bar[name])
+    return float(getattr(bar, name))
+
+
+def _round(value, decimals=4):
+    """
+    与np.round逐位相同：先乘10**decimals，四舍六入五成双取整后再除回去，
+    python的round(value, 4)直接按十进制舍入，个别值上和numpy结果不同
+    """
+    if not math.isfinite(value):
+        return value
+    scale = 10.0**decimals
+    return math.copysign(round(value * scale) / scale, value)
+
+
+def _maximum(*values):
+    """和np.maximum一样有nan时结果为nan"""
+    if any(math.isnan(value) for value in values):
+        return math.nan
+    return max(values)
+
+
+class StreamIndicator:
+    """
+    流式指标的基类，子类实现_push(bar)返回本根K线的结果，_pop()撤销最后一次_push
+    _param_fields是构造参数，_state_fields是递推状态，状态可以是数字、deque或者其他流式指标
+    """
+
+    _param_fields = ()
+    _state_fields = ()
+
+    def __init__(self):
+        self.count = 0
+
+    def _push(self, bar):
+        raise NotImplementedError
+
+    def _pop(self):
+        raise NotImplementedError
+
+    def update(self, bar):
+        """
+        追加一根新的K线
+        :param bar: K线
+        :return: 该K线的指标值，与批量计算结果中对应位置的值相同
+        """
+        self.count += 1
+        return self._push(bar)
+
+    def replace_last(self, bar):
+        """
+        替换最后一根K线，可以连续调用，每次都替换同一根K线
+        :param bar: 最后一根K线的新数据
+        :return: 该K线的指标值
+        """
+        if self.count == 0:
+            return self.update(bar)
+        self._pop()
+        return self._push(bar)
+
+    def _revert(self):
+        """撤销最后一次update，组合指标撤销子指标时使用"""
+        self._pop()
+        self.count -= 1
+
+    def get_state(self):
+        """
+        :return: dict，包含构造参数和全部状态，from_state可以还原出同样的指标
+        """
+        state = {"count": self.count}
+        for name in self._param_fields:
+            state[name] = getattr(self, name)
+        for name in self._state_fields:
+            value = getattr(self, name)
+            if isinstance(value, StreamIndicator):
+                value = value.get_state()
+            elif isinstance(value, deque):
+                value = [list(item) for item in value]
+            state[name] = value
+        return state
+
+    @classmethod
+    def from_state(cls, state):
+        """
+        :param state: get_state()的返回值
+        :return: 还原的指标
+        """
+        indicator = cls(**{name: state[name] for name in cls._param_fields})
+        indicator.count = state["count"]
+        for name in cls._state_fields:
+            value = getattr(indicator, name)
+            if isinstance(value, StreamIndicator):
+                value = type(value).from_state(state[name])
+            elif isinstance(value, deque):
+                value = deque(state[name], maxlen=value.maxlen)
+            else:
+                value = state[name]
+            setattr(indicator, name, value)
+        return indicator
+
+
+class StreamSMA(StreamIndicator):
+    """
+    与basic_indicators.SMA相同，保存最近timeperiod+1个补偿前缀和，窗口和由首尾两个前缀和相减得到
+    """
+
+    _param_fields = ("timeperiod",)
+    _state_fields = ("prefix", "evicted")
+
+    def __init__(self, timeperiod=5):
+        super().__init__()
+        self.timeperiod = timeperiod
+        # (前缀和, 舍入误差的前缀和, nan的个数)
+        self.prefix = deque([(0.0, 0.0, 0)], maxlen=timeperiod + 1)
+        # 最后一次_push挤出的前缀和，用于撤销
+        self.evicted = None
+
+    def _push(self, bar):
+        value = _bar_price(bar)
+        previous, error, nan_count = self.prefix[-1]
+        if math.isnan(value):
+            value = 0.0
+            nan_count += 1
+        # TwoSum，和compensated_cumsum逐项相同
+        current = previous + value
+        virtual = current - previous
+        error += (previous - (current - virtual)) + (value - virtual)
+
+        full = len(self.prefix) == self.prefix.maxlen
+        self.evicted = list(self.prefix[0]) if full else None
+        self.prefix.append((current, error, nan_count))
+
+        start, end = self.prefix[0], self.prefix[-1]
+        if end[2] > start[2]:
+            return math.nan
+        window_sum = (end[0] - start[0]) + (end[1] - start[1])
+        return _round(window_sum / (len(self.prefix) - 1))
+
+    def _pop(self):
+        self.prefix.pop()
+        if self.evicted is not None:
+            self.prefix.appendleft(tuple(self.evicted))
+        self.evicted = None
+
+
+class StreamEMA(StreamIndicator):
+    """与basic_indicators.EMA相同，第一根K线的EMA等于收盘价"""
+
+    _param_fields = ("timeperiod",)
+    _state_fields = ("ema", "previous")
+
+    def __init__(self, timeperiod=5):
+        super().__init__()
+        self.timeperiod = timeperiod
+        self.ema = None
+        self.previous = None
+
+    def _push(self, bar):
+        value = _bar_price(bar)
+        self.previous = self.ema
+        if self.ema is None:
+            self.ema = value
+        else:
+            self.ema = (2 * value + self.ema * (self.timeperiod - 1)) / (
+                self.timeperiod + 1
+            )
+        return _round(self.ema)
+
+    def _pop(self):
+        self.ema = self.previous
+
+
+class StreamMACD(StreamIndicator):
+    """与basic_indicators.MACD相同，返回(diff, dea, macd)"""
+
+    _param_fields = ("fastperiod", "slowperiod", "signalperiod")
+    _state_fields = ("fast", "slow", "signal")
+
+    def __init__(self, fastperiod=12, slowperiod=26, signalperiod=9):
+        super().__init__()
+        self.fastperiod = fastperiod
+        self.slowperiod = slowperiod
+        self.signalperiod = signalperiod
+        self.fast = StreamEMA(fastperiod)
+        self.slow = StreamEMA(slowperiod)
+        self.signal = StreamEMA(signalperiod)
+
+    def _push(self, bar):
+        # 与批量计算一样，diff由保留4位小数的两条EMA相减得到
+        diff = self.fast.update(bar) - self.slow.update(bar)
+        dea = self.signal.update(diff)
+        return _round(diff), _round(dea), _round((diff - dea) * 2)
+
+    def _pop(self):
+        for ema in (self.fast, self.slow, self.signal):
+            ema._revert()
+
+
+class StreamExtreme(StreamIndicator):
+    """
+    与basic_indicators.rolling_max、rolling_min相同的滚动极值，忽略nan，
+    单调队列保存窗口内可能成为极值的(位置, 值)，每次更新均摊O(1)
+    """
+
+    _param_fields = ("window", "maximum", "name")
+    _state_fields = ("queue", "removed", "expired")
+
+    def __init__(self, window=9, maximum=True, name="close"):
+        super().__init__()
+        self.window = window
+        self.maximum = maximum
+        self.name = name
+        self.queue = deque()
+        # 最后一次_push从队尾弹出、从队首过期的元素，用于撤销
+        self.removed = []
+        self.expired = []
+
+    def _dominated(self, old, new):
+        return old <= new if self.maximum else old >= new
+
+    def _push(self, bar):
+        value = _bar_price(bar, self.name)
+        index = self.count - 1
+        self.removed = []
+        self.expired = []
+        if not math.isnan(value):
+            while self.queue and self._dominated(self.queue[-1][1], value):
+                self.removed.append(list(self.queue.pop()))
+            self.queue.append((index, value))
+        while self.queue and self.queue[0][0] <= index - self.window:
+            self.expired.append(list(self.queue.popleft()))
+        return self.queue[0][1] if self.queue else math.nan
+
+    def _pop(self):
+        index = self.count - 1
+        if self.queue and self.queue[-1][0] == index:
+            self.queue.pop()
+        for item in reversed(self.expired):
+            self.queue.appendleft(tuple(item))
+        for item in reversed(self.removed):
+            self.queue.append(tuple(item))
+        self.removed = []
+        self.expired = []
+
+
+class StreamKDJ(StreamIndicator):
+    """与basic_indicators.KDJ相同，返回(k, d, j)"""
+
+    _param_fields = ("n",)
+    _state_fields = ("high", "low", "kd", "previous")
+
+    def __init__(self, n=9):
+        super().__init__()
+        self.n = n
+        self.high = StreamExtreme(n, maximum=True, name="high")
+        self.low = StreamExtreme(n, maximum=False, name="low")
+        self.kd = [0.0, 0.0]
+        self.previous = [0.0, 0.0]
+
+    def _push(self, bar):
+        close = _bar_price(bar, "close")
+        hv = _round(self.high.update(bar), 2)
+        lv = _round(self.low.update(bar), 2)
+        rsv = 0.0 if hv == lv else (close - lv) / (hv - lv) * 100
+
+        self.previous = self.kd
+        k, d = self.kd
+        # 前n根K线的K、D直接取RSV
+        if self.count <= self.n:
+            k = rsv
+            d = k
+        else:
+            k = (2 / 3) * k + (1 / 3) * rsv
+            d = (2 / 3) * d + (1 / 3) * k
+        self.kd = [k, d]
+        return _round(k), _round(d), _round(3 * k - 2 * d)
+
+    def _pop(self):
+        self.high._revert()
+        self.low._revert()
+        self.kd = self.previous
+
+
+class StreamRSI(StreamIndicator):
+    """与basic_indicators.RSI相同，第一根K线为nan"""
+
+    _param_fields = ("timeperiod",)
+    _state_fields = ("close", "average", "previous")
+
+    def __init__(self, timeperiod=14):
+        super().__init__()
+        self.timeperiod = timeperiod
+        # 上一根和上上根K线的收盘价
+        self.close = [None, None]
+        # 上涨幅度和涨跌幅度的SMA(X,N,1)
+        self.average = None
+        self.previous = None
+
+    def _push(self, bar):
+        close = _bar_price(bar)
+        last_close = self.close[1]
+        self.close = [last_close, close]
+        self.previous = self.average
+        if last_close is None:
+            return math.nan
+
+        diff = close - last_close
+        up = _maximum(diff, 0.0)
+        total = abs(diff)
+        if self.average is None:
+            self.average = [up, total]
+        else:
+            n = self.timeperiod
+            self.average = [
+                (up + (n - 1) * self.average[0]) / n,
+                (total + (n - 1) * self.average[1]) / n,
+            ]
+        up, total = self.average
+        if total == 0:
+            return 50.0
+        return _round(up / total * 100)
+
+    def _pop(self):
+        self.close = [None, self.close[0]]
+        self.average = self.previous
+
+
+class StreamATR(StreamIndicator):
+    """与basic_indicators.ATR相同，真实波幅用StreamSMA求均值"""
+
+    _param_fields = ("timeperiod",)
+    _state_fields = ("close", "sma")
+
+    def __init__(self, timeperiod=14):
+        super().__init__()
+        self.timeperiod = timeperiod
+        self.close = [None, None]
+        self.sma = StreamSMA(timeperiod)
+
+    def _push(self, bar):
+        high = _bar_price(bar, "high")
+        low = _bar_price(bar, "low")
+        last_close = self.close[1]
+        self.close = [last_close, _bar_price(bar, "close")]
+
+        tr = high - low
+        if last_close is not None:
+            tr = _maximum(tr, abs(last_close - high), abs(last_close - low))
+        return self.sma.update(tr)
+
+    def _pop(self):
+        self.close = [None, self.close[0]]
+        self.sma._revert()
@@ -92,7 +92,7 @@ def MACD_main():
     strategy = MACDdayStrategy(config)
     strategy.run()
     stock_result = None
-    if strategy.stock_result:
+    if strategy.stock_result is not None:
         stock_result = strategy.stock_result.astype(str)
     pl = strategy.pl_result.astype(str)
 
@@ -104,7 +104,7 @@ def MACD_main():
         text = fp.read()
     components.html(html=text, width=None, height=800, scrolling=False)
 
-    if stock_result:
+    if stock_result is not None:
         st.table(stock_result)
     st.table(pl)
 